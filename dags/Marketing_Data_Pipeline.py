@@ -25,10 +25,12 @@ from data_validation import (
 )
 
 from upload_to_minio import upload_all_validated_files, upload_all_quarantined_files
-from metadata import init_metadata_db, print_metadata
+from metadata import init_metadata_db, print_metadata, compact_dq_checks, flush_metadata
+from stage_report import write_stage_report
 from email_notification import dq_failure_email, notify_failure
 from logging_config import get_logger
 from snowflake_upload import load_to_snowflake
+from compact_lake import compact_lake
 from utils import run_dbt, run_dbt_test
 
 
@@ -37,7 +39,11 @@ logger = get_logger("Marketing_Data_Pipeline")
 def wrap_task(fn, label):
         def _wrapped(**kwargs):
             logger.info(f"▶️ Starting task: {label}")
-            fn(**kwargs)
+            try:
+                fn(**kwargs)
+            finally:
+                # Task runners exit without atexit hooks: write out any write-behind metadata now
+                flush_metadata()
             logger.info(f"✅ Completed task: {label}")
         return _wrapped
 
@@ -168,14 +174,20 @@ with DAG(
     # Branching operator: chooses failure alert vs upload
     def choose_path(**context):
         ti = context['ti']
-        # Pull the 'new_dq_failures' flag from each validation task
-        flags = [
-            ti.xcom_pull(task_ids="validate_contacts",     key="new_dq_failures"),
-            ti.xcom_pull(task_ids="validate_form_fills",   key="new_dq_failures"),
-            ti.xcom_pull(task_ids="validate_website_activity", key="new_dq_failures"),
+        # Pull the failure delta (new / persisting / resolved failing keys) from each validation task
+        task_ids = [
+            "validate_facts.validate_contacts",
+            "validate_facts.validate_form_fills",
+            "validate_facts.validate_website_activity",
         ]
+        deltas = [d for d in ti.xcom_pull(task_ids=task_ids, key="dq_failure_delta") if d]
+        for d in deltas:
+            logger.info(f"🔎 {d['file']}: {d['new']} new, {d['persisting']} persisting, "
+                        f"{d['resolved']} resolved DQ failures")
+        # Kept for the DQ email on the failure path
+        ti.xcom_push(key="dq_failure_deltas", value=deltas)
         # If any task has new failures → alert, else proceed to upload
-        return "notify_dq_failure" if any(flags) else "proceed_upload"
+        return "notify_dq_failure" if any(d['new'] for d in deltas) else "proceed_upload"
 
     branch_on_dq = BranchPythonOperator(
         task_id="branch_on_dq",
@@ -194,6 +206,7 @@ with DAG(
     upload_validated_task = PythonOperator(
         task_id="upload_validated_to_minio",
         python_callable=wrap_task(upload_all_validated_files, "Upload Validated to MinIO"),
+        op_kwargs={'ds': '{{ ds }}'},  # also writes the day's manifest for the Snowflake load
         retries=3,
         retry_delay=timedelta(minutes=2)
     )
@@ -278,6 +291,32 @@ with DAG(
     )
 
 
+    # Roll dq_checks past retention up into daily summaries (keeps metadata.db bounded)
+    compact_dq_checks_task = PythonOperator(
+        task_id='compact_dq_checks',
+        python_callable=wrap_task(compact_dq_checks, "Compact DQ Checks"),
+        trigger_rule="all_done",
+        op_kwargs={'ds': '{{ ds }}'}
+    )
+
+
+    # Merge the small valid-data objects of closed months into monthly Parquet (manifests swapped over)
+    compact_lake_task = PythonOperator(
+        task_id='compact_lake',
+        python_callable=wrap_task(compact_lake, "Compact Valid-Data Lake"),
+        trigger_rule="all_done",
+        op_kwargs={'ds': '{{ ds }}'}
+    )
+
+
+    # Stage latency / throughput report (JSON + HTML) over the trailing window, last task of the run
+    stage_report_task = PythonOperator(
+        task_id='stage_report',
+        python_callable=wrap_task(write_stage_report, "Stage Report"),
+        trigger_rule="all_done",
+        op_kwargs={'ds': '{{ ds }}'}
+    )
+
     
     
     # ——————————— Define Task Dependencies ———————————
@@ -317,6 +356,10 @@ with DAG(
     
     # Now converge both paths into print_metadata_task:
     [ upload_validated_task, upload_quarantined_task, notify_dq_failure ] >> print_metadata_task
+    print_metadata_task >> compact_dq_checks_task
+    # compaction rewrites manifests: never while the day's load is reading them
+    [ compact_dq_checks_task, load_to_snowflake_task ] >> compact_lake_task
+    [ compact_lake_task, dbt_test_task ] >> stage_report_task
 
     # Load Valid data to snowflake followed by dbt run & test
     upload_validated_task >> load_to_snowflake_task >> dbt_run_staging_task >> dbt_run_marts_task >> dbt_test_task
@@ -14,7 +14,7 @@ sys.path.append(str(Path(__file__).resolve().parent.parent / "scripts"))
 from data_generation import generate_contacts_if_needed, generate_form_fills_if_needed, generate_website_activity_if_needed
 from data_validation import validate_contacts_if_needed, validate_form_fills_if_needed, validate_website_activity_if_needed
 from upload_to_minio import upload_all_validated_files, upload_all_quarantined_files
-from metadata import init_metadata_db, print_metadata
+from metadata import init_metadata_db, print_metadata, flush_metadata
 from email_notification import dq_failure_email, notify_failure
 from logging_config import get_logger
 from snowflake_upload import load_to_snowflake
@@ -26,7 +26,11 @@ logger = get_logger("main_pipeline_dag")
 def wrap_task(fn, label):
         def _wrapped(**kwargs):
             logger.info(f"▶️ Starting task: {label}")
-            fn(**kwargs)
+            try:
+                fn(**kwargs)
+            finally:
+                # Task runners exit without atexit hooks: write out any write-behind metadata now
+                flush_metadata()
             logger.info(f"✅ Completed task: {label}")
         return _wrapped
 
@@ -110,14 +114,20 @@ with DAG(
     # Branching operator: chooses failure alert vs upload
     def choose_path(**context):
         ti = context['ti']
-        # Pull the 'new_dq_failures' flag from each validation task
-        flags = [
-            ti.xcom_pull(task_ids="validate_contacts",     key="new_dq_failures"),
-            ti.xcom_pull(task_ids="validate_form_fills",   key="new_dq_failures"),
-            ti.xcom_pull(task_ids="validate_website_activity", key="new_dq_failures"),
+        # Pull the failure delta (new / persisting / resolved failing keys) from each validation task
+        task_ids = [
+            "validate_contacts",
+            "validate_form_fills",
+            "validate_website_activity",
         ]
+        deltas = [d for d in ti.xcom_pull(task_ids=task_ids, key="dq_failure_delta") if d]
+        for d in deltas:
+            logger.info(f"🔎 {d['file']}: {d['new']} new, {d['persisting']} persisting, "
+                        f"{d['resolved']} resolved DQ failures")
+        # Kept for the DQ email on the failure path
+        ti.xcom_push(key="dq_failure_deltas", value=deltas)
         # If any task has new failures → alert, else proceed to upload
-        return "notify_dq_failure" if any(flags) else "proceed_upload"
+        return "notify_dq_failure" if any(d['new'] for d in deltas) else "proceed_upload"
 
     branch_on_dq = BranchPythonOperator(
         task_id="branch_on_dq",
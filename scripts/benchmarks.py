@@ -0,0 +1,714 @@
+"""
+Ad-hoc performance benchmarks for the pipeline scripts.
+
+Run from the scripts directory, e.g.:
+    python benchmarks.py generation --rows 20000
+"""
+import argparse
+import io
+import logging
+import math
+import multiprocessing
+import os
+import sqlite3
+import resource
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+import numpy as np
+from logging_config import get_logger
+
+logger = get_logger(__name__)
+
+
+def _timed(fn, *args, **kwargs):
+    start = time.perf_counter()
+    result = fn(*args, **kwargs)
+    return result, time.perf_counter() - start
+
+
+def _s3_standin():
+    """The in-process S3 stand-in lives with the tests, outside the scripts shipped to Airflow."""
+    tests_dir = str(Path(__file__).resolve().parent.parent / "tests")
+    if tests_dir not in sys.path:
+        sys.path.append(tests_dir)
+    from s3_standin import S3StandIn
+    return S3StandIn
+
+# ------------------------------------------------------------------------------------------------------------------
+# Generation: columnar engine vs. original per-row path
+# ------------------------------------------------------------------------------------------------------------------
+
+def bench_generation(rows: int, ds: str = "2025-05-25"):
+    import data_generation as gen
+
+    contacts = gen.build_contacts_columnar(ds, rows, np.random.default_rng(0))
+    contact_ids = gen.uuid_strings_to_bytes(contacts['contact_id'])
+
+    # Warm the vocabulary cache so a one-off rebuild is not billed to the timed runs
+    for entity, build in gen.COLUMNAR_BUILDERS.items():
+        extra = () if entity == 'contacts' else (contact_ids,)
+        build(ds, 1, *extra, rng=np.random.default_rng(0))
+
+    print(f"{'entity':<18} {'rows':>8} {'rows/s (rows)':>15} {'rows/s (columnar)':>18} {'speedup':>8}")
+    for entity in ('contacts', 'form_fills', 'website_activity'):
+        extra = () if entity == 'contacts' else (contact_ids,)
+        _, t_rows = _timed(gen.ROW_BUILDERS[entity], ds, rows, *extra)
+        _, t_col = _timed(gen.COLUMNAR_BUILDERS[entity], ds, rows, *extra, rng=np.random.default_rng(1))
+        print(f"{entity:<18} {rows:>8} {rows / t_rows:>15,.0f} {rows / t_col:>18,.0f} {t_rows / t_col:>7.1f}x")
+
+
+def bench_sharding(rows: int, shard_counts=(1, 2, 4, 8), ds: str = "2025-05-25"):
+    """Wall time of sharded website_activity generation (contacts pre-generated, 1 shard)."""
+    import data_generation as gen
+
+    with tempfile.TemporaryDirectory() as td:
+        gen.RAW_DIR = gen.KEY_DIR = Path(td)  # forked shard workers inherit the redirect
+        gen.generate_contacts(gen.entity_file_name("contacts", ds), ds, n=rows, shards=1)
+
+        print(f"{'shards':>6} {'seconds':>9} {'rows/s':>12} {'speedup':>8}")
+        baseline = None
+        for shards in shard_counts:
+            _, t = _timed(gen.generate_website_activity, gen.entity_file_name("website_activity", ds), ds, n=rows, shards=shards)
+            baseline = baseline or t
+            print(f"{shards:>6} {t:>9.2f} {rows / t:>12,.0f} {baseline / t:>7.1f}x")
+
+
+def _peak_rss_mb() -> float:
+    """High-water RSS of this process. VmHWM is per address space, unlike ru_maxrss,
+    which Linux carries over from the parent across fork/exec."""
+    try:
+        with open('/proc/self/status') as fh:
+            for line in fh:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def _measure_read(mode: str, path: str, entity: str):
+    """Parse one file in a fresh process; return (seconds, peak RSS growth in MB)."""
+    import pandas as pd
+    import readers
+    from formats import entity_format
+
+    legacy = {'csv': pd.read_csv, 'ndjson': lambda p: pd.read_json(p, lines=True), 'parquet': pd.read_parquet}
+    base = _peak_rss_mb()
+    start = time.perf_counter()
+    if mode == 'pandas':
+        df = legacy[entity_format(entity)](path)
+    else:
+        df = readers.read_frame(path, entity)
+    elapsed = time.perf_counter() - start
+    peak = _peak_rss_mb()
+    del df
+    return elapsed, peak - base
+
+
+def bench_readers(rows: int, ds: str = "2025-05-25"):
+    """pandas readers vs. Arrow readers: parse time and peak RSS per fact entity."""
+    import data_generation as gen
+
+    ctx = multiprocessing.get_context('spawn')
+    with tempfile.TemporaryDirectory() as td:
+        gen.RAW_DIR = gen.KEY_DIR = Path(td)
+        files = {}
+        for entity, generate in (('contacts', gen.generate_contacts),
+                                 ('form_fills', gen.generate_form_fills),
+                                 ('website_activity', gen.generate_website_activity)):
+            files[entity] = Path(td) / gen.entity_file_name(entity, ds)
+            generate(files[entity].name, ds, n=rows, shards=1)
+
+        print(f"{'entity':<18} {'MB':>7} {'pandas s':>9} {'arrow s':>8} {'pandas RSS':>11} {'arrow RSS':>10}")
+        for entity, path in files.items():
+            result = {}
+            for mode in ('pandas', 'arrow'):
+                with ProcessPoolExecutor(max_workers=1, mp_context=ctx) as pool:
+                    result[mode] = pool.submit(_measure_read, mode, str(path), entity).result()
+            (t_pd, rss_pd), (t_ar, rss_ar) = result['pandas'], result['arrow']
+            size = path.stat().st_size / 2**20
+            print(f"{entity:<18} {size:>7.1f} {t_pd:>9.2f} {t_ar:>8.2f} {rss_pd:>9.0f}MB {rss_ar:>8.0f}MB")
+
+
+# ------------------------------------------------------------------------------------------------------------------
+# Metadata store: concurrent log_stage / check_stage_complete
+# ------------------------------------------------------------------------------------------------------------------
+
+# Settings reproducing the original store: rollback journal, full fsync, a new connection per call
+METADATA_MODES = {
+    'legacy': {'METADATA_JOURNAL_MODE': 'DELETE', 'METADATA_SYNCHRONOUS': 'FULL',
+               'METADATA_POOL_SIZE': '0', 'METADATA_BUSY_TIMEOUT_MS': '5000'},
+    'wal':    {'METADATA_JOURNAL_MODE': 'WAL', 'METADATA_SYNCHRONOUS': 'NORMAL',
+               'METADATA_POOL_SIZE': '4', 'METADATA_BUSY_TIMEOUT_MS': '30000'},
+    'behind': {'METADATA_JOURNAL_MODE': 'WAL', 'METADATA_SYNCHRONOUS': 'NORMAL',
+               'METADATA_POOL_SIZE': '4', 'METADATA_BUSY_TIMEOUT_MS': '30000',
+               'METADATA_WRITE_BEHIND': 'true'},
+}
+
+# An operation slower than this spent its time waiting on the database lock
+LOCK_WAIT_MS = 50
+
+
+def _metadata_module(env: dict, db_path: str):
+    """Import metadata in a fresh (spawned) process configured by `env`."""
+    os.environ.update(env, METADATA_DB_PATH=db_path)
+    import metadata
+    logging.getLogger(metadata.__name__).setLevel(logging.WARNING)
+    return metadata
+
+
+def _metadata_init(env: dict, db_path: str):
+    _metadata_module(env, db_path).init_metadata_db()
+
+
+def _metadata_worker(env: dict, db_path: str, worker: int, ops: int, files: int):
+    """Alternate log_stage / check_stage_complete; return per-op latencies and 'locked' errors."""
+    metadata = _metadata_module(env, db_path)
+    rng = np.random.default_rng(worker)
+    latencies = np.empty(ops)
+    locked = 0
+    for i in range(ops):
+        name = f"bench_{worker}_{rng.integers(files)}_2025-05-25.csv"
+        start = time.perf_counter()
+        while True:
+            try:
+                if i % 2:
+                    metadata.check_stage_complete(name, "uploaded")
+                else:
+                    metadata.log_stage(name, "bench", "2025-05-25", "uploaded")
+                break
+            except sqlite3.OperationalError as e:
+                if "locked" not in str(e):
+                    raise
+                locked += 1  # the busy timeout ran out; retry like an Airflow task would
+        latencies[i] = time.perf_counter() - start
+    metadata.flush_metadata()  # write-behind: pool workers exit without atexit hooks
+    return latencies, locked
+
+
+def bench_metadata(processes: int, ops: int, files: int = 50):
+    """Many processes hammering the metadata DB: ops/sec, latency and lock waits per mode."""
+    ctx = multiprocessing.get_context('spawn')
+    print(f"{'mode':<7} {'procs':>5} {'ops/s':>9} {'p50 ms':>7} {'p99 ms':>7} {'waits>' + str(LOCK_WAIT_MS) + 'ms':>11} {'locked':>7}")
+    for mode, env in METADATA_MODES.items():
+        with tempfile.TemporaryDirectory() as td:
+            db_path = str(Path(td) / "metadata.db")
+            with ProcessPoolExecutor(max_workers=processes, mp_context=ctx) as pool:
+                pool.submit(_metadata_init, env, db_path).result()
+                futures = [pool.submit(_metadata_worker, env, db_path, w, ops, files) for w in range(processes)]
+                results = [f.result() for f in futures]
+
+        # Wall time of the busiest worker, so process start-up is not billed
+        elapsed = max(r[0].sum() for r in results)
+        latencies = np.concatenate([r[0] for r in results]) * 1000
+        locked = sum(r[1] for r in results)
+        waits = int((latencies > LOCK_WAIT_MS).sum())
+        p50, p99 = np.percentile(latencies, [50, 99])
+        print(f"{mode:<7} {processes:>5} {len(latencies) / elapsed:>9,.0f} {p50:>7.2f} {p99:>7.2f} {waits:>11} {locked:>7}")
+
+
+def _db_size_mb(db_path: Path) -> float:
+    return sum(p.stat().st_size for p in db_path.parent.glob(db_path.name + "*")) / 2**20
+
+
+def bench_metadata_history(days: int, files_per_day: int, checks_per_file: int = 5, report_every: int = 30):
+    """
+    Simulate daily runs: stage rows and DQ checks per file per day. Report print_metadata latency
+    and DB size over time, for the base schema alone vs. migrations + daily dq_checks compaction.
+    """
+    import contextlib
+    import io
+    from datetime import date, timedelta
+    import metadata
+    from metadata_sqlite import MIGRATIONS, SQLiteBackend
+    logging.getLogger(metadata.__name__).setLevel(logging.WARNING)
+
+    variants = {'base': MIGRATIONS[:1], 'migrated': MIGRATIONS}
+    print(f"{'variant':<9} {'day':>4} {'dq_checks':>10} {'report ms':>10} {'DB MB':>7}")
+    for variant, migrations in variants.items():
+        with tempfile.TemporaryDirectory() as td:
+            backend = SQLiteBackend(Path(td) / "metadata.db")
+            previous = metadata.set_backend(backend)
+            backend.migrate(migrations)
+
+            start_day = date(2025, 1, 1)
+            for day in range(1, days + 1):
+                ds = (start_day + timedelta(days=day - 1)).isoformat()
+                for f in range(files_per_day):
+                    with metadata.DQRecorder(f"entity{f}_{ds}.csv", f"entity{f}", ds) as dq:
+                        for check in range(checks_per_file):
+                            dq.log_dq_result(f"check_{check}", "PASS", f"details for check {check}")
+                        dq.log_dq_signature("")
+                        dq.log_stage("validated")
+                if variant == 'migrated':
+                    metadata.compact_dq_checks(ds)
+
+                if day % report_every == 0 or day == days:
+                    with contextlib.redirect_stdout(io.StringIO()):
+                        _, t = _timed(metadata.print_metadata, ds)
+                    with backend.connection() as conn:
+                        conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+                        n_checks = conn.execute("SELECT COUNT(*) FROM dq_checks").fetchone()[0]
+                    print(f"{variant:<9} {day:>4} {n_checks:>10,} {t * 1000:>10.2f} {_db_size_mb(backend.path):>7.1f}")
+            backend.close()
+            metadata.set_backend(previous)
+
+
+# ------------------------------------------------------------------------------------------------------------------
+# Stage report: SQL aggregates over months of history vs. loading every row into Python
+# ------------------------------------------------------------------------------------------------------------------
+
+def _python_stage_report(ds: str, window_days: int) -> dict:
+    """Baseline: the same percentiles computed in Python from every file_metadata row."""
+    from datetime import date, datetime, timedelta
+    import metadata
+    start = (date.fromisoformat(ds) - timedelta(days=window_days - 1)).isoformat()
+    lags = {}
+    for row in metadata.get_all_metadata():
+        if not start <= row["file_date"] <= ds:
+            continue
+        ts = {s: row[f"{s}_at"] and datetime.fromisoformat(str(row[f"{s}_at"])) for s in metadata.STAGES}
+        for stage, a, b in (("validation", "generated", "validated"), ("upload", "validated", "uploaded"),
+                            ("end_to_end", "generated", "uploaded")):
+            if ts[a] and ts[b]:
+                lags.setdefault((row["dataset_type"], stage), []).append((ts[b] - ts[a]).total_seconds())
+    return {key: np.percentile(v, [50, 95]) for key, v in lags.items()}
+
+
+def bench_stage_report(days: int, files_per_day: int, windows=(7, 30, 90)):
+    """Fill `days` of stage history, then time the report for several trailing windows."""
+    from datetime import date, datetime, timedelta
+    import metadata
+    import stage_report
+    from metadata_sqlite import SQLiteBackend
+    logging.getLogger(metadata.__name__).setLevel(logging.WARNING)
+
+    rng = np.random.default_rng(0)
+    with tempfile.TemporaryDirectory() as td:
+        backend = SQLiteBackend(Path(td) / "metadata.db")
+        previous = metadata.set_backend(backend)
+        backend.migrate()
+
+        start_day = date(2025, 1, 1)
+        for day in range(days):
+            ds = (start_day + timedelta(days=day)).isoformat()
+            t0 = datetime.fromisoformat(f"{ds}T02:00:00")
+            stages = []
+            for f in range(files_per_day):
+                name, entity = f"entity{f % 6}_{ds}.part-{f:04d}.csv", f"entity{f % 6}"
+                validated = t0 + timedelta(seconds=float(rng.exponential(60)))
+                uploaded = validated + timedelta(seconds=float(rng.exponential(10)))
+                rows = int(rng.integers(10_000, 100_000))
+                stages += [(name, entity, ds, "generated", t0.isoformat(), rows),
+                           (name, entity, ds, "validated", validated.isoformat(), rows),
+                           (name, entity, ds, "uploaded", uploaded.isoformat(), None)]
+            backend.write_batch(stages=stages)
+
+        print(f"{days} days x {files_per_day} files ({days * files_per_day:,} file_metadata rows)")
+        print(f"{'window':>7} {'sql ms':>8} {'python ms':>10}")
+        for window in windows:
+            _, t_sql = _timed(stage_report.build_stage_report, ds, window)
+            _, t_py = _timed(_python_stage_report, ds, window)
+            print(f"{window:>7} {t_sql * 1000:>8.1f} {t_py * 1000:>10.1f}")
+        backend.close()
+        metadata.set_backend(previous)
+
+
+# ------------------------------------------------------------------------------------------------------------------
+# MinIO uploads: sequential vs. thread-pooled, against an in-process S3 stand-in with simulated latency
+# ------------------------------------------------------------------------------------------------------------------
+
+def bench_uploads(files: int, size_kb: int, latency_ms: float, concurrencies=(1, 4, 8, 16)):
+    """
+    Upload `files` files of `size_kb` through upload_directory at each concurrency level, with
+    minio's default client (10-connection pool) and with the shared client's pool sized to match.
+    """
+    import metadata
+    import upload_to_minio as up
+    from metadata_sqlite import SQLiteBackend
+    S3StandIn = _s3_standin()
+    logging.getLogger(metadata.__name__).setLevel(logging.WARNING)
+    logging.getLogger(up.__name__).setLevel(logging.WARNING)
+    logging.getLogger("urllib3").setLevel(logging.ERROR)  # "connection pool is full" on the default pool
+
+    payload = os.urandom(size_kb * 1024)
+    print(f"{files} files x {size_kb} KB, {latency_ms:g} ms per request")
+    print(f"{'pool':>7} {'workers':>7} {'seconds':>8} {'files/s':>8} {'speedup':>8} {'connections':>12}")
+    baseline = None
+    with S3StandIn(latency_s=latency_ms / 1000) as s3:
+        up._ensure_bucket(s3.client(), up.BUCKET_NAME)
+        for pool in ("default", "sized"):
+            for concurrency in concurrencies:
+                up.MINIO_POOL_SIZE = concurrency + 2
+                client = s3.client(http_client=up._http_pool()) if pool == "sized" else s3.client()
+                with tempfile.TemporaryDirectory() as td:
+                    up.VALID_DIR, up.UPLOAD_DIR = Path(td) / "valid", Path(td) / "uploaded"
+                    up.VALID_DIR.mkdir()
+                    for i in range(files):
+                        (up.VALID_DIR / f"contacts_2025-05-25.part-{i:04d}.csv").write_bytes(payload)
+                    backend = SQLiteBackend(Path(td) / "metadata.db")
+                    previous = metadata.set_backend(backend)
+                    backend.migrate()
+
+                    connections = s3.connections
+                    _, secs = _timed(up.upload_directory, client, up.VALID_DIR, "valid-data", concurrency)
+                    baseline = baseline or secs
+                    print(f"{pool:>7} {concurrency:>7} {secs:>8.2f} {files / secs:>8.1f} {baseline / secs:>7.1f}x"
+                          f" {s3.connections - connections:>12}")
+                    backend.close()
+                    metadata.set_backend(previous)
+
+def bench_minio_client(calls: int, latency_ms: float, connect_ms: float):
+    """
+    `calls` loader-style calls (get client, ensure bucket, list a prefix, download one object),
+    building a new client each call (old behaviour) vs. the shared pooled client.
+    """
+    from minio import Minio
+    import upload_to_minio as up
+    S3StandIn = _s3_standin()
+    logging.getLogger(up.__name__).setLevel(logging.WARNING)
+
+    print(f"{calls} calls, {latency_ms:g} ms per request, {connect_ms:g} ms per new connection")
+    print(f"{'client':>8} {'ms/call':>8} {'requests':>9} {'connections':>12}")
+    with S3StandIn(latency_s=latency_ms / 1000, connect_latency_s=connect_ms / 1000) as s3:
+        seed = s3.client()
+        seed.make_bucket(up.BUCKET_NAME)
+        seed.put_object(up.BUCKET_NAME, "valid-data/pages/2025-05-25/pages_2025-05-25.json", io.BytesIO(b"{}"), 2)
+        up.MINIO_ENDPOINT = s3.endpoint
+
+        def per_call():
+            return Minio(s3.endpoint, access_key="standin", secret_key="standin", secure=False)
+
+        for label, make_client in (("per-call", per_call), ("shared", up.get_minio_client)):
+            requests, connections = sum(s3.requests.values()), s3.connections
+
+            def call():
+                client = make_client()
+                up._ensure_bucket(client, up.BUCKET_NAME) if make_client is up.get_minio_client \
+                    else client.bucket_exists(up.BUCKET_NAME)
+                for obj in client.list_objects(up.BUCKET_NAME, prefix="valid-data/pages/", recursive=True):
+                    client.get_object(up.BUCKET_NAME, obj.object_name).read()
+
+            _, secs = _timed(lambda: [call() for _ in range(calls)])
+            print(f"{label:>8} {secs / calls * 1000:>8.1f} {(sum(s3.requests.values()) - requests) / calls:>9.1f}"
+                  f" {(s3.connections - connections) / calls:>12.2f}")
+
+
+def bench_upload_skip(files: int, size_mb: float, latency_ms: float, bandwidth_mb_s: float):
+    """Checksum-based skips: rerun unchanged, rerun after a metadata reset, rerun with new content."""
+    import metadata
+    import upload_to_minio as up
+    from metadata_sqlite import SQLiteBackend
+    S3StandIn = _s3_standin()
+    logging.getLogger(metadata.__name__).setLevel(logging.WARNING)
+    logging.getLogger(up.__name__).setLevel(logging.WARNING)
+
+    size = int(size_mb * 1024 * 1024)
+    print(f"{files} files x {size_mb:g} MB, {latency_ms:g} ms per request, {bandwidth_mb_s:g} MB/s per connection")
+    print(f"{'run':>22} {'seconds':>8} {'requests':>9} {'PUTs':>5} {'MB sent':>8}")
+    with S3StandIn(latency_s=latency_ms / 1000, bandwidth_mb_s=bandwidth_mb_s) as s3, \
+            tempfile.TemporaryDirectory() as td:
+        client = s3.client()
+        up._ensure_bucket(client, up.BUCKET_NAME)
+        up.VALID_DIR, up.UPLOAD_DIR = Path(td) / "valid", Path(td) / "uploaded"
+        up.VALID_DIR.mkdir()
+        backends = []
+
+        def fresh_metadata():
+            backend = SQLiteBackend(Path(td) / f"metadata{len(backends)}.db")
+            backend.migrate()
+            metadata.set_backend(backend)
+            backends.append(backend)
+
+        def produce(seed):
+            """Write the day's files into VALID_DIR and record their hashes, as validation does."""
+            rng = np.random.default_rng(seed)
+            for i in range(files):
+                path = up.VALID_DIR / f"contacts_2025-05-25.part-{i:04d}.csv"
+                path.write_bytes(rng.bytes(size))
+                with metadata.DQRecorder(path.name, "contacts", "2025-05-25") as dq:
+                    dq.log_checksum(path, "valid")
+
+        def run(label):
+            requests, puts, bytes_in = sum(s3.requests.values()), s3.requests.get("PUT", 0), s3.bytes_in
+            _, secs = _timed(up.upload_directory, client, up.VALID_DIR, "valid-data")
+            print(f"{label:>22} {secs:>8.2f} {sum(s3.requests.values()) - requests:>9}"
+                  f" {s3.requests.get('PUT', 0) - puts:>5} {(s3.bytes_in - bytes_in) / 2**20:>8.0f}")
+
+        fresh_metadata()
+        produce(0)
+        run("first upload")
+        produce(0)
+        run("rerun, unchanged")
+        fresh_metadata()
+        for f in up.UPLOAD_DIR.iterdir():
+            f.rename(up.VALID_DIR / f.name)
+        run("metadata reset")
+        produce(1)
+        run("regenerated content")
+        for backend in backends:
+            backend.close()
+
+
+def bench_multipart(size_mb: int, part_mb: float, latency_ms: float, bandwidth_mb_s: float, concurrencies=(1, 4, 8)):
+    """One large file: single fput_object vs parallel parts, and the bytes re-sent after a mid-upload failure."""
+    import metadata
+    import minio_multipart
+    import upload_to_minio as up
+    from metadata_sqlite import SQLiteBackend
+    S3StandIn = _s3_standin()
+    logging.getLogger(metadata.__name__).setLevel(logging.WARNING)
+    logging.getLogger(up.__name__).setLevel(logging.ERROR)
+
+    print(f"1 file x {size_mb} MB, {part_mb:g} MB parts, {latency_ms:g} ms per request,"
+          f" {bandwidth_mb_s:g} MB/s per connection")
+    print(f"{'path':>26} {'seconds':>8} {'MB/s':>7} {'MB sent':>8}")
+    with S3StandIn(latency_s=latency_ms / 1000, bandwidth_mb_s=bandwidth_mb_s) as s3, \
+            tempfile.TemporaryDirectory() as td:
+        client = s3.client(http_client=up._http_pool())
+        up._ensure_bucket(client, up.BUCKET_NAME)
+        backend = SQLiteBackend(Path(td) / "metadata.db")
+        backend.migrate()
+        previous = metadata.set_backend(backend)
+        path = Path(td) / "website_activity_2025-05-25.json"
+        path.write_bytes(np.random.default_rng(0).bytes(size_mb * 2**20))
+        sha256 = metadata.file_sha256(path)
+        up.MULTIPART_PART_SIZE_MB = part_mb
+
+        def run(label, fn, *args):
+            bytes_in = s3.bytes_in
+            try:
+                _, secs = _timed(fn, *args)
+                timing = f"{secs:>8.2f} {size_mb / secs:>7.1f}"
+            except Exception:
+                timing = f"{'failed':>16}"
+            print(f"{label:>26} {timing} {(s3.bytes_in - bytes_in) / 2**20:>8.0f}")
+
+        args = (client, path, up.BUCKET_NAME, "bench/" + path.name, "application/x-ndjson", sha256)
+        run("fput_object (before)", up._put_with_retry, *args)
+        for concurrency in concurrencies:
+            up.MULTIPART_CONCURRENCY = concurrency
+            run(f"parts x {concurrency}", up._multipart_put, *args)
+
+        # a connection that dies half way through: no retries left in this attempt, then the task retry
+        up.MULTIPART_CONCURRENCY, up.UPLOAD_RETRIES = concurrencies[-1], 0
+        n_parts = math.ceil(size_mb / part_mb)
+        upload_part = minio_multipart.upload_part
+
+        def dropped(client, bucket, name, data, upload_id, n):
+            if n > n_parts // 2:
+                raise ConnectionResetError("connection reset")
+            return upload_part(client, bucket, name, data, upload_id, n)
+
+        minio_multipart.upload_part = dropped
+        run("failed attempt", up._multipart_put, *args)
+        minio_multipart.upload_part = upload_part
+        run("retried attempt (resumed)", up._multipart_put, *args)
+        metadata.set_backend(previous)
+        backend.close()
+
+
+def bench_validation_sink(rows: int, chunk_rows: int, part_mb: float, latency_ms: float, bandwidth_mb_s: float):
+    """Validator output written locally then uploaded, vs streamed straight into the bucket as it is produced."""
+    import pandas as pd
+    import formats
+    import metadata
+    import upload_to_minio as up
+    from metadata_sqlite import SQLiteBackend
+    S3StandIn = _s3_standin()
+    logging.getLogger(metadata.__name__).setLevel(logging.WARNING)
+    logging.getLogger(up.__name__).setLevel(logging.ERROR)
+
+    name = "website_activity_2025-05-25.json"
+    rng = np.random.default_rng(0)
+    chunks = [
+        pd.DataFrame({"activity_id": np.arange(start, start + chunk_rows),
+                      "contact_id": rng.integers(0, 10**6, chunk_rows),
+                      "page_url": [f"https://example.com/p/{i % 997}" for i in range(chunk_rows)]})
+        for start in range(0, rows, chunk_rows)
+    ]
+    up.MULTIPART_PART_SIZE_MB = part_mb
+    print(f"{rows} rows in {len(chunks)} chunks, {part_mb:g} MB parts, {latency_ms:g} ms per request,"
+          f" {bandwidth_mb_s:g} MB/s per connection")
+    print(f"{'sink':>28} {'seconds':>8} {'local MB':>9} {'MB sent':>8}")
+    with S3StandIn(latency_s=latency_ms / 1000, bandwidth_mb_s=bandwidth_mb_s) as s3, \
+            tempfile.TemporaryDirectory() as td:
+        client = s3.client(http_client=up._http_pool())
+        up._ensure_bucket(client, up.BUCKET_NAME)
+        backend = SQLiteBackend(Path(td) / "metadata.db")
+        backend.migrate()
+        previous = metadata.set_backend(backend)
+
+        def local():
+            path = Path(td) / name
+            with formats.open_writer(path, "website_activity") as writer:
+                for chunk in chunks:
+                    writer.write(chunk)
+            sha256 = metadata.file_sha256(path)  # validation records it, the upload compares against it
+            args = (client, path, up.BUCKET_NAME, "local/" + name, "application/x-ndjson", sha256)
+            if path.stat().st_size >= up.mb_to_bytes(up.MULTIPART_THRESHOLD_MB):
+                up._multipart_put(*args)
+            else:
+                up._put_with_retry(*args)
+            return path.stat().st_size
+
+        def streamed():
+            sink = up.ObjectSink(client, up.BUCKET_NAME, "streamed/" + name, "application/x-ndjson")
+            with formats.open_writer(sink, "website_activity") as writer:
+                for chunk in chunks:
+                    writer.write(chunk)
+            sink.close()
+            return 0
+
+        for label, fn in (("local file, then upload", local), ("streamed to the bucket", streamed)):
+            bytes_in = s3.bytes_in
+            local_bytes, secs = _timed(fn)
+            print(f"{label:>28} {secs:>8.2f} {local_bytes / 2**20:>9.0f} {(s3.bytes_in - bytes_in) / 2**20:>8.0f}")
+        metadata.set_backend(previous)
+        backend.close()
+
+
+def bench_compaction(days: int, files_per_day: int, rows_per_file: int, latency_ms: float):
+    """A month of small daily objects: object count and full-month read time before vs after compaction."""
+    import pandas as pd
+    import compact_lake
+    import formats
+    import metadata
+    import upload_to_minio as up
+    from metadata_sqlite import SQLiteBackend
+    S3StandIn = _s3_standin()
+    for module in (metadata, up, compact_lake):
+        logging.getLogger(module.__name__).setLevel(logging.WARNING)
+
+    print(f"{days} days x {files_per_day} contacts files of {rows_per_file} rows, {latency_ms:g} ms per request")
+    print(f"{'lake':>16} {'objects':>8} {'KB':>8} {'read month s':>13}")
+    with S3StandIn(latency_s=latency_ms / 1000) as s3, tempfile.TemporaryDirectory() as td:
+        client = s3.client(http_client=up._http_pool())
+        up._ensure_bucket(client, up.BUCKET_NAME)
+        backend = SQLiteBackend(Path(td) / "metadata.db")
+        backend.migrate()
+        previous = metadata.set_backend(backend)
+        up.VALID_DIR, up.UPLOAD_DIR = Path(td) / "valid", Path(td) / "uploaded"
+        up.VALID_DIR.mkdir()
+        for day in range(1, days + 1):
+            ds = f"2025-05-{day:02d}"
+            for i in range(files_per_day):
+                path = up.VALID_DIR / f"contacts_{ds}.part-{i:04d}.csv"
+                formats.write_frame(pd.DataFrame({"contact_id": range(rows_per_file),
+                                                  "email": [f"u{n}@example.com" for n in range(rows_per_file)]}),
+                                    path, "contacts")
+                with metadata.DQRecorder(path.name, "contacts", ds) as dq:
+                    dq.log_checksum(path, "valid", rows=rows_per_file)
+        up.upload_directory(client, up.VALID_DIR, "valid-data")
+
+        def read_month():
+            objects = list(client.list_objects(up.BUCKET_NAME, prefix="valid-data/contacts/", recursive=True))
+            for obj in objects:
+                client.get_object(up.BUCKET_NAME, obj.object_name).read()
+            return objects
+
+        def report(label):
+            objects, secs = _timed(read_month)
+            print(f"{label:>16} {len(objects):>8} {sum(o.size for o in objects) / 1024:>8.0f} {secs:>13.2f}")
+
+        report("small objects")
+        _, secs = _timed(compact_lake.compact_month, "2025-05", client)
+        report("compacted")
+        print(f"compaction took {secs:.2f} s")
+        metadata.set_backend(previous)
+        backend.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Pipeline performance benchmarks")
+    sub = parser.add_subparsers(dest="bench", required=True)
+
+    p_gen = sub.add_parser("generation", help="row vs columnar generation throughput")
+    p_gen.add_argument("--rows", type=int, default=20000)
+
+    p_shard = sub.add_parser("sharding", help="sharded generation scaling across processes")
+    p_shard.add_argument("--rows", type=int, default=1_000_000)
+    p_shard.add_argument("--shards", type=int, nargs="+", default=[1, 2, 4, 8])
+
+    p_read = sub.add_parser("readers", help="pandas vs Arrow reader parse time and peak RSS")
+    p_read.add_argument("--rows", type=int, default=1_000_000)
+
+    p_meta = sub.add_parser("metadata", help="concurrent metadata DB writes/reads, legacy vs WAL + pool")
+    p_meta.add_argument("--processes", type=int, default=8)
+    p_meta.add_argument("--ops", type=int, default=2000, help="operations per process")
+
+    p_hist = sub.add_parser("metadata-history", help="report latency and DB size over a year of daily runs")
+    p_hist.add_argument("--days", type=int, default=365)
+    p_hist.add_argument("--files-per-day", type=int, default=50)
+
+    p_report = sub.add_parser("stage-report", help="stage latency report time over months of history")
+    p_report.add_argument("--days", type=int, default=365)
+    p_report.add_argument("--files-per-day", type=int, default=200)
+
+    p_up = sub.add_parser("uploads", help="sequential vs thread-pooled MinIO uploads (in-process S3 stand-in)")
+    p_up.add_argument("--files", type=int, default=200)
+    p_up.add_argument("--size-kb", type=int, default=256)
+    p_up.add_argument("--latency-ms", type=float, default=20.0)
+
+    p_client = sub.add_parser("minio-client", help="new MinIO client per call vs the shared pooled client")
+    p_client.add_argument("--calls", type=int, default=50)
+    p_client.add_argument("--latency-ms", type=float, default=5.0)
+    p_client.add_argument("--connect-ms", type=float, default=20.0, help="simulated TCP/TLS handshake")
+
+    p_skip = sub.add_parser("upload-skip", help="checksum-based upload skips across reruns")
+    p_skip.add_argument("--files", type=int, default=50)
+    p_skip.add_argument("--size-mb", type=float, default=8)
+    p_skip.add_argument("--latency-ms", type=float, default=20.0)
+    p_skip.add_argument("--bandwidth-mb-s", type=float, default=50.0)
+
+    p_mp = sub.add_parser("multipart", help="single-stream vs parallel multipart upload of one large file")
+    p_mp.add_argument("--size-mb", type=int, default=256)
+    p_mp.add_argument("--part-mb", type=float, default=16)
+    p_mp.add_argument("--latency-ms", type=float, default=20.0)
+    p_mp.add_argument("--bandwidth-mb-s", type=float, default=50.0)
+
+    p_sink = sub.add_parser("validation-sink", help="validator output via local disk vs streamed to MinIO")
+    p_sink.add_argument("--rows", type=int, default=2_000_000)
+    p_sink.add_argument("--chunk-rows", type=int, default=250_000)
+    p_sink.add_argument("--part-mb", type=float, default=16)
+    p_sink.add_argument("--latency-ms", type=float, default=20.0)
+    p_sink.add_argument("--bandwidth-mb-s", type=float, default=50.0)
+
+    p_compact = sub.add_parser("compaction", help="a month of small objects vs the compacted monthly object")
+    p_compact.add_argument("--days", type=int, default=31)
+    p_compact.add_argument("--files-per-day", type=int, default=6)
+    p_compact.add_argument("--rows-per-file", type=int, default=50)
+    p_compact.add_argument("--latency-ms", type=float, default=20.0)
+
+    args = parser.parse_args()
+    if args.bench == "generation":
+        bench_generation(args.rows)
+    elif args.bench == "sharding":
+        bench_sharding(args.rows, args.shards)
+    elif args.bench == "readers":
+        bench_readers(args.rows)
+    elif args.bench == "metadata":
+        bench_metadata(args.processes, args.ops)
+    elif args.bench == "metadata-history":
+        bench_metadata_history(args.days, args.files_per_day)
+    elif args.bench == "stage-report":
+        bench_stage_report(args.days, args.files_per_day)
+    elif args.bench == "uploads":
+        bench_uploads(args.files, args.size_kb, args.latency_ms)
+    elif args.bench == "minio-client":
+        bench_minio_client(args.calls, args.latency_ms, args.connect_ms)
+    elif args.bench == "upload-skip":
+        bench_upload_skip(args.files, args.size_mb, args.latency_ms, args.bandwidth_mb_s)
+    elif args.bench == "multipart":
+        bench_multipart(args.size_mb, args.part_mb, args.latency_ms, args.bandwidth_mb_s)
+    elif args.bench == "validation-sink":
+        bench_validation_sink(args.rows, args.chunk_rows, args.part_mb, args.latency_ms, args.bandwidth_mb_s)
+    elif args.bench == "compaction":
+        bench_compaction(args.days, args.files_per_day, args.rows_per_file, args.latency_ms)
+
+
+if __name__ == "__main__":
+    main()
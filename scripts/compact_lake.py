@@ -0,0 +1,247 @@
+"""
+Small-file compaction for the valid-data lake in MinIO.
+
+Every run adds one small object per entity and day under valid-data/<entity>/<ds>/ (dimension
+files are a few hundred bytes). Once a month is COMPACTION_LAG_DAYS old, its small objects are
+merged per entity into one Parquet object:
+
+    valid-data/<entity>/<YYYY-MM>/<entity>_<YYYY-MM>.parquet
+
+with a SOURCE_COLUMN naming the file each row came from, written as that file's own row
+groups, so the rows of any one day can still be read without scanning the month. Then:
+  1) metadata DB --> compacted_objects / compacted_files record which object now holds each file
+  2) manifests   --> every day whose manifest does not point at the current merged objects is
+                     rewritten from the DB (the manifest swap), with a row filter per file
+  3) the small objects of merged files still in the bucket are deleted
+
+Steps 2 and 3 run on every pass over a month, whether or not anything new was merged, so a run
+that failed after step 1 is finished by the next one.
+
+Loads and replays go through the manifests (see snowflake_upload.py), so they read the merged
+object from then on. A file re-uploaded with new content is no longer covered by the merge and
+is listed as its own object again, until the next compaction of its month takes it in.
+Objects of COMPACTION_SMALL_OBJECT_MB and up are already right-sized and are left alone.
+"""
+import os
+import tempfile
+from datetime import date, datetime, timedelta
+from pathlib import Path
+from metadata import get_checksums, get_compactions, record_compaction
+from formats import EXTENSIONS, ParquetBatchWriter
+from readers import iter_frames, read_frame
+from upload_to_minio import (
+    BUCKET_NAME,
+    SOURCE_COLUMN,
+    ObjectSink,
+    bucket_object_name,
+    get_minio_client,
+    infer_object_path,
+    mb_to_bytes,
+    read_manifest,
+    with_retry,
+    write_manifest,
+)
+from logging_config import get_logger
+
+logger = get_logger(__name__)
+
+# Months that ended at least this many days ago are compacted (late re-uploads land before then)
+COMPACTION_LAG_DAYS = int(os.getenv("COMPACTION_LAG_DAYS", "7"))
+# How many closed months back each run looks; already compacted months cost a few metadata queries
+COMPACTION_LOOKBACK_MONTHS = int(os.getenv("COMPACTION_LOOKBACK_MONTHS", "3"))
+# Objects from this size up are not merged
+COMPACTION_SMALL_OBJECT_MB = float(os.getenv("COMPACTION_SMALL_OBJECT_MB", "64"))
+COMPACTION_COMPRESSION = os.getenv("COMPACTION_COMPRESSION", "zstd")
+COMPACTION_CHUNK_ROWS = int(os.getenv("COMPACTION_CHUNK_ROWS", "250000"))
+
+_FORMATS_BY_EXTENSION = {ext: fmt for fmt, ext in EXTENSIONS.items()}
+
+
+def compacted_object_name(entity: str, period: str) -> str:
+    return f"valid-data/{entity}/{period}/{entity}_{period}.parquet"
+
+
+def _last_day(day: date) -> date:
+    return (day.replace(day=28) + timedelta(days=4)).replace(day=1) - timedelta(days=1)
+
+
+def _month_days(period: str) -> list:
+    first = datetime.strptime(period, "%Y-%m").date()
+    return [(first + timedelta(days=i)).isoformat() for i in range(_last_day(first).day)]
+
+
+def closed_months(ds: str, lag_days: int = COMPACTION_LAG_DAYS, lookback: int = COMPACTION_LOOKBACK_MONTHS) -> list:
+    """The `lookback` most recent months (YYYY-MM, oldest first) that ended at least `lag_days` before `ds`."""
+    cutoff = datetime.strptime(ds, "%Y-%m-%d").date() - timedelta(days=lag_days)
+    last = cutoff if cutoff == _last_day(cutoff) else cutoff.replace(day=1) - timedelta(days=1)
+    months = []
+    for _ in range(lookback):
+        months.append(last.strftime("%Y-%m"))
+        last = last.replace(day=1) - timedelta(days=1)
+    return months[::-1]
+
+# ------------------------------------------------------------------------------------------------------------------
+# Sources: the month's valid files in the bucket, and where each one's rows are now
+# ------------------------------------------------------------------------------------------------------------------
+
+def _month_sources(period: str) -> dict:
+    """
+    {entity: [source, ...]} for the month's uploaded valid files, each source a dict with the
+    file's name, date, content hash, row count, and the object currently holding its rows:
+    the merged object (`merged` True) or its own small object.
+    """
+    by_entity = {}
+    for day in _month_days(period):
+        recorded = get_checksums(None, "valid", file_date=day)
+        merged = get_compactions(recorded)
+        for name, rec in sorted(recorded.items()):
+            if rec["uploaded_sha256"] != rec["sha256"]:
+                continue  # its validated content never reached the bucket
+            entity, _ = infer_object_path(name)
+            comp = merged.get(name)
+            in_merge = comp is not None and comp["sha256"] == rec["sha256"]
+            by_entity.setdefault(entity, []).append({
+                "file_name": name, "file_date": day, "sha256": rec["sha256"], "size_bytes": rec["size_bytes"],
+                "row_count": rec["row_count"], "merged": in_merge,
+                "object_name": comp["object_name"] if in_merge else bucket_object_name("valid-data", name),
+                "object_sha256": comp["object_sha256"] if in_merge else None,
+            })
+    return by_entity
+
+
+def _source_frames(client, source: dict, entity: str, workdir: Path, merged_copy: Path):
+    """The rows of one source, in chunks: from the previous merged object, or its own small object."""
+    if source["merged"]:
+        frame = read_frame(merged_copy, entity, fmt="parquet", filters=[(SOURCE_COLUMN, "==", source["file_name"])])
+        yield frame.drop(columns=[SOURCE_COLUMN])
+        return
+    local = workdir / source["file_name"]
+    with_retry(f"Download of {source['object_name']}", client.fget_object,
+                BUCKET_NAME, source["object_name"], str(local))
+    try:
+        fmt = _FORMATS_BY_EXTENSION[local.suffix]
+        yield from iter_frames(local, entity, COMPACTION_CHUNK_ROWS, fmt)
+    finally:
+        local.unlink()
+
+# ------------------------------------------------------------------------------------------------------------------
+# Compaction
+# ------------------------------------------------------------------------------------------------------------------
+
+def compact_entity_month(client, entity: str, period: str, sources: list) -> dict:
+    """
+    Merge an entity's small sources of `period` (with what an earlier merge already holds) into
+    its monthly object and record the merge; the sources merged are updated in place to point at
+    it. Returns a summary; with nothing new to merge the object is left untouched.
+    """
+    target = compacted_object_name(entity, period)
+    small = mb_to_bytes(COMPACTION_SMALL_OBJECT_MB)
+    pending = [s for s in sources if not s["merged"] and (s["size_bytes"] or 0) < small]
+    if not pending:
+        return {"entity": entity, "period": period, "merged": 0}
+    # everything the new object holds: the earlier merge's files plus the new small ones
+    members = [s for s in sources if s["merged"] and s["object_name"] == target] + pending
+    members.sort(key=lambda s: (s["file_date"], s["file_name"]))
+
+    with tempfile.TemporaryDirectory() as td:
+        workdir = Path(td)
+        merged_copy = workdir / "previous.parquet"
+        if any(s["merged"] for s in members):
+            # read before it is replaced; the new object only becomes visible once completed
+            with_retry(f"Download of {target}", client.fget_object, BUCKET_NAME, target, str(merged_copy))
+
+        rows = {}
+        sink = ObjectSink(client, BUCKET_NAME, target, "application/vnd.apache.parquet")
+        with sink, ParquetBatchWriter(sink, COMPACTION_COMPRESSION) as writer:
+            for source in members:
+                rows[source["file_name"]] = 0
+                for frame in _source_frames(client, source, entity, workdir, merged_copy):
+                    # one source per write: its rows stay in their own row groups
+                    writer.write(frame.assign(**{SOURCE_COLUMN: source["file_name"]}))
+                    rows[source["file_name"]] += len(frame)
+
+    record_compaction(target, entity, period, sink.sha256, sink.size,
+                      [(s["file_name"], s["file_date"], s["sha256"], rows[s["file_name"]]) for s in members])
+    for source in members:
+        source.update(merged=True, object_name=target, object_sha256=sink.sha256)
+
+    days = sorted({s["file_date"] for s in members})
+    summary = {
+        "entity": entity, "period": period, "object_name": target, "merged": len(pending),
+        "files": len(members), "days": len(days), "size_bytes": sink.size,
+        "source_bytes": sum(s["size_bytes"] or 0 for s in pending),
+    }
+    logger.info(f"🗜️ {target}: merged {len(pending)} small objects ({summary['source_bytes']} bytes)"
+                f" into {len(members)} files over {len(days)} days, {sink.size} bytes")
+    return summary
+
+
+def _stale_manifest(manifest: dict, merged: list) -> bool:
+    """True unless the day's manifest lists every merged file in its current merged object."""
+    if manifest is None:
+        return True
+    entries = {f.get("file_name"): f for f in manifest["files"]}
+    return any(
+        (entries.get(s["file_name"]) or {}).get("object_name") != s["object_name"]
+        or entries[s["file_name"]]["sha256"] != s["object_sha256"]
+        for s in merged
+    )
+
+
+def swap_manifests(client, merged: list) -> list:
+    """Rewrite the manifest of every day with merged files it does not point at yet; returns those days."""
+    by_day = {}
+    for source in merged:
+        by_day.setdefault(source["file_date"], []).append(source)
+    stale = [day for day, files in sorted(by_day.items()) if _stale_manifest(read_manifest(client, day), files)]
+    for day in stale:
+        write_manifest(client, day)
+    return stale
+
+
+def remove_merged_objects(client, period: str, by_entity: dict) -> int:
+    """Delete the small objects of merged files still in the bucket (one listing per entity); returns the count."""
+    removed = 0
+    for entity, sources in sorted(by_entity.items()):
+        small = {bucket_object_name("valid-data", s["file_name"]) for s in sources if s["merged"]}
+        if not small:
+            continue
+        # day prefixes only: valid-data/<entity>/<YYYY-MM>-<DD>/, not the monthly object's folder
+        listed = client.list_objects(BUCKET_NAME, prefix=f"valid-data/{entity}/{period}-", recursive=True)
+        for name in sorted({o.object_name for o in listed} & small):
+            with_retry(f"Removal of {name}", client.remove_object, BUCKET_NAME, name)
+            removed += 1
+    return removed
+
+
+def compact_month(period: str, client=None) -> list:
+    """
+    Compact every entity's small objects of `period` (YYYY-MM), then bring the month's manifests
+    and small objects in line with what the metadata DB records as merged, so the tail of an
+    interrupted run is redone. Returns one summary per entity.
+    """
+    client = client or get_minio_client()
+    by_entity = _month_sources(period)
+    summaries = [compact_entity_month(client, entity, period, sources) for entity, sources in sorted(by_entity.items())]
+    # manifests first: a small object is only deleted once no manifest points at it
+    swapped = swap_manifests(client, [s for sources in by_entity.values() for s in sources if s["merged"]])
+    removed = remove_merged_objects(client, period, by_entity)
+    if swapped or removed:
+        logger.info(f"🔁 {period}: {len(swapped)} manifests swapped, {removed} merged small objects removed")
+    return summaries
+
+
+def compact_lake(ds: str = None, **kwargs) -> list:
+    """Airflow task: compact the closed months within the lookback window before `ds` (default: today)."""
+    ds = ds or datetime.utcnow().date().isoformat()
+    client = get_minio_client()
+    summaries = []
+    for period in closed_months(ds):
+        summaries += [s for s in compact_month(period, client) if s["merged"]]
+    logger.info(f"🧹 Lake compaction for {ds}: {sum(s['merged'] for s in summaries)} small objects merged"
+                f" into {len(summaries)} monthly objects")
+    return summaries
+
+
+if __name__ == "__main__":
+    compact_lake()
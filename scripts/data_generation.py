@@ -1,14 +1,19 @@
 import os
-import json
 import uuid
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
 import pandas as pd
-import pyarrow as pa
-import pyarrow.parquet as pq
 from faker import Faker
 from pathlib import Path
 import random
-from metadata import log_stage, check_stage_complete
+from metadata import flushes_metadata, log_stage, check_stage_complete, completed_files, get_stage_status
 from logging_config import get_logger
+import vocab_cache
+from formats import BatchWriter, entity_file_name, open_writer, write_frame
+from readers import read_table
+from sharding import (
+    GENERATION_SHARDS, all_file_parts, part_file_name, logical_file_parts, split_counts, shard_seeds,
+)
 
 # Initialize Faker and logger
 fake = Faker()
@@ -18,12 +23,19 @@ logger = get_logger(__name__)
 SCALE_FACTOR = int(os.getenv('SCALE_FACTOR', '1'))
 BASE_COUNT = 1000 * SCALE_FACTOR
 
+# Generation engine: 'columnar' builds whole columns with NumPy, 'rows' is the original per-row Faker path
+GENERATION_ENGINE = os.getenv('GENERATION_ENGINE', 'columnar')
+# Rows built and written per batch; bounds generator memory regardless of SCALE_FACTOR
+GENERATION_BATCH_SIZE = int(os.getenv('GENERATION_BATCH_SIZE', '100000'))
+
 # Directories
 RAW_DIR = Path("/opt/airflow/data/raw_data")
 VALID_DIR = Path("/opt/airflow/data/validated_data")
 UPLOAD_DIR = Path("/opt/airflow/data/uploaded_data")
 QUARANTINE_DIR = Path("/opt/airflow/data/quarantine_data")
-for d in (RAW_DIR, VALID_DIR, UPLOAD_DIR, QUARANTINE_DIR):
+KEY_DIR = Path("/opt/airflow/data/key_index")  # fixed-width contact_id indexes shared by fact generators
+KEYED_ENTITIES = ('form_fills', 'website_activity')  # fact generators that sample contact_ids from it
+for d in (RAW_DIR, VALID_DIR, UPLOAD_DIR, QUARANTINE_DIR, KEY_DIR):
     d.mkdir(parents=True, exist_ok=True)
 
 # Dimension universes for realistic joins
@@ -45,13 +57,20 @@ PAGES = [
     {"page_id": 4, "page_url": "/blog", "page_title": "Blog Page"},
 ]
 
+# Categorical universes shared by both engines
+INDUSTRIES = ['Technology', 'Finance', 'Healthcare', 'Education', 'Retail']
+LEAD_SOURCES = ['Web', 'Email', 'Event', 'Referral', 'Organic Search', 'Paid Social']
+EVENT_TYPES = ['page_view', 'button_click', 'form_submit', 'video_play']
+CAMPAIGN_WEIGHTS = [0.7, 0.2, 0.1]
+
 # ------------------------------------------------------------------------------------------------------------------
 # Generation hooks: dimensions, contacts, form_fills, activity
 # ------------------------------------------------------------------------------------------------------------------
 
+@flushes_metadata
 def generate_dimension_if_needed(name: str, ds: str, **kwargs):
-    """Generate dimension JSON based on name without passing data explicitly."""
-    file_name = f"{name}_{ds}.json"
+    """Generate dimension file based on name without passing data explicitly."""
+    file_name = entity_file_name(name, ds)
     if check_stage_complete(file_name, "generated"):
         logger.info(f"⏩ Skipping {file_name}, already generated")
         return
@@ -74,43 +93,280 @@ def generate_dimension_if_needed(name: str, ds: str, **kwargs):
         data.append(rec_with_date)
 
     # Write file and log
-    with open(RAW_DIR / file_name, "w") as f:
-        json.dump(data, f, indent=2)
-    log_stage(file_name, name, ds, "generated")
+    write_frame(pd.DataFrame(data), RAW_DIR / file_name, name)
+    log_stage(file_name, name, ds, "generated", rows=len(data))
     logger.info(f"✅ Generated {file_name} with {len(data)} records")
 
 
+@flushes_metadata
 def generate_contacts_if_needed(ds: str, **kwargs):
-    file_name = f"contacts_{ds}.csv"
+    file_name = entity_file_name('contacts', ds)
     if check_stage_complete(file_name, "generated"):
         logger.info(f"⏩ Skipping {file_name}, already generated")
         return
-    generate_contacts(file_name, ds)
-    log_stage(file_name, "contacts", ds, "generated")
+    rows = generate_contacts(file_name, ds)
+    log_stage(file_name, "contacts", ds, "generated", rows=rows)
 
 
+@flushes_metadata
 def generate_form_fills_if_needed(ds: str, **kwargs):
-    file_name = f"form_fills_{ds}.parquet"
+    file_name = entity_file_name('form_fills', ds)
     if check_stage_complete(file_name, "generated"):
         logger.info(f"⏩ Skipping {file_name}, already generated")
         return
-    generate_form_fills(file_name, ds)
-    log_stage(file_name, "form_fills", ds, "generated")
+    rows = generate_form_fills(file_name, ds)
+    log_stage(file_name, "form_fills", ds, "generated", rows=rows)
+    prune_contact_keys(ds)
 
 
+@flushes_metadata
 def generate_website_activity_if_needed(ds: str, **kwargs):
-    file_name = f"website_activity_{ds}.json"
+    file_name = entity_file_name('website_activity', ds)
     if check_stage_complete(file_name, "generated"):
         logger.info(f"⏩ Skipping {file_name}, already generated")
         return
-    generate_website_activity(file_name, ds)
-    log_stage(file_name, "website_activity", ds, "generated")
+    rows = generate_website_activity(file_name, ds)
+    log_stage(file_name, "website_activity", ds, "generated", rows=rows)
+    prune_contact_keys(ds)
 
 # ------------------------------------------------------------------------------------------------------------------
 # Core generators: contacts, form_fills, website_activity with shared keys and enriched columns
 # ------------------------------------------------------------------------------------------------------------------
 
-def generate_contacts(file_name: str, ds: str, n: int = BASE_COUNT):
+def generate_contacts(file_name: str, ds: str, n: int = BASE_COUNT, shards: int = GENERATION_SHARDS) -> int:
+    return _generate_entity('contacts', file_name, ds, n, shards)
+
+
+def generate_form_fills(file_name: str, ds: str, n: int = BASE_COUNT, shards: int = GENERATION_SHARDS) -> int:
+    return _generate_entity('form_fills', file_name, ds, n, shards)
+
+
+def generate_website_activity(file_name: str, ds: str, n: int = BASE_COUNT, shards: int = GENERATION_SHARDS) -> int:
+    return _generate_entity('website_activity', file_name, ds, n, shards)
+
+
+def _generate_entity(entity: str, file_name: str, ds: str, n: int, shards: int) -> int:
+    """
+    Generate one logical file, either in-process or as `shards` part files
+    written in parallel by a process pool. Shard i always gets the same seed
+    for a given (ds, GENERATION_SEED, shards), so reruns are reproducible.
+    Returns the number of rows written.
+    """
+    # Clear leftovers from earlier attempts (possibly with different shard counts): whole file and parts
+    for stale in all_file_parts(RAW_DIR, file_name):
+        stale.unlink()
+    if entity == 'contacts':
+        for stale in all_file_parts(KEY_DIR, contact_keys_name(ds)):
+            stale.unlink()
+
+    seeds = shard_seeds(ds, entity, shards)
+    if shards <= 1:
+        rows = _generate_shard(entity, ds, n, RAW_DIR / file_name, seeds[0])
+        logger.info(f"✅ {file_name} generated ({rows} rows)")
+        return rows
+
+    if GENERATION_ENGINE == 'columnar':
+        vocab_cache.load_vocabulary()  # map (or rebuild) once; forked workers inherit the mapping
+    jobs = [
+        (entity, ds, count, RAW_DIR / part_file_name(file_name, i), seeds[i])
+        for i, count in enumerate(split_counts(n, shards))
+    ]
+    with ProcessPoolExecutor(max_workers=min(shards, os.cpu_count() or 1)) as pool:
+        rows = sum(pool.map(_generate_shard, *zip(*jobs)))
+    logger.info(f"✅ {file_name} generated ({rows} rows in {shards} shards)")
+    return rows
+
+
+def _generate_shard(entity: str, ds: str, n: int, path: Path, seed) -> int:
+    """Build and stream one shard to disk batch by batch; runs in a worker process when sharded."""
+    extra = () if entity == 'contacts' else (load_contact_keys(ds),)
+    rng = np.random.default_rng(seed)
+    rows = 0
+    writer = ContactsBatchWriter(path) if entity == 'contacts' else open_writer(path, entity)
+    with writer:
+        for batch_n in _batch_counts(n):
+            df = _build(entity, ds, batch_n, *extra, rng=rng)
+            writer.write(df)
+            rows += len(df)
+    return rows
+
+
+def _batch_counts(n: int, batch_size: int = GENERATION_BATCH_SIZE):
+    """Yield batch sizes summing to n (a single empty batch when n == 0, so the file is still created)."""
+    yield min(n, batch_size)
+    for start in range(batch_size, n, batch_size):
+        yield min(batch_size, n - start)
+
+
+def contact_keys_name(ds: str) -> str:
+    return f"contacts_{ds}.keys"
+
+
+def load_contact_keys(ds: str) -> np.ndarray:
+    """
+    Return every contact_id for `ds` as an (n, 16) uint8 array. The binary key index
+    written next to the contacts file is memory-mapped; the CSV is only parsed as a
+    fallback when the index is missing (e.g. contacts generated by an older run).
+    """
+    parts = logical_file_parts(KEY_DIR, contact_keys_name(ds))
+    if parts:
+        keys = [np.memmap(p, dtype=np.uint8, mode='r').reshape(-1, 16) for p in parts]
+        return keys[0] if len(keys) == 1 else np.concatenate(keys)
+
+    contacts_file = entity_file_name('contacts', ds)
+    parts = logical_file_parts(RAW_DIR, contacts_file)
+    if not parts:
+        raise FileNotFoundError(f"{contacts_file} not generated yet")
+    logger.warning(f"⚠️ No key index for contacts_{ds}, parsing CSV")
+    return np.concatenate([
+        uuid_strings_to_bytes(read_table(p, 'contacts', columns=['contact_id']).column('contact_id').to_pylist())
+        for p in parts
+    ])
+
+
+def prune_contact_keys(ds: str):
+    """Delete the contact key index for `ds` once every fact generator that samples it has finished."""
+    fact_files = [entity_file_name(entity, ds) for entity in KEYED_ENTITIES]
+    if completed_files(fact_files, "generated") != set(fact_files):
+        return
+    for path in all_file_parts(KEY_DIR, contact_keys_name(ds)):
+        path.unlink(missing_ok=True)  # the other fact task may prune concurrently
+        logger.info(f"🧹 Removed contact key index {path.name}")
+
+
+class ContactsBatchWriter(BatchWriter):
+    """Contacts file plus its 16-byte-per-row key index in KEY_DIR (same part naming, .keys suffix)."""
+
+    def __init__(self, path: Path):
+        super().__init__(path)
+        self._data = open_writer(path, 'contacts')
+        self._keys = open(KEY_DIR / path.with_suffix('.keys').name, 'wb')
+
+    def write(self, df: pd.DataFrame):
+        self._data.write(df)
+        self._keys.write(uuid_strings_to_bytes(df['contact_id']).tobytes())
+
+    def close(self):
+        self._data.close()
+        self._keys.close()
+
+
+def _build(entity: str, ds: str, n: int, *args, rng: np.random.Generator) -> pd.DataFrame:
+    """Dispatch to the configured generation engine for one entity."""
+    if GENERATION_ENGINE == 'rows':
+        return ROW_BUILDERS[entity](ds, n, *args)  # unseeded: not reproducible
+    if GENERATION_ENGINE == 'columnar':
+        return COLUMNAR_BUILDERS[entity](ds, n, *args, rng=rng)
+    raise ValueError(f"Unknown GENERATION_ENGINE: {GENERATION_ENGINE}")
+
+# ------------------------------------------------------------------------------------------------------------------
+# Columnar engine: every column is drawn as a whole array, then assembled into one DataFrame
+# ------------------------------------------------------------------------------------------------------------------
+
+_HEX_DIGITS = np.frombuffer(b"0123456789abcdef", dtype=np.uint8)
+_UUID_HEX_POS = [i for i in range(36) if i not in (8, 13, 18, 23)]
+
+
+def uuid4_bytes(rng: np.random.Generator, n: int) -> np.ndarray:
+    """Draw n random version-4 UUIDs as an (n, 16) uint8 array."""
+    raw = rng.integers(0, 256, size=(n, 16), dtype=np.uint8)
+    raw[:, 6] = (raw[:, 6] & 0x0F) | 0x40   # version 4
+    raw[:, 8] = (raw[:, 8] & 0x3F) | 0x80   # RFC 4122 variant
+    return raw
+
+
+def format_uuids(raw: np.ndarray) -> np.ndarray:
+    """Render an (n, 16) uint8 array as canonical 36-char UUID strings."""
+    nibbles = np.empty((len(raw), 32), dtype=np.uint8)
+    nibbles[:, 0::2] = raw >> 4
+    nibbles[:, 1::2] = raw & 0x0F
+    chars = np.full((len(raw), 36), ord('-'), dtype=np.uint8)
+    chars[:, _UUID_HEX_POS] = _HEX_DIGITS[nibbles]
+    return chars.view('S36').ravel().astype(str)
+
+
+def uuid_strings_to_bytes(ids) -> np.ndarray:
+    """Inverse of format_uuids: canonical UUID strings -> (n, 16) uint8 array."""
+    hex_str = "".join(ids).replace('-', '')
+    return np.frombuffer(bytes.fromhex(hex_str), dtype=np.uint8).reshape(-1, 16)
+
+
+def _sample_keys(rng: np.random.Generator, keys: np.ndarray, n: int) -> np.ndarray:
+    """Draw n foreign keys uniformly from an (m, 16) key index."""
+    return format_uuids(keys[rng.integers(0, len(keys), n)])
+
+
+def _sample_faker(rng: np.random.Generator, kind: str, n: int) -> np.ndarray:
+    return vocab_cache.sample(rng, kind, n)
+
+
+def unique_emails(emails, contact_ids) -> np.ndarray:
+    """
+    Make sampled emails unique per row by appending the row's contact_id (hex) to the local part;
+    the pools repeat values, while staging and the marts test `email` as unique.
+    """
+    parts = pd.Series(emails, dtype=object).str.partition('@')
+    tokens = pd.Series(contact_ids, dtype=object).str.replace('-', '', regex=False)
+    return (parts[0] + '.' + tokens + '@' + parts[2]).to_numpy()
+
+
+def _campaign_ids(rng: np.random.Generator, n: int) -> np.ndarray:
+    return rng.choice([c['campaign_id'] for c in CAMPAIGNS], size=n, p=CAMPAIGN_WEIGHTS)
+
+
+def build_contacts_columnar(ds: str, n: int, rng: np.random.Generator) -> pd.DataFrame:
+    contact_ids = format_uuids(uuid4_bytes(rng, n))
+    return pd.DataFrame({
+        'contact_id': contact_ids,
+        'first_name': _sample_faker(rng, 'first_name', n),
+        'last_name': _sample_faker(rng, 'last_name', n),
+        'email': unique_emails(_sample_faker(rng, 'email', n), contact_ids),
+        'company': _sample_faker(rng, 'company', n),
+        'industry': rng.choice(INDUSTRIES, size=n),
+        'lead_source': rng.choice(LEAD_SOURCES, size=n),
+        'job_title': _sample_faker(rng, 'job', n),
+        'country': _sample_faker(rng, 'country', n),
+        'opted_in': rng.integers(0, 2, n).astype(bool),
+        'signup_date': ds,
+    })
+
+
+def build_form_fills_columnar(ds: str, n: int, contact_keys: np.ndarray, rng: np.random.Generator) -> pd.DataFrame:
+    return pd.DataFrame({
+        'fill_id': format_uuids(uuid4_bytes(rng, n)),
+        'form_id': rng.choice([f['form_id'] for f in FORMS], size=n),
+        'contact_id': _sample_keys(rng, contact_keys, n),
+        'campaign_id': _campaign_ids(rng, n),
+        'fill_date': ds,
+        'referrer_url': _sample_faker(rng, 'url', n),
+        'user_agent': _sample_faker(rng, 'user_agent', n),
+        'estimated_value': np.round(rng.uniform(100.0, 10000.0, n), 2),
+    })
+
+
+def build_website_activity_columnar(ds: str, n: int, contact_keys: np.ndarray, rng: np.random.Generator) -> pd.DataFrame:
+    page = rng.integers(0, len(PAGES), n)
+    pages_viewed = rng.integers(1, 11, n)
+    return pd.DataFrame({
+        'session_id': format_uuids(uuid4_bytes(rng, n)),
+        'contact_id': _sample_keys(rng, contact_keys, n),
+        'campaign_id': _campaign_ids(rng, n),
+        'page_id': np.array([p['page_id'] for p in PAGES])[page],
+        'page_url': np.array([p['page_url'] for p in PAGES], dtype=object)[page],
+        'page_title': np.array([p['page_title'] for p in PAGES], dtype=object)[page],
+        'event_date': ds,
+        'event_type': rng.choice(EVENT_TYPES, size=n),
+        'session_duration': np.round(rng.uniform(5.0, 300.0, n), 2),  # seconds
+        'pages_viewed': pages_viewed,
+        'bounce': pages_viewed == 1,
+        'referrer_domain': _sample_faker(rng, 'domain_name', n),
+    })
+
+# ------------------------------------------------------------------------------------------------------------------
+# Row engine: original per-row Faker path, kept as a fallback and as the throughput baseline
+# ------------------------------------------------------------------------------------------------------------------
+
+def build_contacts_rows(ds: str, n: int) -> pd.DataFrame:
     contacts = []
     for _ in range(n):
         cid = str(uuid.uuid4())
@@ -118,78 +374,94 @@ def generate_contacts(file_name: str, ds: str, n: int = BASE_COUNT):
             'contact_id': cid,
             'first_name': fake.first_name(),
             'last_name': fake.last_name(),
-            'email': fake.email(),
+            'email': unique_emails([fake.email()], [cid])[0],
             'company': fake.company(),
-            'industry': random.choice(['Technology','Finance','Healthcare','Education','Retail']),
-            'lead_source': random.choice(['Web','Email','Event','Referral','Organic Search','Paid Social']),
+            'industry': random.choice(INDUSTRIES),
+            'lead_source': random.choice(LEAD_SOURCES),
             'job_title': fake.job(),
             'country': fake.country(),
             'opted_in': random.choice([True, False]),
             'signup_date': ds
         })
-    df = pd.DataFrame(contacts)
-    df.to_csv(RAW_DIR / file_name, index=False)
-    logger.info(f"✅ {file_name} generated ({len(df)} rows)")
+    return pd.DataFrame(contacts)
 
 
-def generate_form_fills(file_name: str, ds: str, n: int = BASE_COUNT):
-    contacts = pd.read_csv(RAW_DIR / f"contacts_{ds}.csv")['contact_id']
+def build_form_fills_rows(ds: str, n: int, contact_keys: np.ndarray) -> pd.DataFrame:
+    contacts = list(format_uuids(contact_keys))
     rows = []
     for _ in range(n):
         rows.append({
             'fill_id': str(uuid.uuid4()),
             'form_id': random.choice([f['form_id'] for f in FORMS]),
             'contact_id': random.choice(contacts),
-            'campaign_id': random.choices([c['campaign_id'] for c in CAMPAIGNS], weights=[0.7,0.2,0.1])[0],
+            'campaign_id': random.choices([c['campaign_id'] for c in CAMPAIGNS], weights=CAMPAIGN_WEIGHTS)[0],
             'fill_date': ds,
             'referrer_url': fake.url(),
             'user_agent': fake.user_agent(),
             'estimated_value': round(random.uniform(100.0, 10000.0), 2)
         })
-    df = pd.DataFrame(rows)
-    pq.write_table(pa.Table.from_pandas(df), RAW_DIR / file_name)
-    logger.info(f"✅ {file_name} generated ({len(df)} rows)")
+    return pd.DataFrame(rows)
 
 
-def generate_website_activity(file_name: str, ds: str, n: int = BASE_COUNT):
-    contacts = pd.read_csv(RAW_DIR / f"contacts_{ds}.csv")['contact_id']
-    pages = PAGES
+def build_website_activity_rows(ds: str, n: int, contact_keys: np.ndarray) -> pd.DataFrame:
+    contacts = list(format_uuids(contact_keys))
     activities = []
     for _ in range(n):
-        page = random.choice(pages)
+        page = random.choice(PAGES)
         duration = round(random.uniform(5.0, 300.0), 2)  # seconds
         pages_viewed = random.randint(1, 10)
         activities.append({
             'session_id': str(uuid.uuid4()),
             'contact_id': random.choice(contacts),
-            'campaign_id': random.choices([c['campaign_id'] for c in CAMPAIGNS], weights=[0.7,0.2,0.1])[0],
+            'campaign_id': random.choices([c['campaign_id'] for c in CAMPAIGNS], weights=CAMPAIGN_WEIGHTS)[0],
             'page_id': page['page_id'],
             'page_url': page['page_url'],
             'page_title': page['page_title'],
             'event_date': ds,
-            'event_type': random.choice(['page_view','button_click','form_submit','video_play']),
+            'event_type': random.choice(EVENT_TYPES),
             'session_duration': duration,
             'pages_viewed': pages_viewed,
             'bounce': pages_viewed == 1,
             'referrer_domain': fake.domain_name()
         })
-    with open(RAW_DIR / file_name, 'w') as f:
-        json.dump(activities, f, indent=2)
-    logger.info(f"✅ {file_name} generated ({len(activities)} rows)")
+    return pd.DataFrame(activities)
+
+
+COLUMNAR_BUILDERS = {
+    'contacts': build_contacts_columnar,
+    'form_fills': build_form_fills_columnar,
+    'website_activity': build_website_activity_columnar,
+}
+ROW_BUILDERS = {
+    'contacts': build_contacts_rows,
+    'form_fills': build_form_fills_rows,
+    'website_activity': build_website_activity_rows,
+}
 
 # ------------------------------------------------------------------------------------------------------------------
 # Hook registry: orchestrate generation in order using Airflow tasks
 # ------------------------------------------------------------------------------------------------------------------
 
+@flushes_metadata
 def register_generation_tasks(ds: str, **kwargs):
-    # Dimensions
-    generate_dimension_if_needed('campaigns', ds)
-    generate_dimension_if_needed('forms', ds)
-    generate_dimension_if_needed('pages', ds)
-    # Facts
-    generate_contacts_if_needed(ds)
-    generate_form_fills_if_needed(ds)
-    generate_website_activity_if_needed(ds)
+    # One bulk lookup for the day instead of a stage check per entity
+    status = get_stage_status(file_date=ds)
+    hooks = [
+        # Dimensions
+        ('campaigns', lambda: generate_dimension_if_needed('campaigns', ds)),
+        ('forms', lambda: generate_dimension_if_needed('forms', ds)),
+        ('pages', lambda: generate_dimension_if_needed('pages', ds)),
+        # Facts
+        ('contacts', lambda: generate_contacts_if_needed(ds)),
+        ('form_fills', lambda: generate_form_fills_if_needed(ds)),
+        ('website_activity', lambda: generate_website_activity_if_needed(ds)),
+    ]
+    for entity, hook in hooks:
+        file_name = entity_file_name(entity, ds)
+        if status.get(file_name, {}).get('generated_at'):
+            logger.info(f"⏩ Skipping {file_name}, already generated")
+            continue
+        hook()
 
 # ------------------------------------------------------------------------------------------------------------------
 # Note on schema evolution:
@@ -1,22 +1,27 @@
+import numpy as np
 import pandas as pd
-import pyarrow.parquet as pq
-import json
-import re
 import os
 import shutil
 import hashlib
+import struct
 from pathlib import Path
 from datetime import datetime
 from utils import capture_metrics
 from airflow.operators.python import get_current_context
 from metadata import (
-    log_stage,
-    check_stage_complete,
-    log_dq_result,
-    log_dq_signature,
+    DATE_RE,
+    DQRecorder,
+    flushes_metadata,
+    get_failure_delta,
+    get_failure_keys,
+    get_stage_status,
     has_failure_delta,
 )
 from logging_config import get_logger
+from sharding import logical_file_parts
+from formats import entity_file_name, open_writer
+from readers import count_rows, iter_frames, read_columns
+from upload_to_minio import ObjectSink, open_object_sink
 
 logger = get_logger(__name__)
 
@@ -26,163 +31,347 @@ QUARANTINE_DIR = Path("/opt/airflow/data/quarantine_data")
 for d in (RAW_DIR, VALID_DIR, QUARANTINE_DIR):
     d.mkdir(parents=True, exist_ok=True)
 
+# Rows per chunk for streaming validation; bounds memory independent of file size
+VALIDATION_CHUNK_ROWS = int(os.getenv('VALIDATION_CHUNK_ROWS', '250000'))
+# Example keys (new failures / resolved hashes) carried in the DQ delta XCom and emails
+DQ_FAILURE_SAMPLE = int(os.getenv('DQ_FAILURE_SAMPLE', '20'))
+# Where row-level outputs go: 'local' writes VALID_DIR / QUARANTINE_DIR for the upload tasks; 'minio'
+# streams them into the bucket while they are produced, so no output touches local disk
+VALIDATION_SINK = os.getenv('VALIDATION_SINK', 'local')
 
-def quarantine_file(filename: str):
-    """Move an invalid file slice to quarantine directory."""
-    logger.warning(f"Quarantining invalid rows for: {filename}")
-    src = RAW_DIR / filename
-    dest = QUARANTINE_DIR / filename
-    shutil.move(str(src), str(dest))
-    logger.warning(f"Quarantining invalid rows → {dest}")
 
+def _validation_sink() -> str:
+    """VALIDATION_SINK, checked when a task uses it: a bad value fails that task, not the DAG import."""
+    if VALIDATION_SINK not in ('local', 'minio'):
+        raise ValueError(f"VALIDATION_SINK must be 'local' or 'minio', got {VALIDATION_SINK!r}")
+    return VALIDATION_SINK
 
 
-def validate_schema_and_format(df: pd.DataFrame, required_cols: set, filename: str):
-    missing = required_cols - set(df.columns)
+def quarantine_file(filename: str) -> list:
+    """Move an invalid file (or every part of a sharded file) to quarantine directory; returns the new paths."""
+    logger.warning(f"Quarantining invalid file: {filename}")
+    moved = []
+    for src in logical_file_parts(RAW_DIR, filename):
+        dest = QUARANTINE_DIR / src.name
+        shutil.move(str(src), str(dest))
+        moved.append(dest)
+        logger.warning(f"Quarantining invalid file → {dest}")
+    return moved
+
+
+
+def validate_schema_and_format(columns: list, required_cols: set, dq: DQRecorder):
+    missing = required_cols - set(columns)
     if missing:
-        log_dq_result(filename, "schema_format", "FAIL", f"Missing {missing}")
-        raise ValueError(f"{filename}: Missing cols {missing}")
-    log_dq_result(filename, "schema_format", "PASS", f"Got cols {list(df.columns)}")
+        dq.log_dq_result("schema_format", "FAIL", f"Missing {missing}")
+        raise ValueError(f"{dq.file_name}: Missing cols {missing}")
+    dq.log_dq_result("schema_format", "PASS", f"Got cols {list(columns)}")
 
 
-def validate_freshness(df: pd.DataFrame, ds: str, filename: str, history_pct: float = 0.2):
-    DATE_RE = re.compile(r"_(\d{4}-\d{2}-\d{2})\.")
-    m = DATE_RE.search(filename)
+def validate_freshness(ds: str, dq: DQRecorder, history_pct: float = 0.2):
+    m = DATE_RE.search(dq.file_name)
     if not m:
-        raise ValueError(f"Couldn’t parse date from filename {filename!r}")
+        raise ValueError(f"Couldn’t parse date from filename {dq.file_name!r}")
     file_date = datetime.strptime(m.group(1), "%Y-%m-%d").date()
     expected  = datetime.strptime(ds, "%Y-%m-%d").date()
     if file_date != expected:
-        log_dq_result(filename, "freshness", "FAIL", f"{file_date} ≠ {expected}")
-        raise ValueError(f"{filename}: Not fresh ({file_date} vs {expected})")
-    log_dq_result(filename, "freshness", "PASS", f"File date {file_date}")
+        dq.log_dq_result("freshness", "FAIL", f"{file_date} ≠ {expected}")
+        raise ValueError(f"{dq.file_name}: Not fresh ({file_date} vs {expected})")
+    dq.log_dq_result("freshness", "PASS", f"File date {file_date}")
 
 
-def validate_row_count(df: pd.DataFrame, filename: str, avg: int = 1000, pct: float = 0.2):
-    cnt = len(df)
+def validate_row_count(cnt: int, dq: DQRecorder, avg: int = 1000, pct: float = 0.2):
     low, high = avg * (1 - pct), avg * (1 + pct)
     if not (low <= cnt <= high):
         raise ValueError(f"Row count {cnt} not in [{low:.0f},{high:.0f}]")
-    log_dq_result(filename, "row_count", "PASS", f"Count={cnt}, avg≈{avg}")
+    dq.log_dq_result("row_count", "PASS", f"Count={cnt}, avg≈{avg}")
+
+
+def _file_level_checks(paths: list, file_type: str, required_cols: set, ds: str, dq: DQRecorder) -> str:
+    """
+    Schema and freshness checks from each part's header / footer only (see readers.read_columns),
+    before any body is parsed. Return the failure message, or "" if all checks pass.
+    """
+    try:
+        for columns in dict.fromkeys(tuple(read_columns(p, file_type)) for p in paths):
+            validate_schema_and_format(columns, required_cols, dq)
+        validate_freshness(ds, dq)
+    except Exception as e:
+        dq.log_dq_result('file-level', "FAIL", str(e))
+        return str(e)
+    return ""
+
+
+def _pk_hashes(chunk: pd.DataFrame, pk_cols: list) -> np.ndarray:
+    """64-bit hash per row of the primary-key columns (nulls hash consistently, like df.duplicated)."""
+    return pd.util.hash_pandas_object(chunk[pk_cols], index=False).to_numpy()
+
+
+# Per-kind salts so the same key failing as null and as dup contributes two distinct hashes
+_FAILURE_KIND_SALT = {'null': np.uint64(0x6E756C6C), 'dup': np.uint64(0x647570)}
+
+
+def _mix64(h: np.ndarray) -> np.ndarray:
+    """splitmix64 finalizer, vectorized over a uint64 array."""
+    h = (h ^ (h >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+    h = (h ^ (h >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+    return h ^ (h >> np.uint64(31))
+
+
+class FailureSignature:
+    """
+    Order-independent digest of (primary key, failure kind) pairs, fed chunk by chunk.
+    Row hashes are combined by wrapping sum and XOR, so the digest does not depend on
+    row order or chunking; an empty set yields "" (no failures).
+
+    The hashes themselves are kept too: `keys()` is the failing-key set stored in the
+    metadata DB. Given the `previous` set, the first failing rows not in it are kept as
+    readable examples of new failures (`new_samples`).
+    """
+
+    def __init__(self, previous: np.ndarray = None, sample_size: int = DQ_FAILURE_SAMPLE):
+        self.count = 0
+        self._sum = 0
+        self._xor = 0
+        self._hashes = []
+        self.previous = np.empty(0, np.uint64) if previous is None else previous
+        self.sample_size = sample_size
+        self.new_samples = []
+        self._sampled = set()
+
+    def add(self, pk_frame: pd.DataFrame, kind: str):
+        if pk_frame.empty:
+            return
+        h = _mix64(pd.util.hash_pandas_object(pk_frame, index=False).to_numpy() ^ _FAILURE_KIND_SALT[kind])
+        self.count += len(h)
+        self._sum = (self._sum + int(h.sum(dtype=np.uint64))) & 0xFFFFFFFFFFFFFFFF  # array sum wraps mod 2**64
+        self._xor ^= int(np.bitwise_xor.reduce(h))
+        self._hashes.append(h)
+
+        room = self.sample_size - len(self.new_samples)
+        if room > 0:
+            # first row of each failing key not seen in the previous run (nor sampled already)
+            new_keys, first_rows = np.unique(h, return_index=True)
+            sampled = np.fromiter(self._sampled, np.uint64, len(self._sampled))
+            keep = ~np.isin(new_keys, self.previous) & ~np.isin(new_keys, sampled)
+            rows = np.sort(first_rows[keep])[:room]
+            self._sampled.update(h[rows].tolist())
+            for row in pk_frame.iloc[rows].to_dict('records'):
+                self.new_samples.append({**{c: None if pd.isna(v) else str(v) for c, v in row.items()}, 'failure': kind})
+
+    def keys(self) -> np.ndarray:
+        """Sorted unique failing-key hashes."""
+        return np.unique(np.concatenate(self._hashes)) if self._hashes else np.empty(0, np.uint64)
+
+    def hexdigest(self) -> str:
+        if not self.count:
+            return ""
+        packed = struct.pack('<QQQ', self.count, self._sum, self._xor)
+        return hashlib.md5(packed).hexdigest()
+
+
+def _duplicate_hashes(hashes: np.ndarray) -> np.ndarray:
+    """Sorted unique hashes that occur more than once."""
+    hashes = np.sort(hashes)
+    return np.unique(hashes[1:][hashes[1:] == hashes[:-1]])
+
+
+def _output_target(directory: Path, prefix: str, filename: str):
+    """Where an output slice is written: a local file, or a stream into its object under `prefix`."""
+    if _validation_sink() == 'minio':
+        return open_object_sink(prefix, filename)
+    directory.mkdir(parents=True, exist_ok=True)
+    return directory / filename
+
+
+def _validate_rows(paths: list, dq: DQRecorder, pk_cols: list, file_type: str, previous_keys=None):
+    """
+    Stream the raw file(s) twice: count rows and find duplicate PKs, then split rows into
+    valid / quarantine outputs. Returns (rows_in, rows_out, invalid_count, failures), where
+    `failures` is the FailureSignature of the failing keys (new ones judged against `previous_keys`).
+    """
+    filename = dq.file_name
+
+    # Raw data (all shards of a sharded file) is streamed in chunks, never loaded whole
+    def chunks():
+        for p in paths:
+            yield from iter_frames(p, file_type, VALIDATION_CHUNK_ROWS)
+
+    # 3) First pass: count rows and collect a compact uint64 hash per primary key
+    rows_in = 0
+    pk_hashes = []
+    for chunk in chunks():
+        rows_in += len(chunk)
+        pk_hashes.append(_pk_hashes(chunk, pk_cols))
+
+    # Optional row-count warning
+    try:
+        validate_row_count(rows_in, dq)
+    except ValueError as warn:
+        dq.log_dq_result("row_count", "WARN", str(warn))
+    # PKs seen more than once across all chunks
+    dup_hashes = _duplicate_hashes(np.concatenate(pk_hashes)) if pk_hashes else np.empty(0, np.uint64)
+    del pk_hashes
+
+    # 4) Second pass: append valid / invalid rows to their outputs chunk by chunk
+    rows_out = 0
+    invalid_count = 0
+    signature = FailureSignature(previous_keys)
+    valid_target = _output_target(VALID_DIR, 'valid-data', filename)
+    invalid_target, invalid_writer = None, None
+    try:
+        with open_writer(valid_target, file_type) as valid_writer:
+            for chunk in chunks():
+                null_mask = chunk[pk_cols].isnull().any(axis=1).to_numpy()
+                dup_mask  = np.isin(_pk_hashes(chunk, pk_cols), dup_hashes)
+                invalid_mask = null_mask | dup_mask
+
+                # fold this chunk's failing keys into the signature
+                signature.add(chunk.loc[null_mask, pk_cols], 'null')
+                signature.add(chunk.loc[dup_mask, pk_cols], 'dup')
+
+                valid_writer.write(chunk[~invalid_mask])
+                rows_out += int((~invalid_mask).sum())
+                if invalid_mask.any():
+                    if invalid_writer is None:
+                        invalid_target = _output_target(QUARANTINE_DIR, 'quarantine-data', filename)
+                        invalid_writer = open_writer(invalid_target, file_type)
+                    invalid_writer.write(chunk[invalid_mask])
+                    invalid_count += int(invalid_mask.sum())
+        if invalid_writer is not None:
+            invalid_writer.close()
+        # a streamed output is uploaded once its object completes
+        for target in (valid_target, invalid_target):
+            if isinstance(target, ObjectSink):
+                target.close()
+    except BaseException:
+        # nothing half-written is left in the bucket
+        for target in (valid_target, invalid_target):
+            if isinstance(target, ObjectSink):
+                target.abort()
+        raise
+    logger.info(f"Valid Data for {filename} written to {valid_target}")
+    if invalid_target is not None:
+        logger.info(f"Invalid Data for {filename} written to {invalid_target}")
+
+    # Content hashes of the outputs, read back while still in page cache (uploads compare against
+    # them) or computed as they streamed out
+    for location, target, rows in (('valid', valid_target, rows_out), ('quarantine', invalid_target, invalid_count)):
+        if isinstance(target, ObjectSink):
+            dq.log_checksum(filename, location, target.sha256, target.size, rows=rows, uploaded=True)
+        elif target is not None:
+            dq.log_checksum(target, location, rows=rows)
+
+    # 5) Deterministic failure signature and failing-key set, accumulated per chunk in step 4
+    return rows_in, rows_out, invalid_count, signature
 
 
 def _validate_generic(
     filename: str,
     ds: str,
-    reader_fn,
     pk_cols: list,
     required_cols: set,
     file_type: str
 ):
-    path = RAW_DIR / filename
-    if not path.exists():
+    sink = _validation_sink()  # before any file is checked or moved
+    paths = logical_file_parts(RAW_DIR, filename)
+    if not paths:
         raise FileNotFoundError(f"{filename} not found")
 
-    # 1) Read raw data and initialize flags
-    df = reader_fn(path)
-    rows_in = len(df)
-    file_failures = False
-    file_fail_msg = ""
+    # All check results, the signature and the stage update go to the metadata DB in one transaction
+    with DQRecorder(filename, file_type, ds) as dq:
+        # 1) File-level checks on headers / footers; a bad file is quarantined without parsing its body
+        file_fail_msg = _file_level_checks(paths, file_type, required_cols, ds, dq)
+        file_failures = bool(file_fail_msg)
+
+        if file_failures:
+            # 2) All rows invalid: move the raw file(s) to quarantine as they are
+            rows_in = sum(count_rows(p, file_type) for p in paths)  # footer / newline count, no parsing
+            rows_out, invalid_count, signature = 0, rows_in, ""
+            previous_keys, failure_keys, new_samples = None, None, []
+            for dest in quarantine_file(filename):
+                dq.log_checksum(dest, 'quarantine')
+        else:
+            # 3-5) Row-level checks, streamed chunk by chunk, against the last run's failing keys
+            #      (read before this run's batch is flushed)
+            previous_keys = get_failure_keys(filename, file_type, ds)
+            rows_in, rows_out, invalid_count, failures = _validate_rows(
+                paths, dq, pk_cols, file_type, previous_keys
+            )
+            signature, failure_keys, new_samples = failures.hexdigest(), failures.keys(), failures.new_samples
+
+            # Remove raw_data file(s) for clean up
+            for path in paths:
+                if path.exists():
+                    os.remove(path)
+                    logger.info(f"Removed {path} from raw_data folder")
+
+        # 6) New / persisting / resolved failing keys against the last run's set, pushed for the
+        #    branch and DQ emails; then record this run's signature and key set
+        delta = _failure_delta(filename, file_type, ds, signature, previous_keys, failure_keys, new_samples)
+        ti = get_current_context()['ti']
+        ti.xcom_push(key='new_dq_failures', value=bool(delta['new']))
+        ti.xcom_push(key='dq_failure_delta', value=delta)
+        if delta['new']:
+            logger.warning(f"🔔 New DQ failures for {filename}: {delta['new']} new, "
+                           f"{delta['persisting']} persisting, {delta['resolved']} resolved")
+        dq.log_dq_signature(signature, failure_keys)
+
+        # 7) Overall DQ outcome and stage logging
+        status = "PASS" if (not file_failures and invalid_count == 0) else "FAIL"
+        details = file_fail_msg if file_failures else (
+            f"in={rows_in}, out={rows_out}, failures={invalid_count}, "
+            f"new={delta['new']}, persisting={delta['persisting']}, resolved={delta['resolved']}"
+        )
+        dq.log_dq_result(file_type, status, details)
+        dq.log_stage("validated", rows=rows_in)
+        if sink == 'minio' and not file_failures:
+            # the outputs were streamed to the bucket; the upload tasks find nothing of this file
+            dq.log_stage("uploaded")
 
-    # 2) File-level checks
-    try:
-        validate_schema_and_format(df, required_cols, filename)
-        validate_freshness(df, ds, filename)
-    except Exception as e:
-        file_failures = True
-        file_fail_msg = str(e)
-        log_dq_result(filename, 'file-level', "FAIL", file_fail_msg)
-        quarantine_file(filename)
-
-    # 3) Row-level checks (only if file passed)
-    if not file_failures:
-        # Optional row-count warning
-        try:
-            validate_row_count(df, filename)
-        except ValueError as warn:
-            log_dq_result(filename, "row_count", "WARN", str(warn))
-
-        null_mask = df[pk_cols].isnull().any(axis=1)
-        dup_mask  = df.duplicated(subset=pk_cols, keep=False)
-        invalid_mask = null_mask | dup_mask
-
-        df_valid   = df[~invalid_mask]
-        df_invalid = df[invalid_mask]
+    return rows_in, rows_out
+
+
+def _failure_delta(filename, file_type, ds, signature, previous_keys, failure_keys, new_samples) -> dict:
+    """
+    XCom-friendly failure delta: counts of new / persisting / resolved failing keys plus examples.
+    With no stored key set (first run, file-level failure, or a set too large to store) the
+    signature comparison decides whether failures are new.
+    """
+    if failure_keys is not None and previous_keys is not None:
+        # the stored set is still the last run's: this run's is recorded after the delta
+        split = get_failure_delta(filename, file_type, ds, failure_keys)
+        counts = {kind: len(keys) for kind, keys in split.items()}
+        resolved = [f"{k:016x}" for k in split['resolved'][:DQ_FAILURE_SAMPLE]]
     else:
-        # On file-level failure, mark all rows invalid
-        df_valid   = pd.DataFrame(columns=df.columns)
-        df_invalid = df
-
-    rows_out       = len(df_valid)
-    invalid_count  = len(df_invalid)
-
-    # 4) Write slices out
-    VALID_DIR.mkdir(parents=True, exist_ok=True)
-    if filename.endswith('.csv'):
-        df_valid.to_csv (VALID_DIR/filename, index=False)
-    elif filename.endswith('.json'):
-        df_valid.to_json(VALID_DIR/filename, orient='records', lines=True)
-    elif filename.endswith('.parquet'):
-        df_valid.to_parquet(VALID_DIR/filename)
-    logger.info(f"Valid Data for {filename} created in {VALID_DIR}")
-
-    QUARANTINE_DIR.mkdir(parents=True, exist_ok=True)
-    if invalid_count > 0:
-        if filename.endswith('.csv'):
-            df_invalid.to_csv (QUARANTINE_DIR/filename, index=False)
-        elif filename.endswith('.json'):
-            df_invalid.to_json(QUARANTINE_DIR/filename, orient='records', lines=True)
-        elif filename.endswith('.parquet'):
-            df_invalid.to_parquet(QUARANTINE_DIR/filename)
-        logger.info(f"Invalid Data for {filename} created in {QUARANTINE_DIR}")
-
-    # Remove raw_data file for clean up
-    if path.exists():
-        os.remove(path)
-        logger.info(f"Removed {path} from raw_data folder")
-
-    # 5) Compute deterministic failure signature
-    failure_keys = []
-    for idx in df_invalid.index:
-        row_pk = "::".join(str(df.at[idx, col]) for col in pk_cols)
-        if not file_failures and null_mask.iloc[idx]:
-            failure_keys.append(f"{row_pk}::null")
-        if not file_failures and dup_mask.iloc[idx]:
-            failure_keys.append(f"{row_pk}::dup")
-
-    signature = ""
-    if failure_keys:
-        sig_src   = "|".join(sorted(failure_keys))
-        signature = hashlib.md5(sig_src.encode('utf-8')).hexdigest()
-
-    # 6) Persist signature and push DQ-fail flag
-    log_dq_signature(filename, file_type, ds, signature)
-    ti = get_current_context()['ti']
-    new_failure = bool(signature and has_failure_delta(filename, file_type, ds, signature))
-    ti.xcom_push(key='new_dq_failures', value=new_failure)
-    if new_failure:
-        logger.warning(f"🔔 New DQ failures for {filename}: {invalid_count} rows")
-
-    # 7) Overall DQ outcome and stage logging
-    status = "PASS" if (not file_failures and invalid_count == 0) else "FAIL"
-    details = file_fail_msg if file_failures else f"in={rows_in}, out={rows_out}, failures={invalid_count}"
-    log_dq_result(filename, file_type, status, details)
-    log_stage(filename, file_type, ds, "validated")
+        is_new = bool(signature and has_failure_delta(filename, file_type, ds, signature))
+        n = 0 if failure_keys is None else len(failure_keys)
+        counts = {'new': n if is_new else 0, 'persisting': 0 if is_new else n, 'resolved': 0}
+        resolved = []
+    return {'file': filename, **counts, 'new_samples': new_samples if counts['new'] else [],
+            'resolved_keys': resolved}
 
-    return rows_in, rows_out
+
+def _already_validated(filename: str) -> bool:
+    """Idempotency check; one lookup also tells whether the raw file was ever generated."""
+    stages = get_stage_status([filename]).get(filename, {})
+    if stages.get('validated_at'):
+        logger.info(f"⏩ Already validated: {filename}")
+        return True
+    if not stages.get('generated_at'):
+        logger.warning(f"⚠️ No generation recorded for {filename}")
+    return False
 
 
 # Decorated wrappers to capture metrics and respect idempotency
 @capture_metrics("validate_campaigns")
+@flushes_metadata
 def validate_campaigns_if_needed(ds: str, **kwargs):
-    fn = f"campaigns_{ds}.json"
-    if check_stage_complete(fn, "validated"):
-        logger.info(f"⏩ Already validated: {fn}")
+    fn = entity_file_name('campaigns', ds)
+    if _already_validated(fn):
         return 0, 0
     return _validate_generic(
         fn, ds,
-        # read JSON as flat records
-        lambda p: pd.read_json(p, orient="records"),
         # primary key
         ["campaign_id"],
         # required columns in your dimension
@@ -192,14 +381,13 @@ def validate_campaigns_if_needed(ds: str, **kwargs):
 
 
 @capture_metrics("validate_forms")
+@flushes_metadata
 def validate_forms_if_needed(ds: str, **kwargs):
-    fn = f"forms_{ds}.json"
-    if check_stage_complete(fn, "validated"):
-        logger.info(f"⏩ Already validated: {fn}")
+    fn = entity_file_name('forms', ds)
+    if _already_validated(fn):
         return 0, 0
     return _validate_generic(
         fn, ds,
-        lambda p: pd.read_json(p, orient="records"),
         ["form_id"],
         {"form_id", "form_type"},
         "forms"
@@ -207,14 +395,13 @@ def validate_forms_if_needed(ds: str, **kwargs):
 
 
 @capture_metrics("validate_pages")
+@flushes_metadata
 def validate_pages_if_needed(ds: str, **kwargs):
-    fn = f"pages_{ds}.json"
-    if check_stage_complete(fn, "validated"):
-        logger.info(f"⏩ Already validated: {fn}")
+    fn = entity_file_name('pages', ds)
+    if _already_validated(fn):
         return 0, 0
     return _validate_generic(
         fn, ds,
-        lambda p: pd.read_json(p, orient="records"),
         ["page_id"],
         {"page_id", "page_url", "page_title"},
         "pages"
@@ -222,14 +409,13 @@ def validate_pages_if_needed(ds: str, **kwargs):
 
 
 @capture_metrics("validate_contacts")
+@flushes_metadata
 def validate_contacts_if_needed(ds: str, **kwargs):
-    fn = f"contacts_{ds}.csv"
-    if check_stage_complete(fn, "validated"):
-        logger.info(f"⏩ Already validated: {fn}")
+    fn = entity_file_name('contacts', ds)
+    if _already_validated(fn):
         return 0, 0
     return _validate_generic(
         fn, ds,
-        lambda p: pd.read_csv(p),
         ['contact_id'],
         {'contact_id', 'email', 'first_name', 'company'},
         'contacts'
@@ -237,14 +423,13 @@ def validate_contacts_if_needed(ds: str, **kwargs):
 
 
 @capture_metrics("validate_form_fills")
+@flushes_metadata
 def validate_form_fills_if_needed(ds: str, **kwargs):
-    fn = f"form_fills_{ds}.parquet"
-    if check_stage_complete(fn, "validated"):
-        logger.info(f"⏩ Already validated: {fn}")
+    fn = entity_file_name('form_fills', ds)
+    if _already_validated(fn):
         return 0, 0
     return _validate_generic(
         fn, ds,
-        lambda p: pd.read_parquet(p),
         ['fill_id'],
         {'fill_id', 'form_id', 'contact_id', 'fill_date'},
         'form_fills'
@@ -252,14 +437,13 @@ def validate_form_fills_if_needed(ds: str, **kwargs):
 
 
 @capture_metrics("validate_website_activity")
+@flushes_metadata
 def validate_website_activity_if_needed(ds: str, **kwargs):
-    fn = f"website_activity_{ds}.json"
-    if check_stage_complete(fn, "validated"):
-        logger.info(f"⏩ Already validated: {fn}")
+    fn = entity_file_name('website_activity', ds)
+    if _already_validated(fn):
         return 0, 0
     return _validate_generic(
         fn, ds,
-        lambda p: pd.json_normalize(json.loads(p.read_text())),
         ['session_id'],
         {'session_id', 'contact_id', 'page_url', 'event_date'},
         'website_activity'
@@ -1,15 +1,50 @@
 from airflow.operators.email import EmailOperator
 from logging_config import get_logger
+from metadata import flush_metadata
 import functools
+import html
 import time
 
 logger = get_logger(__name__)
 
-def dq_failure_email(context):
+def _dq_failure_deltas(ti) -> list:
+    """Failure deltas of the failed validator itself, else the ones collected by branch_on_dq."""
+    own = ti.xcom_pull(task_ids=ti.task_id, key='dq_failure_delta')
+    if own:
+        return [own]
+    return ti.xcom_pull(task_ids='branch_on_dq', key='dq_failure_deltas') or []
+
+
+def _dq_delta_html(deltas: list) -> str:
+    if not deltas:
+        return ""
+    rows = "".join(
+        f"<tr><td>{d['file']}</td><td>{d['new']}</td><td>{d['persisting']}</td><td>{d['resolved']}</td></tr>"
+        for d in deltas
+    )
+    samples = "".join(
+        f"<p><strong>New failures in {d['file']} (first {len(d['new_samples'])}):</strong><br>"
+        f"<pre>{html.escape(chr(10).join(map(str, d['new_samples'])))}</pre></p>"
+        for d in deltas if d['new_samples']
+    )
+    return f"""
+    <h4>Failure delta vs. previous run</h4>
+    <table border="1" cellpadding="4">
+    <tr><th>File</th><th>New</th><th>Persisting</th><th>Resolved</th></tr>{rows}
+    </table>
+    {samples}
+    """
+
+
+def dq_failure_email(context=None, **kwargs):
+    # on_failure_callback passes the context positionally; as a python_callable it arrives as kwargs
+    context = context or kwargs
+    flush_metadata()  # persist the failed task's queued DQ results before reporting
     ti = context['task_instance']
-    err = context['exception']
+    err = context.get('exception', 'New DQ failures')
     ds = context['execution_date'].strftime("%Y-%m-%d")
     filename = ti.xcom_pull(task_ids=ti.task_id, key='return_value') or 'unknown'
+    deltas = _dq_failure_deltas(ti)
     
     subject = f"[Airflow][{ds}] DQ Failure: {ti.task_id}"
     body = f"""
@@ -17,6 +52,7 @@ def dq_failure_email(context):
     <p><strong>Task:</strong> {ti.task_id}</p>
     <p><strong>File:</strong> {filename}</p>
     <p><strong>Error:</strong><br><pre>{err}</pre></p>
+    {_dq_delta_html(deltas)}
     """
 
     logger.warning(f"📧 Sending DQ failure email for task: {ti.task_id}, file: {filename}, error: {err}")
@@ -34,6 +70,7 @@ def notify_failure(context):
     Generic failure callback for Airflow tasks.
     Sends an email summarizing the failed task and links to logs.
     """
+    flush_metadata()  # persist the failed task's queued metadata writes
     ti = context['task_instance']
     dag_id = ti.dag_id
     task_id = ti.task_id
@@ -0,0 +1,175 @@
+"""
+Per-entity file formats, shared by generation, validation, upload and the Snowflake load.
+
+Each entity is written as csv, ndjson or parquet. Defaults match the original
+layout; override per entity with OUTPUT_FORMATS, e.g.
+
+    OUTPUT_FORMATS="website_activity=parquet:zstd,contacts=parquet"
+
+Parquet compression defaults to PARQUET_COMPRESSION unless given after the colon,
+and PARQUET_ROW_GROUP_SIZE caps the rows per row group.
+"""
+import io
+import os
+from abc import ABC, abstractmethod
+from pathlib import Path
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+ENTITIES = ('contacts', 'form_fills', 'website_activity', 'campaigns', 'forms', 'pages')
+
+DEFAULT_FORMATS = {
+    'contacts':         'csv',
+    'form_fills':       'parquet',
+    'website_activity': 'ndjson',
+    'campaigns':        'ndjson',
+    'forms':            'ndjson',
+    'pages':            'ndjson',
+}
+
+# format -> file extension and the Snowflake FILE FORMAT object that reads it
+EXTENSIONS = {'csv': '.csv', 'ndjson': '.json', 'parquet': '.parquet'}
+SNOWFLAKE_FILE_FORMATS = {'csv': 'RAW.csv_fmt', 'ndjson': 'RAW.json_fmt', 'parquet': 'RAW.parquet_fmt'}
+
+PARQUET_COMPRESSION = os.getenv('PARQUET_COMPRESSION', 'snappy')
+PARQUET_ROW_GROUP_SIZE = int(os.getenv('PARQUET_ROW_GROUP_SIZE', '100000'))
+PARQUET_CODECS = ('snappy', 'zstd')
+
+
+def _parse_formats(spec: str) -> dict:
+    formats = {e: {'format': f, 'compression': PARQUET_COMPRESSION} for e, f in DEFAULT_FORMATS.items()}
+    for item in filter(None, (i.strip() for i in spec.split(','))):
+        entity, _, value = item.partition('=')
+        fmt, _, codec = value.strip().partition(':')
+        entity = entity.strip()
+        if entity not in formats:
+            raise ValueError(f"OUTPUT_FORMATS: unknown entity {entity!r}")
+        if fmt not in EXTENSIONS:
+            raise ValueError(f"OUTPUT_FORMATS: unknown format {fmt!r} for {entity}")
+        formats[entity] = {'format': fmt, 'compression': codec or PARQUET_COMPRESSION}
+    for entity, conf in formats.items():
+        if conf['format'] == 'parquet' and conf['compression'] not in PARQUET_CODECS:
+            raise ValueError(f"Unsupported parquet compression {conf['compression']!r} for {entity}")
+    return formats
+
+
+OUTPUT_FORMATS = _parse_formats(os.getenv('OUTPUT_FORMATS', ''))
+
+
+def entity_format(entity: str) -> str:
+    return OUTPUT_FORMATS[entity]['format']
+
+
+def entity_extension(entity: str) -> str:
+    return EXTENSIONS[entity_format(entity)]
+
+
+def entity_file_name(entity: str, ds: str) -> str:
+    """Logical file name for an entity and date, e.g. contacts_2025-05-25.csv"""
+    return f"{entity}_{ds}{entity_extension(entity)}"
+
+# ------------------------------------------------------------------------------------------------------------------
+# Writers (readers live in readers.py)
+# ------------------------------------------------------------------------------------------------------------------
+
+def write_frame(df: pd.DataFrame, path: Path, entity: str):
+    """Write a whole DataFrame in the entity's format."""
+    with open_writer(path, entity) as writer:
+        writer.write(df)
+
+
+class BatchWriter(ABC):
+    """
+    Incremental file writer: `write` appends one DataFrame batch, nothing is buffered across batches.
+    `path` may also be a writable binary stream (e.g. a streaming upload); it is left open for its owner.
+    """
+
+    def __init__(self, path: Path):
+        self.path = path
+
+    def _open_text(self, **kwargs):
+        if hasattr(self.path, 'write'):
+            return io.TextIOWrapper(self.path, encoding='utf-8', **kwargs)
+        return open(self.path, 'w', **kwargs)
+
+    def _close_text(self, fh):
+        if hasattr(self.path, 'write'):
+            fh.detach()  # flushes into the stream without closing it
+        else:
+            fh.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    @abstractmethod
+    def write(self, df: pd.DataFrame):
+        """Append one batch."""
+
+    def close(self):
+        pass
+
+
+class CsvBatchWriter(BatchWriter):
+    def __init__(self, path: Path):
+        super().__init__(path)
+        self._fh = self._open_text(newline='')
+        self._header = True
+
+    def write(self, df: pd.DataFrame):
+        df.to_csv(self._fh, index=False, header=self._header)
+        self._header = False
+
+    def close(self):
+        self._close_text(self._fh)
+
+
+class NdjsonBatchWriter(BatchWriter):
+    def __init__(self, path: Path):
+        super().__init__(path)
+        self._fh = self._open_text()
+
+    def write(self, df: pd.DataFrame):
+        if df.empty:
+            return
+        text = df.to_json(orient='records', lines=True)
+        self._fh.write(text if text.endswith('\n') else text + '\n')
+
+    def close(self):
+        self._close_text(self._fh)
+
+
+class ParquetBatchWriter(BatchWriter):
+    """Each batch is appended as one or more row groups of at most PARQUET_ROW_GROUP_SIZE rows."""
+
+    def __init__(self, path: Path, compression: str = PARQUET_COMPRESSION):
+        super().__init__(path)
+        self.compression = compression
+        self._writer = None
+        self._schema = None
+
+    def write(self, df: pd.DataFrame):
+        table = pa.Table.from_pandas(df, preserve_index=False)
+        if self._writer is None:
+            self._schema = table.schema
+            self._writer = pq.ParquetWriter(self.path, self._schema, compression=self.compression)
+        elif not table.schema.equals(self._schema):
+            table = table.cast(self._schema)  # e.g. an all-null batch inferred as null type
+        self._writer.write_table(table, row_group_size=PARQUET_ROW_GROUP_SIZE)
+
+    def close(self):
+        if self._writer is not None:
+            self._writer.close()
+
+
+def open_writer(path: Path, entity: str) -> BatchWriter:
+    """Open an incremental writer in the entity's configured format."""
+    conf = OUTPUT_FORMATS[entity]
+    if conf['format'] == 'csv':
+        return CsvBatchWriter(path)
+    if conf['format'] == 'ndjson':
+        return NdjsonBatchWriter(path)
+    return ParquetBatchWriter(path, conf['compression'])
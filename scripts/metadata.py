@@ -1,111 +1,402 @@
-import sqlite3
-from datetime import datetime
+"""
+Pipeline metadata API: per-file stage timestamps, DQ check audit, failure signatures,
+content checksums, multipart upload progress and lake compactions.
+
+The functions below are backend-agnostic; storage is delegated to a MetadataBackend
+chosen by METADATA_BACKEND:
+  • sqlite   --> a local database file (metadata_sqlite.py, default)
+  • postgres --> a shared server, for workers on several nodes (metadata_postgres.py)
+"""
+from datetime import datetime, timedelta
 from pathlib import Path
+from abc import ABC, abstractmethod
+import atexit
+import functools
+import hashlib
 import os
 import re
-from contextlib import contextmanager
+import threading
+import numpy as np
 from logging_config import get_logger
 
 logger = get_logger(__name__)
 
-# Path to your SQLite metadata database
-METADATA_DB = Path(os.getenv("METADATA_DB_PATH", "/opt/airflow/data/metadata.db"))
+METADATA_BACKEND = os.getenv("METADATA_BACKEND", "sqlite")
+# Write-behind: queue writes in-process and flush them from a background thread
+METADATA_WRITE_BEHIND = os.getenv("METADATA_WRITE_BEHIND", "false").lower() in ("1", "true", "yes")
+METADATA_FLUSH_INTERVAL_S = float(os.getenv("METADATA_FLUSH_INTERVAL_S", "1.0"))
+METADATA_FLUSH_MAX_ROWS = int(os.getenv("METADATA_FLUSH_MAX_ROWS", "500"))
+# dq_checks rows older than this (by file_date) are rolled up into dq_check_summary
+DQ_RETENTION_DAYS = int(os.getenv("DQ_RETENTION_DAYS", "30"))
+# Largest failing-key set stored per file (8 bytes per key); bigger sets keep only the signature
+DQ_FAILURE_KEYS_MAX = int(os.getenv("DQ_FAILURE_KEYS_MAX", "1000000"))
+# Read size for streaming content checksums
+CHECKSUM_CHUNK_BYTES = int(os.getenv("CHECKSUM_CHUNK_BYTES", str(4 * 1024 * 1024)))
+
+STAGES = ('generated', 'validated', 'uploaded')
+# Per-file fields of file_checksums returned by get_checksums, and of compacted_files (+ its object) by get_compactions
+CHECKSUM_FIELDS = ('sha256', 'size_bytes', 'row_count', 'uploaded_sha256')
+COMPACTION_FIELDS = ('object_name', 'sha256', 'row_count', 'object_sha256', 'object_size_bytes')
+
+# Date embedded in a file name, e.g. contacts_2025-05-25.csv
+DATE_RE = re.compile(r"_(\d{4}-\d{2}-\d{2})\.")
+
+
+def _file_date(file_name: str):
+    m = DATE_RE.search(file_name)
+    return m.group(1) if m else None
+
+
+def _utc_timestamp() -> str:
+    """UTC time in SQL CURRENT_TIMESTAMP format, for rows written after the fact."""
+    return datetime.utcnow().strftime("%Y-%m-%d %H:%M:%S")
+
+# ------------------------------------------------------------------------------------------------------------------
+# Backend interface and selection
+# ------------------------------------------------------------------------------------------------------------------
+
+class MetadataBackend(ABC):
+    """
+    Storage for the metadata tables. Rows passed to `write_batch`:
+      checks     --> (file_name, file_date, check_name, status, details, timestamp)
+      stages     --> (file_name, dataset_type, file_date, stage, timestamp, row_count or None)
+      signatures --> (file_name, dataset_type, file_date, signature, timestamp, failure_keys blob or None)
+      checksums  --> (file_name, location, dataset_type, file_date, sha256, size_bytes or None,
+                      row_count or None, uploaded_sha256 or None, timestamp); None keeps the stored
+                      size / uploaded_sha256, and the row count while the hash is unchanged
+    `dialect` ("sqlite" / "postgres") lets reports pick SQL the backend understands.
+    """
+
+    dialect = None
+
+    @abstractmethod
+    def migrate(self) -> int:
+        """Create or upgrade the schema; return the resulting schema version."""
+
+    @abstractmethod
+    def write_batch(self, checks=(), stages=(), signatures=(), checksums=()):
+        """Insert checks and upsert stage timestamps / signatures / checksums in one transaction."""
+
+    @abstractmethod
+    def compact_dq_checks(self, cutoff: str) -> int:
+        """Roll dq_checks with file_date < cutoff into dq_check_summary; return rows removed."""
+
+    @abstractmethod
+    def get_stage_status(self, file_names=None, file_date: str = None) -> dict:
+        """{file_name: {'<stage>_at': ...}} selected by `file_names` (None for all), `file_date`, or both."""
+
+    @abstractmethod
+    def get_dq_signature(self, file_name: str, dataset_type: str, file_date: str):
+        """Stored signature, or None if the file was never validated."""
+
+    @abstractmethod
+    def get_failure_keys(self, file_name: str, dataset_type: str, file_date: str):
+        """Stored failing-key blob (see pack_failure_keys), or None if none was stored."""
+
+    @abstractmethod
+    def get_checksums(self, file_names, location: str, file_date: str = None) -> dict:
+        """
+        {file_name: {CHECKSUM_FIELDS}} for the files in `location` that have a row, selected by
+        `file_names` (None for all), `file_date`, or both.
+        """
+
+    # Multipart upload progress is written synchronously (never queued), so it survives a crash
+
+    @abstractmethod
+    def get_multipart_upload(self, bucket: str, object_name: str):
+        """{'upload_id', 'sha256', 'part_size', 'parts': {part_number: etag}} of an unfinished upload, or None."""
+
+    @abstractmethod
+    def save_multipart_upload(self, bucket: str, object_name: str, upload_id: str, sha256: str, part_size: int):
+        """Remember a started multipart upload of `sha256` content; its parts are added as they complete."""
+
+    @abstractmethod
+    def save_multipart_part(self, upload_id: str, part_number: int, etag: str, size_bytes: int):
+        """Record the ETag of a completed part."""
+
+    @abstractmethod
+    def delete_multipart_upload(self, bucket: str, object_name: str):
+        """Forget an upload and its parts (once completed or abandoned)."""
+
+    # Compactions are written synchronously too: the manifests rebuilt right after must see them
+
+    @abstractmethod
+    def save_compaction(self, object_name: str, dataset_type: str, period: str, sha256: str, size_bytes: int,
+                        files: list):
+        """
+        Record a compacted object and, replacing its previous file list, the valid files merged
+        into it: files --> (file_name, file_date, sha256 of the file, row_count or None).
+        """
+
+    @abstractmethod
+    def get_compactions(self, file_names) -> dict:
+        """{file_name: {COMPACTION_FIELDS}} for the files merged into a compacted object."""
+
+    @abstractmethod
+    def get_file_metadata(self, file_date: str = None) -> list:
+        """file_metadata rows (all, or one date's) as dicts, ordered by file_date and file_name."""
+
+    @abstractmethod
+    def get_dq_checks(self, file_date: str) -> list:
+        """DQ check rows for a date, or its daily roll-up once compacted."""
+
+    @abstractmethod
+    def fetch_all(self, sql: str, params=()) -> list:
+        """Run a read-only query written for `dialect`; rows as dicts."""
+
+    def close(self):
+        """Release this process's pooled connections."""
+
+
+class WriteBehindBackend(MetadataBackend):
+    """
+    Wraps a backend so `write_batch` only queues rows in memory; a daemon thread writes
+    them in batches every METADATA_FLUSH_INTERVAL_S (sooner past METADATA_FLUSH_MAX_ROWS).
+    Stage, signature and checksum reads overlay queued rows, so check_stage_complete,
+    has_failure_delta and upload skips see pending writes; other reads flush first.
+    Call `flush()` before the process ends: Airflow task runners exit without atexit hooks, so
+    task entry points are decorated with `flushes_metadata`.
+    """
+
+    def __init__(self, inner: MetadataBackend):
+        self.inner = inner
+        self._lock = threading.Lock()          # guards the queues below
+        self._flush_lock = threading.Lock()    # one flush at a time
+        self._wake = threading.Event()
+        self._reset()
+
+    def _reset(self):
+        self._pending = ([], [], [], [])    # checks, stages, signatures, checksums not yet written
+        self._in_flight = ([], [], [], [])  # taken by a flush that has not committed yet
+        self._pid = os.getpid()
+        self._thread = None
+
+    def _ensure_thread(self):
+        if self._pid != os.getpid():
+            # Forked child: the parent's queue and thread are not ours
+            self._reset()
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._run, name="metadata-write-behind", daemon=True)
+            self._thread.start()
 
-@contextmanager
-def get_db_connection():
-    """Yield a SQLite connection with row factory enabled."""
-    conn = sqlite3.connect(METADATA_DB)
-    conn.row_factory = sqlite3.Row
-    try:
-        yield conn
-    finally:
-        conn.close()
+    def _run(self):
+        while True:
+            self._wake.wait(METADATA_FLUSH_INTERVAL_S)
+            self._wake.clear()
+            try:
+                self.flush()
+            except Exception as e:
+                # rows stay queued; the next flush retries them
+                logger.error(f"❌ Write-behind metadata flush failed: {e}")
+
+    # --- writes ------------------------------------------------------------------------------------------------
+
+    def write_batch(self, checks=(), stages=(), signatures=(), checksums=()):
+        with self._lock:
+            self._ensure_thread()
+            for queue, rows in zip(self._pending, (checks, stages, signatures, checksums)):
+                queue.extend(rows)
+            queued = sum(map(len, self._pending))
+        if queued >= METADATA_FLUSH_MAX_ROWS:
+            self._wake.set()
+
+    def flush(self):
+        """Write every queued row to the wrapped backend (one transaction per flush)."""
+        with self._flush_lock:
+            with self._lock:
+                if self._pid != os.getpid() or not any(self._pending):
+                    return
+                self._in_flight, self._pending = self._pending, ([], [], [], [])
+            try:
+                self.inner.write_batch(*self._in_flight)
+            except Exception:
+                with self._lock:
+                    # put the rows back in front of anything queued meanwhile
+                    self._pending = tuple(f + p for f, p in zip(self._in_flight, self._pending))
+                    self._in_flight = ([], [], [], [])
+                raise
+            with self._lock:
+                self._in_flight = ([], [], [], [])
+
+    def _queued(self) -> tuple:
+        """Snapshot of in-flight + pending rows, oldest first."""
+        with self._lock:
+            return tuple(f + p for f, p in zip(self._in_flight, self._pending))
+
+    # --- reads -------------------------------------------------------------------------------------------------
+
+    def get_stage_status(self, file_names=None, file_date: str = None) -> dict:
+        # Snapshot before reading the DB: rows committed in between are then in one or the other
+        _, stages, _, _ = self._queued()
+        status = self.inner.get_stage_status(file_names, file_date)
+        wanted = None if file_names is None else set(file_names)
+        for name, _, day, stage, ts, _ in stages:
+            if (wanted is None or name in wanted) and (file_date is None or day == file_date):
+                status.setdefault(name, {f"{s}_at": None for s in STAGES})[f"{stage}_at"] = ts
+        return status
+
+    def get_dq_signature(self, file_name: str, dataset_type: str, file_date: str):
+        _, _, signatures, _ = self._queued()
+        key = (file_name, dataset_type, file_date)
+        queued = [row[3] for row in signatures if row[:3] == key]
+        return queued[-1] if queued else self.inner.get_dq_signature(file_name, dataset_type, file_date)
+
+    def get_failure_keys(self, file_name: str, dataset_type: str, file_date: str):
+        _, _, signatures, _ = self._queued()
+        key = (file_name, dataset_type, file_date)
+        queued = [row[5] for row in signatures if row[:3] == key]
+        return queued[-1] if queued else self.inner.get_failure_keys(file_name, dataset_type, file_date)
+
+    def get_checksums(self, file_names, location: str, file_date: str = None) -> dict:
+        *_, checksums = self._queued()
+        found = self.inner.get_checksums(file_names, location, file_date)
+        wanted = None if file_names is None else set(file_names)
+        for name, loc, _, day, sha256, size, rows, uploaded, _ in checksums:
+            if loc == location and (wanted is None or name in wanted) and (file_date is None or day == file_date):
+                row = found.setdefault(name, dict.fromkeys(CHECKSUM_FIELDS))
+                if sha256 != row['sha256']:
+                    row['row_count'] = None
+                row['sha256'] = sha256
+                row['size_bytes'] = size if size is not None else row['size_bytes']
+                row['row_count'] = rows if rows is not None else row['row_count']
+                row['uploaded_sha256'] = uploaded if uploaded is not None else row['uploaded_sha256']
+        return found
+
+    def get_file_metadata(self, file_date: str = None) -> list:
+        self.flush()
+        return self.inner.get_file_metadata(file_date)
+
+    def get_dq_checks(self, file_date: str) -> list:
+        self.flush()
+        return self.inner.get_dq_checks(file_date)
+
+    def fetch_all(self, sql: str, params=()) -> list:
+        self.flush()
+        return self.inner.fetch_all(sql, params)
+
+    @property
+    def dialect(self):
+        return self.inner.dialect
+
+    # --- pass-through ------------------------------------------------------------------------------------------
+
+    def migrate(self, *args) -> int:
+        return self.inner.migrate(*args)
+
+    def compact_dq_checks(self, cutoff: str) -> int:
+        self.flush()
+        return self.inner.compact_dq_checks(cutoff)
+
+    def get_multipart_upload(self, bucket: str, object_name: str):
+        return self.inner.get_multipart_upload(bucket, object_name)
+
+    def save_multipart_upload(self, bucket: str, object_name: str, upload_id: str, sha256: str, part_size: int):
+        self.inner.save_multipart_upload(bucket, object_name, upload_id, sha256, part_size)
+
+    def save_multipart_part(self, upload_id: str, part_number: int, etag: str, size_bytes: int):
+        self.inner.save_multipart_part(upload_id, part_number, etag, size_bytes)
+
+    def delete_multipart_upload(self, bucket: str, object_name: str):
+        self.inner.delete_multipart_upload(bucket, object_name)
+
+    def save_compaction(self, object_name: str, dataset_type: str, period: str, sha256: str, size_bytes: int,
+                        files: list):
+        self.inner.save_compaction(object_name, dataset_type, period, sha256, size_bytes, files)
+
+    def get_compactions(self, file_names) -> dict:
+        return self.inner.get_compactions(file_names)
+
+    def close(self):
+        self.flush()
+        self.inner.close()
+
+
+_backend = None
+_backend_lock = threading.Lock()
+
+
+def get_backend() -> MetadataBackend:
+    """The process-wide backend selected by METADATA_BACKEND (created on first use)."""
+    global _backend
+    with _backend_lock:
+        if _backend is None:
+            if METADATA_BACKEND == 'sqlite':
+                from metadata_sqlite import SQLiteBackend
+                _backend = SQLiteBackend()
+            elif METADATA_BACKEND == 'postgres':
+                from metadata_postgres import PostgresBackend
+                _backend = PostgresBackend()
+            else:
+                raise ValueError(f"Unknown METADATA_BACKEND '{METADATA_BACKEND}'")
+            if METADATA_WRITE_BEHIND:
+                _backend = WriteBehindBackend(_backend)
+        return _backend
+
+
+def set_backend(backend: MetadataBackend) -> MetadataBackend:
+    """Use `backend` for this process (e.g. another DB path); returns the previous one."""
+    global _backend
+    with _backend_lock:
+        previous, _backend = _backend, backend
+    return previous
+
+
+def flush_metadata(*args, **kwargs):
+    """
+    Write out queued write-behind metadata (no-op otherwise). Called when a task ends,
+    from failure callbacks and at interpreter exit; accepts and ignores callback args.
+    """
+    if isinstance(_backend, WriteBehindBackend):
+        _backend.flush()
+
+
+atexit.register(flush_metadata)
+
+
+def flushes_metadata(fn):
+    """
+    Decorator for Airflow task entry points: flush write-behind metadata when `fn` returns or
+    raises, so queued rows never depend on the DAG's task wrapper or on atexit hooks.
+    """
+    @functools.wraps(fn)
+    def _task(*args, **kwargs):
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            flush_metadata()
+    return _task
 
+# ------------------------------------------------------------------------------------------------------------------
+# Metadata API
+# ------------------------------------------------------------------------------------------------------------------
 
 def init_metadata_db(**kwargs):
     """
-    Create metadata tables:
-      • file_metadata --> per-stage timestamps
-      • dq_checks     --> raw audit of each DQ check call (PASS/WARN/FAIL)
-      • dq_signature  --> deterministic hash of row-level failures
+    Create or upgrade the metadata tables by applying pending migrations:
+      • file_metadata    --> per-stage timestamps
+      • dq_checks        --> raw audit of each DQ check call (PASS/WARN/FAIL)
+      • dq_signature     --> deterministic hash and failing-key set of row-level failures
+      • dq_check_summary --> daily roll-up of dq_checks past retention
+      • file_checksums   --> content hash and row count per validated / quarantined file, and the hash last uploaded
+      • multipart_uploads / multipart_parts --> unfinished multipart uploads and their completed part ETags
+      • compacted_objects / compacted_files --> merged lake objects and the small files they replaced
     """
     logger.info("🔧 Initializing metadata database...")
-    with get_db_connection() as conn:
-        c = conn.cursor()
-        # 1) File metadata
-        c.execute("""
-            CREATE TABLE IF NOT EXISTS file_metadata (
-                file_name    TEXT PRIMARY KEY,
-                dataset_type TEXT,
-                file_date    TEXT,
-                generated_at TEXT NULL,
-                validated_at TEXT NULL,
-                uploaded_at  TEXT NULL
-            );
-        """)
-        # 2) DQ audit log
-        c.execute("""
-            CREATE TABLE IF NOT EXISTS dq_checks (
-                id          INTEGER PRIMARY KEY AUTOINCREMENT,
-                file_name   TEXT,
-                file_date   TEXT,
-                check_name  TEXT,
-                status      TEXT,
-                details     TEXT,
-                timestamp   DATETIME DEFAULT CURRENT_TIMESTAMP
-            );
-        """)
-        # 3) DQ failure signature for idempotent alerting
-        c.execute("""
-            CREATE TABLE IF NOT EXISTS dq_signature (
-                file_name    TEXT    NOT NULL,
-                dataset_type TEXT    NOT NULL,
-                file_date    TEXT    NOT NULL,
-                signature    TEXT    NOT NULL,
-                last_ts      TEXT    NOT NULL,
-                PRIMARY KEY(file_name, dataset_type, file_date)
-            );
-        """)
-        conn.commit()
-    logger.info("✅ Metadata DB initialized.")
-
-
-def log_stage(file_name: str, dataset_type: str, file_date: str, stage: str):
+    version = get_backend().migrate()
+    logger.info(f"✅ Metadata DB initialized ({METADATA_BACKEND}, schema version {version}).")
+
+
+def log_stage(file_name: str, dataset_type: str, file_date: str, stage: str, rows: int = None):
     """
     Upsert the UTC timestamp for the specified stage
-    ('generated', 'validated', or 'uploaded') in file_metadata.
+    ('generated', 'validated', or 'uploaded') in file_metadata,
+    and the file's row count when the stage knows it.
     """
-    if stage not in ('generated', 'validated', 'uploaded'):
+    if stage not in STAGES:
         raise ValueError(f"Invalid stage '{stage}'")
 
     ts = datetime.utcnow().isoformat()
-    with get_db_connection() as conn:
-        c = conn.cursor()
-        # Does the row already exist?
-        c.execute("SELECT 1 FROM file_metadata WHERE file_name = ?", (file_name,))
-        exists = c.fetchone() is not None
-
-        if exists:
-            # Only update the one stage column
-            c.execute(f"UPDATE file_metadata SET {stage}_at = ? WHERE file_name = ?", (ts, file_name))
-        else:
-            # Insert a new row, filling only this stage
-            data = {
-                'file_name':   file_name,
-                'dataset_type': dataset_type,
-                'file_date':    file_date,
-                'generated_at': None,
-                'validated_at': None,
-                'uploaded_at':  None
-            }
-            data[f"{stage}_at"] = ts
-            c.execute("""
-                INSERT INTO file_metadata
-                (file_name, dataset_type, file_date, generated_at, validated_at, uploaded_at)
-                VALUES (:file_name, :dataset_type, :file_date,
-                        :generated_at, :validated_at, :uploaded_at)
-            """, data)
-        conn.commit()
+    get_backend().write_batch(stages=[(file_name, dataset_type, file_date, stage, ts, rows)])
     logger.info(f"📝 Logged stage '{stage}' for {file_name} at {ts}")
 
 
@@ -113,139 +404,316 @@ def check_stage_complete(file_name: str, stage: str) -> bool:
     """
     Return True if the specified stage column is non-null in file_metadata.
     """
-    if stage not in ('generated', 'validated', 'uploaded'):
-        raise ValueError(f"Invalid stage '{stage}'")
-
-    with get_db_connection() as conn:
-        c = conn.cursor()
-        c.execute(f"SELECT {stage}_at FROM file_metadata WHERE file_name = ?", (file_name,))
-        row = c.fetchone()
-
-    completed = bool(row and row[0])
+    completed = file_name in completed_files([file_name], stage)
     logger.debug(f"🔍 Stage '{stage}' complete for '{file_name}'? {completed}")
     return completed
 
 
+def get_stage_status(file_names=None, file_date: str = None) -> dict:
+    """
+    Stage timestamps for many files in one indexed query, keyed by file name:
+    {file_name: {'generated_at': ..., 'validated_at': ..., 'uploaded_at': ...}}.
+    Select by `file_names` (primary-key lookups), by `file_date`, or both.
+    Files with no metadata row are absent from the result.
+    """
+    status = get_backend().get_stage_status(file_names, file_date)
+    logger.debug(f"🔍 Retrieved stage status for {len(status)} files")
+    return status
+
+
+def completed_files(file_names, stage: str) -> set:
+    """Return the subset of `file_names` whose `stage` is complete (bulk check_stage_complete)."""
+    if stage not in STAGES:
+        raise ValueError(f"Invalid stage '{stage}'")
+    status = get_stage_status(file_names=file_names)
+    return {name for name, stages in status.items() if stages[f"{stage}_at"]}
+
+
 def log_dq_result(file_name: str, check_name: str, status: str, details: str = None):
     """
     Insert a new row into dq_checks for the given DQ check outcome.
     """
-    DATE_RE = re.compile(r"_(\d{4}-\d{2}-\d{2})\.")
-    m = DATE_RE.search(file_name)
-    file_date = m.group(1)
-
-    with get_db_connection() as conn:
-        c = conn.cursor()
-        c.execute("""
-            INSERT INTO dq_checks (file_name, file_date, check_name, status, details)
-            VALUES (?, ?, ?, ?, ?);
-        """, (file_name, file_date, check_name, status, details))
-        conn.commit()
+    get_backend().write_batch(
+        checks=[(file_name, _file_date(file_name), check_name, status, details, _utc_timestamp())]
+    )
     logger.info(f"🧪 DQ Check logged: {file_name} | {check_name} = {status}")
 
 
-def log_dq_signature(file_name: str, dataset_type: str, file_date: str, signature: str):
+def log_dq_signature(file_name: str, dataset_type: str, file_date: str, signature: str, failure_keys=None):
     """
-    Upsert the DQ-failure signature (an MD5 of sorted failure keys)
-    for this file/date. Later we compare it to detect truly new failures.
+    Upsert the DQ-failure signature (an order-independent digest of failing keys)
+    for this file/date, and the failing-key set itself when given (see get_failure_delta).
+    Later we compare them to detect truly new failures.
     """
     ts = datetime.utcnow().isoformat()
-    with get_db_connection() as conn:
-        c = conn.cursor()
-        c.execute("""
-            INSERT INTO dq_signature
-              (file_name, dataset_type, file_date, signature, last_ts)
-            VALUES (?, ?, ?, ?, ?)
-            ON CONFLICT(file_name, dataset_type, file_date) DO UPDATE
-              SET signature = excluded.signature,
-                  last_ts   = excluded.last_ts;
-        """, (file_name, dataset_type, file_date, signature, ts))
-        conn.commit()
+    get_backend().write_batch(
+        signatures=[(file_name, dataset_type, file_date, signature, ts, pack_failure_keys(failure_keys))]
+    )
     logger.info(f"🔑 Logged DQ signature for {file_name}: {signature}")
 
 
+class DQRecorder:
+    """
+    Collects the DQ check results, stage updates and failure signature of one file
+    and writes them to the metadata DB in a single transaction on `flush()` (or when
+    a `with` block exits, also on error so partial results are kept).
+    Methods mirror the module-level log_* functions, minus the file identity.
+    """
+
+    def __init__(self, file_name: str, dataset_type: str, file_date: str):
+        self.file_name = file_name
+        self.dataset_type = dataset_type
+        self.file_date = file_date
+        self._checks = []
+        self._stages = []
+        self._signatures = []
+        self._checksums = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.flush()
+
+    def log_dq_result(self, check_name: str, status: str, details: str = None):
+        self._checks.append((self.file_name, _file_date(self.file_name), check_name, status, details,
+                             _utc_timestamp()))
+        logger.info(f"🧪 DQ Check recorded: {self.file_name} | {check_name} = {status}")
+
+    def log_stage(self, stage: str, rows: int = None):
+        if stage not in STAGES:
+            raise ValueError(f"Invalid stage '{stage}'")
+        self._stages.append((self.file_name, self.dataset_type, self.file_date, stage,
+                             datetime.utcnow().isoformat(), rows))
+
+    def log_dq_signature(self, signature: str, failure_keys=None):
+        self._signatures = [(self.file_name, self.dataset_type, self.file_date, signature,
+                             datetime.utcnow().isoformat(), pack_failure_keys(failure_keys))]
+
+    def log_checksum(self, path: Path, location: str, sha256: str = None, size_bytes: int = None,
+                     rows: int = None, uploaded: bool = False):
+        """
+        Record the content hash (and row count, when known) of an output file of this one (e.g.
+        its quarantined part). Output streamed straight to the bucket has no local file: pass the
+        hash and size computed while streaming, with `uploaded=True`.
+        """
+        path = Path(path)
+        if sha256 is None:
+            sha256, size_bytes = file_sha256(path), path.stat().st_size
+        self._checksums.append((path.name, location, self.dataset_type, self.file_date, sha256, size_bytes, rows,
+                                sha256 if uploaded else None, datetime.utcnow().isoformat()))
+
+    def flush(self):
+        """Write everything recorded so far in one transaction, then reset."""
+        if not (self._checks or self._stages or self._signatures or self._checksums):
+            return
+        get_backend().write_batch(self._checks, self._stages, self._signatures, self._checksums)
+        logger.info(f"📝 Flushed {len(self._checks)} DQ checks, stages {[s[3] for s in self._stages]}"
+                    f"{' and signature' if self._signatures else ''}"
+                    f"{f' and checksums of {len(self._checksums)} files' if self._checksums else ''}"
+                    f" for {self.file_name}")
+        self._checks, self._stages, self._signatures, self._checksums = [], [], [], []
+
+
 def has_failure_delta(file_name: str, dataset_type: str, file_date: str, signature: str) -> bool:
     """
     Return True if the stored signature differs from the current one.
     Only meaningful when `signature` (i.e. failure signature) is non-empty.
     """
-    with get_db_connection() as conn:
-        c = conn.cursor()
-        c.execute("""
-            SELECT signature FROM dq_signature
-            WHERE file_name = ? AND dataset_type = ? AND file_date = ?
-        """, (file_name, dataset_type, file_date))
-        row = c.fetchone()
-
-    if row is None:
+    prev_sig = get_backend().get_dq_signature(file_name, dataset_type, file_date)
+    if prev_sig is None:
         # No prior run → any failure is “new”
         return bool(signature)
-
-    prev_sig = row["signature"]
     return prev_sig != signature
 
+# ------------------------------------------------------------------------------------------------------------------
+# Failing-key sets: sorted unique uint64 key hashes, stored as a little-endian blob
+# ------------------------------------------------------------------------------------------------------------------
+
+def pack_failure_keys(keys):
+    """Blob for a failing-key set (None stays None, as does a set over DQ_FAILURE_KEYS_MAX keys)."""
+    if keys is None or len(keys) > DQ_FAILURE_KEYS_MAX:
+        return None
+    return np.unique(np.asarray(keys, dtype=np.uint64)).astype('<u8').tobytes()
+
+
+def unpack_failure_keys(blob):
+    """Sorted uint64 array from a stored blob, or None for no stored set."""
+    if blob is None:
+        return None
+    return np.frombuffer(bytes(blob), dtype='<u8').astype(np.uint64)
+
+
+def get_failure_keys(file_name: str, dataset_type: str, file_date: str):
+    """Failing-key set stored by the last validation of this file, or None."""
+    return unpack_failure_keys(get_backend().get_failure_keys(file_name, dataset_type, file_date))
+
+
+def diff_failure_keys(previous, current) -> dict:
+    """
+    Split two sorted failing-key sets into {'new', 'persisting', 'resolved'} arrays.
+    Without a previous set (first run, or it was too large to store) every current key is new.
+    """
+    current = np.asarray(current, dtype=np.uint64)
+    if previous is None:
+        previous = np.empty(0, np.uint64)
+    return {
+        'new': np.setdiff1d(current, previous, assume_unique=True),
+        'persisting': np.intersect1d(current, previous, assume_unique=True),
+        'resolved': np.setdiff1d(previous, current, assume_unique=True),
+    }
+
+
+def get_failure_delta(file_name: str, dataset_type: str, file_date: str, failure_keys) -> dict:
+    """
+    Compare a file's current failing keys with the set stored by its last validation:
+    {'new': keys, 'persisting': keys, 'resolved': keys}. Call before recording the new set.
+    """
+    return diff_failure_keys(get_failure_keys(file_name, dataset_type, file_date), failure_keys)
+
+
+# ------------------------------------------------------------------------------------------------------------------
+# Content checksums: SHA-256 of each file as written by validation, and of the copy last uploaded
+# ------------------------------------------------------------------------------------------------------------------
+
+def file_sha256(path: Path) -> str:
+    """Hex SHA-256 of a file, streamed in CHECKSUM_CHUNK_BYTES reads."""
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        while chunk := f.read(CHECKSUM_CHUNK_BYTES):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def log_checksum(file_name: str, location: str, dataset_type: str, file_date: str, sha256: str,
+                 size_bytes: int = None, uploaded: bool = False):
+    """
+    Upsert the content hash of a file in `location` ('valid' / 'quarantine'); with
+    `uploaded=True` also record it as the content now stored in the bucket.
+    """
+    ts = datetime.utcnow().isoformat()
+    get_backend().write_batch(checksums=[
+        (file_name, location, dataset_type, file_date, sha256, size_bytes, None, sha256 if uploaded else None, ts)
+    ])
+    logger.debug(f"🔏 Logged {'uploaded ' if uploaded else ''}checksum for {location}/{file_name}: {sha256[:12]}")
+
+
+def get_checksums(file_names, location: str, file_date: str = None) -> dict:
+    """
+    Recorded checksums for many files in one query, keyed by file name:
+    {file_name: {'sha256': ..., 'size_bytes': ..., 'row_count': ..., 'uploaded_sha256': ...}}.
+    Select by `file_names` (None for every file in `location`), by `file_date`, or both.
+    Files with no row are absent.
+    """
+    return get_backend().get_checksums(None if file_names is None else list(file_names), location, file_date)
+
+
+# ------------------------------------------------------------------------------------------------------------------
+# Multipart upload progress: lets a retried upload resume from its last completed part
+# ------------------------------------------------------------------------------------------------------------------
+
+def get_multipart_upload(bucket: str, object_name: str):
+    """
+    The unfinished multipart upload recorded for an object, or None:
+    {'upload_id': ..., 'sha256': ..., 'part_size': ..., 'parts': {part_number: etag}}.
+    """
+    return get_backend().get_multipart_upload(bucket, object_name)
+
+
+def record_multipart_upload(bucket: str, object_name: str, upload_id: str, sha256: str, part_size: int):
+    """Record a started multipart upload of content `sha256` cut into `part_size` parts."""
+    get_backend().save_multipart_upload(bucket, object_name, upload_id, sha256, part_size)
+    logger.debug(f"🧩 Started multipart upload {upload_id} for {bucket}/{object_name}")
+
+
+def record_multipart_part(upload_id: str, part_number: int, etag: str, size_bytes: int):
+    """Record a part the server has acknowledged."""
+    get_backend().save_multipart_part(upload_id, part_number, etag, size_bytes)
+
+
+def forget_multipart_upload(bucket: str, object_name: str):
+    """Drop the recorded upload of an object and its parts."""
+    get_backend().delete_multipart_upload(bucket, object_name)
+
+# ------------------------------------------------------------------------------------------------------------------
+# Lake compaction: which merged object holds the rows of each small valid file
+# ------------------------------------------------------------------------------------------------------------------
+
+def record_compaction(object_name: str, dataset_type: str, period: str, sha256: str, size_bytes: int,
+                      files: list):
+    """
+    Record that `object_name` (content `sha256`) now holds the rows of `files`, each given as
+    (file_name, file_date, sha256 of the file's content, row_count); replaces its earlier file list.
+    """
+    get_backend().save_compaction(object_name, dataset_type, period, sha256, size_bytes, list(files))
+    logger.info(f"🗜️ Recorded compaction of {len(files)} {dataset_type} files into {object_name}")
+
+
+def get_compactions(file_names) -> dict:
+    """
+    The compacted object holding each file's rows, keyed by file name:
+    {file_name: {'object_name': ..., 'sha256': ..., 'row_count': ..., 'object_sha256': ...,
+    'object_size_bytes': ...}}, where 'sha256' is the file content that was merged. Files never
+    compacted are absent.
+    """
+    return get_backend().get_compactions(list(file_names))
+
+
+def compact_dq_checks(ds: str = None, retention_days: int = DQ_RETENTION_DAYS, **kwargs) -> int:
+    """
+    Roll dq_checks rows whose file_date is more than `retention_days` before `ds` (default: today)
+    up into dq_check_summary, one row per (file_date, check_name, status), and delete them.
+    Re-running is safe: check counts add up in existing summary rows, while the file count keeps
+    the larger of the two roll-ups, since late rows of a day come from files already counted.
+    Failing-key sets of those days are dropped too (their signatures stay). Returns the number of rows compacted.
+    """
+    ref = datetime.strptime(ds, "%Y-%m-%d").date() if ds else datetime.utcnow().date()
+    cutoff = (ref - timedelta(days=retention_days)).isoformat()
+
+    compacted = get_backend().compact_dq_checks(cutoff)
+    logger.info(f"🗜️ Compacted {compacted} dq_checks rows older than {cutoff} into daily summaries")
+    return compacted
+
 
 def get_all_metadata():
     """Retrieve all file metadata records, ordered by file_date and file_name."""
-    with get_db_connection() as conn:
-        c = conn.cursor()
-        c.execute("SELECT * FROM file_metadata ORDER BY file_date DESC, file_name")
-        results = c.fetchall()
+    results = get_backend().get_file_metadata()
     logger.debug(f"📦 Retrieved all metadata entries: {len(results)} rows")
     return results
 
 
 def get_metadata_for_date(ds: str):
     """Retrieve file metadata for a specific date (file_date == ds)."""
-    with get_db_connection() as conn:
-        c = conn.cursor()
-        c.execute(
-            "SELECT * FROM file_metadata WHERE file_date = ? ORDER BY file_name",
-            (ds,)
-        )
-        results = c.fetchall()
+    results = get_backend().get_file_metadata(ds)
     logger.debug(f"📅 Retrieved metadata for {ds}: {len(results)} rows")
     return results
 
 
 def print_metadata(ds: str, **kwargs):
     """Print file metadata and DQ checks for a given date to the console."""
-    with get_db_connection() as conn:
-        c = conn.cursor()
-
-        # File metadata section
-        print(f"\n=== File Metadata for {ds} ===")
-        print("file_name | dataset_type | file_date | generated_at | validated_at | uploaded_at")
-        print("-" * 80)
-        c.execute(
-            "SELECT file_name, dataset_type, file_date, generated_at, validated_at, uploaded_at"
-            " FROM file_metadata WHERE file_date = ?",
-            (ds,)
-        )
-        rows = c.fetchall()
-        if rows:
-            for row in rows:
-                print(" | ".join(str(row[h]) for h in
-                      ["file_name","dataset_type","file_date","generated_at","validated_at","uploaded_at"]))
-        else:
-            print("(no file metadata records)")
-
-        # DQ checks section
-        print(f"\n=== DQ Checks for {ds} ===")
-        print("file_name | check_name | status | details | timestamp")
-        print("-" * 80)
-        c.execute(
-            "SELECT file_name, file_date, check_name, status, details, timestamp"
-            " FROM dq_checks WHERE file_date = ?",
-            (ds,)
-        )
-        dq_rows = c.fetchall()
-        if dq_rows:
-            for row in dq_rows:
-                print(" | ".join(str(row[h]) for h in
-                      ["file_name","check_name","status","details","timestamp"]))
-        else:
-            print("(no DQ records)")
+    # File metadata section
+    print(f"\n=== File Metadata for {ds} ===")
+    print("file_name | dataset_type | file_date | generated_at | validated_at | uploaded_at")
+    print("-" * 80)
+    rows = get_metadata_for_date(ds)
+    if rows:
+        for row in rows:
+            print(" | ".join(str(row[h]) for h in
+                  ["file_name","dataset_type","file_date","generated_at","validated_at","uploaded_at"]))
+    else:
+        print("(no file metadata records)")
+
+    # DQ checks section (the daily roll-up once past retention)
+    print(f"\n=== DQ Checks for {ds} ===")
+    print("file_name | check_name | status | details | timestamp")
+    print("-" * 80)
+    dq_rows = get_backend().get_dq_checks(ds)
+    if dq_rows:
+        for row in dq_rows:
+            print(" | ".join(str(row[h]) for h in
+                  ["file_name","check_name","status","details","timestamp"]))
+    else:
+        print("(no DQ records)")
 
     print()
-    logger.info(f"🖨️ Metadata printed for {ds}")
\ No newline at end of file
+    logger.info(f"🖨️ Metadata printed for {ds}")
@@ -0,0 +1,488 @@
+"""
+SQLite metadata backend: a single database file on the worker's local disk.
+
+Connections run in WAL mode with a busy timeout and are pooled per process.
+Selected with METADATA_BACKEND=sqlite (the default); see metadata.py.
+"""
+import sqlite3
+import json
+import os
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+from metadata import CHECKSUM_FIELDS, COMPACTION_FIELDS, MetadataBackend, STAGES, logger
+
+# Path to your SQLite metadata database
+METADATA_DB = Path(os.getenv("METADATA_DB_PATH", "/opt/airflow/data/metadata.db"))
+
+# Concurrency settings: WAL lets readers run alongside the single writer, busy_timeout makes
+# a blocked writer wait for the lock instead of failing with "database is locked".
+METADATA_JOURNAL_MODE = os.getenv("METADATA_JOURNAL_MODE", "WAL")
+METADATA_SYNCHRONOUS = os.getenv("METADATA_SYNCHRONOUS", "NORMAL")
+METADATA_BUSY_TIMEOUT_MS = int(os.getenv("METADATA_BUSY_TIMEOUT_MS", "30000"))
+# Idle connections kept per process; 0 opens a new connection for every call
+METADATA_POOL_SIZE = int(os.getenv("METADATA_POOL_SIZE", "4"))
+
+# ------------------------------------------------------------------------------------------------------------------
+# Schema migrations: applied in order, the DB's PRAGMA user_version records the last one applied
+# ------------------------------------------------------------------------------------------------------------------
+
+MIGRATIONS = [
+    (1, "base tables", [
+        # file_metadata --> per-stage timestamps
+        """
+        CREATE TABLE IF NOT EXISTS file_metadata (
+            file_name    TEXT PRIMARY KEY,
+            dataset_type TEXT,
+            file_date    TEXT,
+            generated_at TEXT NULL,
+            validated_at TEXT NULL,
+            uploaded_at  TEXT NULL
+        );
+        """,
+        # dq_checks --> raw audit of each DQ check call (PASS/WARN/FAIL)
+        """
+        CREATE TABLE IF NOT EXISTS dq_checks (
+            id          INTEGER PRIMARY KEY AUTOINCREMENT,
+            file_name   TEXT,
+            file_date   TEXT,
+            check_name  TEXT,
+            status      TEXT,
+            details     TEXT,
+            timestamp   DATETIME DEFAULT CURRENT_TIMESTAMP
+        );
+        """,
+        # dq_signature --> deterministic hash of row-level failures, for idempotent alerting
+        """
+        CREATE TABLE IF NOT EXISTS dq_signature (
+            file_name    TEXT    NOT NULL,
+            dataset_type TEXT    NOT NULL,
+            file_date    TEXT    NOT NULL,
+            signature    TEXT    NOT NULL,
+            last_ts      TEXT    NOT NULL,
+            PRIMARY KEY(file_name, dataset_type, file_date)
+        );
+        """,
+    ]),
+    (2, "indexes for by-date reports and per-file check lookups", [
+        "CREATE INDEX IF NOT EXISTS idx_file_metadata_file_date ON file_metadata (file_date);",
+        "CREATE INDEX IF NOT EXISTS idx_dq_checks_file_date ON dq_checks (file_date);",
+        "CREATE INDEX IF NOT EXISTS idx_dq_checks_file_check ON dq_checks (file_name, check_name);",
+    ]),
+    (3, "daily roll-up of compacted dq_checks", [
+        # dq_check_summary --> one row per (day, check, status) for dq_checks past retention
+        """
+        CREATE TABLE IF NOT EXISTS dq_check_summary (
+            file_date    TEXT    NOT NULL,
+            check_name   TEXT    NOT NULL,
+            status       TEXT    NOT NULL,
+            checks       INTEGER NOT NULL,
+            files        INTEGER NOT NULL,
+            first_ts     DATETIME,
+            last_ts      DATETIME,
+            last_details TEXT,
+            PRIMARY KEY(file_date, check_name, status)
+        );
+        """,
+    ]),
+    (4, "row counts for throughput reports", [
+        "ALTER TABLE file_metadata ADD COLUMN row_count INTEGER NULL;",
+    ]),
+    (5, "failing-key sets for new / resolved failure deltas", [
+        "ALTER TABLE dq_signature ADD COLUMN failure_keys BLOB NULL;",
+    ]),
+    (6, "content checksums for upload skips", [
+        # file_checksums --> SHA-256 of each output file per location, and of the copy last uploaded
+        """
+        CREATE TABLE IF NOT EXISTS file_checksums (
+            file_name       TEXT    NOT NULL,
+            location        TEXT    NOT NULL,
+            dataset_type    TEXT,
+            file_date       TEXT,
+            sha256          TEXT    NOT NULL,
+            size_bytes      INTEGER NULL,
+            uploaded_sha256 TEXT    NULL,
+            updated_at      TEXT    NOT NULL,
+            PRIMARY KEY(file_name, location)
+        );
+        """,
+    ]),
+    (7, "multipart upload progress for resumable uploads", [
+        # multipart_uploads --> unfinished upload per object, for the content and part size it was started with
+        """
+        CREATE TABLE IF NOT EXISTS multipart_uploads (
+            bucket      TEXT    NOT NULL,
+            object_name TEXT    NOT NULL,
+            upload_id   TEXT    NOT NULL UNIQUE,
+            sha256      TEXT    NOT NULL,
+            part_size   INTEGER NOT NULL,
+            started_at  TEXT    NOT NULL,
+            PRIMARY KEY(bucket, object_name)
+        );
+        """,
+        # multipart_parts --> ETag of each part the server acknowledged
+        """
+        CREATE TABLE IF NOT EXISTS multipart_parts (
+            upload_id   TEXT    NOT NULL,
+            part_number INTEGER NOT NULL,
+            etag        TEXT    NOT NULL,
+            size_bytes  INTEGER NOT NULL,
+            PRIMARY KEY(upload_id, part_number)
+        );
+        """,
+    ]),
+    (8, "output row counts and by-date checksum lookups for upload manifests", [
+        "ALTER TABLE file_checksums ADD COLUMN row_count INTEGER NULL;",
+        "CREATE INDEX IF NOT EXISTS idx_file_checksums_date ON file_checksums(file_date, location);",
+    ]),
+    (9, "compacted lake objects and the small files merged into them", [
+        # compacted_objects --> one merged Parquet object per entity and period
+        """
+        CREATE TABLE IF NOT EXISTS compacted_objects (
+            object_name  TEXT    PRIMARY KEY,
+            dataset_type TEXT    NOT NULL,
+            period       TEXT    NOT NULL,
+            sha256       TEXT    NOT NULL,
+            size_bytes   INTEGER NOT NULL,
+            row_count    INTEGER NULL,
+            compacted_at TEXT    NOT NULL
+        );
+        """,
+        # compacted_files --> the compacted object now holding a valid file's rows, for the content it had
+        """
+        CREATE TABLE IF NOT EXISTS compacted_files (
+            file_name   TEXT    PRIMARY KEY,
+            object_name TEXT    NOT NULL,
+            file_date   TEXT,
+            sha256      TEXT    NOT NULL,
+            row_count   INTEGER NULL
+        );
+        """,
+        "CREATE INDEX IF NOT EXISTS idx_compacted_files_object ON compacted_files(object_name);",
+    ]),
+]
+
+SCHEMA_VERSION = MIGRATIONS[-1][0]
+
+_INSERT_DQ_CHECK = """
+    INSERT INTO dq_checks (file_name, file_date, check_name, status, details, timestamp)
+    VALUES (?, ?, ?, ?, ?, ?);
+"""
+
+_UPSERT_SIGNATURE = """
+    INSERT INTO dq_signature
+      (file_name, dataset_type, file_date, signature, last_ts, failure_keys)
+    VALUES (?, ?, ?, ?, ?, ?)
+    ON CONFLICT(file_name, dataset_type, file_date) DO UPDATE
+      SET signature    = excluded.signature,
+          last_ts      = excluded.last_ts,
+          failure_keys = excluded.failure_keys;
+"""
+
+# A validation rerun replaces the hash; the uploaded hash only changes on upload, and a row count
+# is kept only while the content it was counted for is
+_UPSERT_CHECKSUM = """
+    INSERT INTO file_checksums
+      (file_name, location, dataset_type, file_date, sha256, size_bytes, row_count, uploaded_sha256, updated_at)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+    ON CONFLICT(file_name, location) DO UPDATE
+      SET sha256          = excluded.sha256,
+          size_bytes      = COALESCE(excluded.size_bytes, file_checksums.size_bytes),
+          row_count       = CASE WHEN excluded.sha256 = file_checksums.sha256
+                                 THEN COALESCE(excluded.row_count, file_checksums.row_count)
+                                 ELSE excluded.row_count END,
+          uploaded_sha256 = COALESCE(excluded.uploaded_sha256, file_checksums.uploaded_sha256),
+          updated_at      = excluded.updated_at;
+"""
+
+# Only the stage's own column (and a reported row count) changes on an existing row
+_UPSERT_STAGE = """
+    INSERT INTO file_metadata (file_name, dataset_type, file_date, {stage}_at, row_count)
+    VALUES (?, ?, ?, ?, ?)
+    ON CONFLICT(file_name) DO UPDATE
+      SET {stage}_at = excluded.{stage}_at,
+          row_count  = COALESCE(excluded.row_count, file_metadata.row_count);
+"""
+
+
+class SQLiteBackend(MetadataBackend):
+
+    dialect = "sqlite"
+
+    def __init__(self, path: Path = METADATA_DB):
+        self.path = Path(path)
+        self._pool = []          # idle connections owned by this process
+        self._pool_pid = None    # pid the pool belongs to
+        self._pool_lock = threading.Lock()
+
+    # --- connections -------------------------------------------------------------------------------------------
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path, timeout=METADATA_BUSY_TIMEOUT_MS / 1000, check_same_thread=False)
+        conn.row_factory = sqlite3.Row
+        conn.execute(f"PRAGMA busy_timeout = {METADATA_BUSY_TIMEOUT_MS}")
+        conn.execute(f"PRAGMA journal_mode = {METADATA_JOURNAL_MODE}")
+        conn.execute(f"PRAGMA synchronous = {METADATA_SYNCHRONOUS}")
+        return conn
+
+    def _acquire(self) -> sqlite3.Connection:
+        with self._pool_lock:
+            if self._pool_pid != os.getpid():
+                # Forked child: never reuse the parent's handles, just drop them
+                self._pool, self._pool_pid = [], os.getpid()
+            if self._pool:
+                return self._pool.pop()
+        return self._connect()
+
+    def _release(self, conn: sqlite3.Connection):
+        if conn.in_transaction:
+            conn.rollback()
+        with self._pool_lock:
+            if self._pool_pid == os.getpid() and len(self._pool) < METADATA_POOL_SIZE:
+                self._pool.append(conn)
+                return
+        conn.close()
+
+    @contextmanager
+    def connection(self):
+        """Yield a pooled connection (row factory, WAL, busy timeout); uncommitted work is rolled back."""
+        conn = self._acquire()
+        try:
+            yield conn
+        finally:
+            self._release(conn)
+
+    def close(self):
+        with self._pool_lock:
+            idle = self._pool if self._pool_pid == os.getpid() else []
+            self._pool = []
+        for conn in idle:
+            conn.close()
+
+    # --- schema ------------------------------------------------------------------------------------------------
+
+    def migrate(self, migrations: list = MIGRATIONS) -> int:
+        with self.connection() as conn:
+            for version, description, statements in migrations:
+                # BEGIN IMMEDIATE takes the write lock, so concurrent initializers apply each step once
+                conn.execute("BEGIN IMMEDIATE")
+                try:
+                    current = conn.execute("PRAGMA user_version").fetchone()[0]
+                    if version <= current:
+                        conn.rollback()
+                        continue
+                    for statement in statements:
+                        conn.execute(statement)
+                    conn.execute(f"PRAGMA user_version = {version}")
+                    conn.commit()
+                except Exception:
+                    conn.rollback()
+                    raise
+                logger.info(f"🧱 Applied metadata migration {version}: {description}")
+            return conn.execute("PRAGMA user_version").fetchone()[0]
+
+    # --- writes ------------------------------------------------------------------------------------------------
+
+    def write_batch(self, checks=(), stages=(), signatures=(), checksums=()):
+        with self.connection() as conn:
+            with conn:  # one transaction: commit on success, roll back on error
+                c = conn.cursor()
+                if checks:
+                    c.executemany(_INSERT_DQ_CHECK, checks)
+                for stage in STAGES:
+                    rows = [(f, d, day, ts, n) for f, d, day, s, ts, n in stages if s == stage]
+                    if rows:
+                        c.executemany(_UPSERT_STAGE.format(stage=stage), rows)
+                if signatures:
+                    c.executemany(_UPSERT_SIGNATURE, signatures)
+                if checksums:
+                    c.executemany(_UPSERT_CHECKSUM, checksums)
+
+    def compact_dq_checks(self, cutoff: str) -> int:
+        with self.connection() as conn:
+            with conn:  # roll-up and delete in one transaction
+                # last_details comes from each group's newest row, joined back by its id; a day compacted
+                # again (a late rerun) re-counts the same files, so `files` keeps the larger count
+                conn.execute("""
+                    INSERT INTO dq_check_summary
+                      (file_date, check_name, status, checks, files, first_ts, last_ts, last_details)
+                    SELECT g.file_date, g.check_name, g.status, g.checks, g.files, g.first_ts, g.last_ts, d.details
+                    FROM (
+                        SELECT file_date, check_name, status, COUNT(*) AS checks,
+                               COUNT(DISTINCT file_name) AS files,
+                               MIN(timestamp) AS first_ts, MAX(timestamp) AS last_ts, MAX(id) AS last_id
+                        FROM dq_checks
+                        WHERE file_date < ?
+                        GROUP BY file_date, check_name, status
+                    ) AS g
+                    JOIN dq_checks AS d ON d.id = g.last_id
+                    WHERE true
+                    ON CONFLICT(file_date, check_name, status) DO UPDATE
+                      SET checks       = checks + excluded.checks,
+                          files        = MAX(files, excluded.files),
+                          first_ts     = MIN(first_ts, excluded.first_ts),
+                          last_ts      = MAX(last_ts, excluded.last_ts),
+                          last_details = excluded.last_details;
+                """, (cutoff,))
+                # Failure deltas are only wanted for recent reruns: drop old key sets, keep signatures
+                conn.execute("UPDATE dq_signature SET failure_keys = NULL"
+                             " WHERE file_date < ? AND failure_keys IS NOT NULL", (cutoff,))
+                return conn.execute("DELETE FROM dq_checks WHERE file_date < ?", (cutoff,)).rowcount
+
+    # --- reads -------------------------------------------------------------------------------------------------
+
+    def get_stage_status(self, file_names=None, file_date: str = None) -> dict:
+        clauses, params = [], []
+        if file_names is not None:
+            # One bound JSON array instead of N placeholders, so any number of names is a single query
+            clauses.append("file_name IN (SELECT value FROM json_each(?))")
+            params.append(json.dumps(list(file_names)))
+        if file_date is not None:
+            clauses.append("file_date = ?")
+            params.append(file_date)
+        where = f" WHERE {' AND '.join(clauses)}" if clauses else ""
+
+        with self.connection() as conn:
+            rows = conn.execute(
+                f"SELECT file_name, generated_at, validated_at, uploaded_at FROM file_metadata{where}", params
+            ).fetchall()
+        return {row['file_name']: {f"{s}_at": row[f"{s}_at"] for s in STAGES} for row in rows}
+
+    def get_dq_signature(self, file_name: str, dataset_type: str, file_date: str):
+        with self.connection() as conn:
+            row = conn.execute("""
+                SELECT signature FROM dq_signature
+                WHERE file_name = ? AND dataset_type = ? AND file_date = ?
+            """, (file_name, dataset_type, file_date)).fetchone()
+        return row["signature"] if row else None
+
+    def get_failure_keys(self, file_name: str, dataset_type: str, file_date: str):
+        with self.connection() as conn:
+            row = conn.execute("""
+                SELECT failure_keys FROM dq_signature
+                WHERE file_name = ? AND dataset_type = ? AND file_date = ?
+            """, (file_name, dataset_type, file_date)).fetchone()
+        return row["failure_keys"] if row else None
+
+    def get_checksums(self, file_names, location: str, file_date: str = None) -> dict:
+        clauses, params = ["location = ?"], [location]
+        if file_names is not None:
+            clauses.append("file_name IN (SELECT value FROM json_each(?))")
+            params.append(json.dumps(list(file_names)))
+        if file_date is not None:
+            clauses.append("file_date = ?")
+            params.append(file_date)
+        with self.connection() as conn:
+            rows = conn.execute(
+                f"SELECT file_name, {', '.join(CHECKSUM_FIELDS)} FROM file_checksums WHERE {' AND '.join(clauses)}",
+                params,
+            ).fetchall()
+        return {row["file_name"]: {k: row[k] for k in CHECKSUM_FIELDS} for row in rows}
+
+    def get_file_metadata(self, file_date: str = None) -> list:
+        with self.connection() as conn:
+            if file_date is None:
+                rows = conn.execute("SELECT * FROM file_metadata ORDER BY file_date DESC, file_name").fetchall()
+            else:
+                rows = conn.execute(
+                    "SELECT * FROM file_metadata WHERE file_date = ? ORDER BY file_name", (file_date,)
+                ).fetchall()
+        return [dict(row) for row in rows]
+
+    def get_dq_checks(self, file_date: str) -> list:
+        with self.connection() as conn:
+            rows = conn.execute(
+                "SELECT file_name, file_date, check_name, status, details, timestamp"
+                " FROM dq_checks WHERE file_date = ? ORDER BY id",
+                (file_date,)
+            ).fetchall()
+            if not rows:
+                # Past retention: the daily roll-up instead
+                rows = conn.execute(
+                    "SELECT files || ' files' AS file_name, file_date, check_name, status,"
+                    " checks || ' checks, last: ' || COALESCE(last_details, '') AS details,"
+                    " last_ts AS timestamp FROM dq_check_summary WHERE file_date = ?",
+                    (file_date,)
+                ).fetchall()
+        return [dict(row) for row in rows]
+
+    def fetch_all(self, sql: str, params=()) -> list:
+        with self.connection() as conn:
+            return [dict(row) for row in conn.execute(sql, params).fetchall()]
+
+    # --- multipart upload progress (synchronous, so a crashed attempt can resume) ------------------------------
+
+    def get_multipart_upload(self, bucket: str, object_name: str):
+        with self.connection() as conn:
+            upload = conn.execute(
+                "SELECT upload_id, sha256, part_size FROM multipart_uploads WHERE bucket = ? AND object_name = ?",
+                (bucket, object_name)
+            ).fetchone()
+            if upload is None:
+                return None
+            parts = conn.execute(
+                "SELECT part_number, etag FROM multipart_parts WHERE upload_id = ?", (upload["upload_id"],)
+            ).fetchall()
+        return {**dict(upload), "parts": {row["part_number"]: row["etag"] for row in parts}}
+
+    def save_multipart_upload(self, bucket: str, object_name: str, upload_id: str, sha256: str, part_size: int):
+        with self.connection() as conn:
+            with conn:
+                conn.execute("""
+                    INSERT INTO multipart_uploads (bucket, object_name, upload_id, sha256, part_size, started_at)
+                    VALUES (?, ?, ?, ?, ?, datetime('now'))
+                    ON CONFLICT(bucket, object_name) DO UPDATE
+                      SET upload_id = excluded.upload_id, sha256 = excluded.sha256,
+                          part_size = excluded.part_size, started_at = excluded.started_at;
+                """, (bucket, object_name, upload_id, sha256, part_size))
+
+    def save_multipart_part(self, upload_id: str, part_number: int, etag: str, size_bytes: int):
+        with self.connection() as conn:
+            with conn:
+                conn.execute("""
+                    INSERT INTO multipart_parts (upload_id, part_number, etag, size_bytes) VALUES (?, ?, ?, ?)
+                    ON CONFLICT(upload_id, part_number) DO UPDATE
+                      SET etag = excluded.etag, size_bytes = excluded.size_bytes;
+                """, (upload_id, part_number, etag, size_bytes))
+
+    def delete_multipart_upload(self, bucket: str, object_name: str):
+        with self.connection() as conn:
+            with conn:
+                conn.execute("""
+                    DELETE FROM multipart_parts WHERE upload_id IN (
+                        SELECT upload_id FROM multipart_uploads WHERE bucket = ? AND object_name = ?)
+                """, (bucket, object_name))
+                conn.execute("DELETE FROM multipart_uploads WHERE bucket = ? AND object_name = ?",
+                             (bucket, object_name))
+
+    def save_compaction(self, object_name: str, dataset_type: str, period: str, sha256: str, size_bytes: int,
+                        files: list):
+        row_count = sum(f[3] or 0 for f in files)
+        with self.connection() as conn:
+            with conn:
+                conn.execute("""
+                    INSERT INTO compacted_objects
+                      (object_name, dataset_type, period, sha256, size_bytes, row_count, compacted_at)
+                    VALUES (?, ?, ?, ?, ?, ?, datetime('now'))
+                    ON CONFLICT(object_name) DO UPDATE
+                      SET sha256 = excluded.sha256, size_bytes = excluded.size_bytes,
+                          row_count = excluded.row_count, compacted_at = excluded.compacted_at;
+                """, (object_name, dataset_type, period, sha256, size_bytes, row_count))
+                conn.execute("DELETE FROM compacted_files WHERE object_name = ?", (object_name,))
+                conn.executemany("""
+                    INSERT INTO compacted_files (file_name, object_name, file_date, sha256, row_count)
+                    VALUES (?, ?, ?, ?, ?)
+                    ON CONFLICT(file_name) DO UPDATE
+                      SET object_name = excluded.object_name, file_date = excluded.file_date,
+                          sha256 = excluded.sha256, row_count = excluded.row_count;
+                """, [(name, object_name, day, sha, rows) for name, day, sha, rows in files])
+
+    def get_compactions(self, file_names) -> dict:
+        with self.connection() as conn:
+            rows = conn.execute("""
+                SELECT f.file_name, f.object_name, f.sha256, f.row_count,
+                       o.sha256 AS object_sha256, o.size_bytes AS object_size_bytes
+                FROM compacted_files f JOIN compacted_objects o ON o.object_name = f.object_name
+                WHERE f.file_name IN (SELECT value FROM json_each(?))
+            """, (json.dumps(list(file_names)),)).fetchall()
+        return {row["file_name"]: {k: row[k] for k in COMPACTION_FIELDS} for row in rows}
@@ -0,0 +1,53 @@
+"""
+Part-by-part multipart uploads on a minio client.
+
+Resumable uploads (upload_to_minio._multipart_put) and streamed objects of unknown size
+(ObjectSink) need to start an upload, send and retry single parts and complete it
+themselves. minio 7 only does that inside put_object / fput_object; the building blocks
+are private methods of Minio. Every use of them goes through this module, which checks
+at import that the installed minio is a release they are known to work with, so an
+upgrade fails here instead of half way through an upload. Keep MINIO_SUPPORTED in step
+with the minio pin in docker/airflow/requirements.txt.
+"""
+import minio
+from minio import Minio
+from minio.datatypes import Part
+
+# [lowest, highest) minio release whose private multipart methods match the calls below
+MINIO_SUPPORTED = ((7, 1), (8, 0))
+_METHODS = ("_create_multipart_upload", "_upload_part", "_complete_multipart_upload", "_abort_multipart_upload")
+
+
+def _check_minio():
+    version = tuple(int(v) for v in minio.__version__.split(".")[:2])
+    low, high = MINIO_SUPPORTED
+    missing = [name for name in _METHODS if not callable(getattr(Minio, name, None))]
+    if not low <= version < high or missing:
+        raise ImportError(
+            f"minio {minio.__version__} is not supported by minio_multipart (needs >={low[0]}.{low[1]},"
+            f"<{high[0]}.{high[1]}; missing {missing or 'nothing'}); update this adapter before the pin"
+        )
+
+
+_check_minio()
+
+
+def create_multipart_upload(client: Minio, bucket: str, object_name: str, headers: dict) -> str:
+    """Start an upload; `headers` carry Content-Type and x-amz-meta-* metadata. Returns its upload id."""
+    return client._create_multipart_upload(bucket, object_name, headers)
+
+
+def upload_part(client: Minio, bucket: str, object_name: str, data: bytes, upload_id: str, part_number: int) -> str:
+    """Send one part (1-based); returns its ETag."""
+    return client._upload_part(bucket, object_name, data, None, upload_id, part_number)
+
+
+def complete_multipart_upload(client: Minio, bucket: str, object_name: str, upload_id: str, etags):
+    """Assemble the object from (part_number, etag) pairs in part order."""
+    parts = [Part(part_number, etag) for part_number, etag in etags]
+    return client._complete_multipart_upload(bucket, object_name, upload_id, parts)
+
+
+def abort_multipart_upload(client: Minio, bucket: str, object_name: str, upload_id: str):
+    """Discard an upload and the parts sent so far."""
+    client._abort_multipart_upload(bucket, object_name, upload_id)
@@ -0,0 +1,207 @@
+"""
+Arrow-native readers for raw and validated files.
+
+Files are memory-mapped and parsed by pyarrow's multithreaded CSV / JSON /
+Parquet readers with explicit per-entity column types, and converted to pandas
+only when a caller needs a DataFrame. Columns not in the entity schema keep the
+types Arrow infers for them.
+"""
+import os
+import csv
+import json
+from pathlib import Path
+import pandas as pd
+import pyarrow as pa
+import pyarrow.csv as pacsv
+import pyarrow.json as pajson
+import pyarrow.parquet as pq
+from formats import entity_format
+
+# Bytes per block for CSV / NDJSON parsing; threads parse blocks in parallel
+READER_BLOCK_SIZE = int(os.getenv('READER_BLOCK_SIZE', str(16 << 20)))
+
+ENTITY_SCHEMAS = {
+    'contacts': pa.schema([
+        ('contact_id', pa.string()), ('first_name', pa.string()), ('last_name', pa.string()),
+        ('email', pa.string()), ('company', pa.string()), ('industry', pa.string()),
+        ('lead_source', pa.string()), ('job_title', pa.string()), ('country', pa.string()),
+        ('opted_in', pa.bool_()), ('signup_date', pa.string()),
+    ]),
+    'form_fills': pa.schema([
+        ('fill_id', pa.string()), ('form_id', pa.string()), ('contact_id', pa.string()),
+        ('campaign_id', pa.string()), ('fill_date', pa.string()), ('referrer_url', pa.string()),
+        ('user_agent', pa.string()), ('estimated_value', pa.float64()),
+    ]),
+    'website_activity': pa.schema([
+        ('session_id', pa.string()), ('contact_id', pa.string()), ('campaign_id', pa.string()),
+        ('page_id', pa.int64()), ('page_url', pa.string()), ('page_title', pa.string()),
+        ('event_date', pa.string()), ('event_type', pa.string()), ('session_duration', pa.float64()),
+        ('pages_viewed', pa.int64()), ('bounce', pa.bool_()), ('referrer_domain', pa.string()),
+    ]),
+    'campaigns': pa.schema([
+        ('campaign_id', pa.string()), ('campaign_name', pa.string()), ('dim_date', pa.string()),
+    ]),
+    'forms': pa.schema([
+        ('form_id', pa.string()), ('form_type', pa.string()), ('dim_date', pa.string()),
+    ]),
+    'pages': pa.schema([
+        ('page_id', pa.int64()), ('page_url', pa.string()), ('page_title', pa.string()),
+        ('dim_date', pa.string()),
+    ]),
+}
+
+# Nullable pandas ints, so a chunk containing nulls keeps the same dtype as one without
+_PANDAS_TYPES = {pa.int64(): pd.Int64Dtype()}
+
+
+def _conform(data, schema: pa.Schema):
+    """Cast the columns named in `schema` to their declared types; leave others as read."""
+    fields = [
+        schema.field(name) if name in schema.names else data.schema.field(name)
+        for name in data.schema.names
+    ]
+    target = pa.schema(fields)
+    return data if data.schema.equals(target) else data.cast(target)
+
+
+def _empty_batch(file_schema: pa.Schema, schema: pa.Schema) -> pa.RecordBatch:
+    return _conform(pa.RecordBatch.from_pylist([], schema=file_schema), schema)
+
+
+def _csv_options(entity: str, columns: list = None):
+    read = pacsv.ReadOptions(use_threads=True, block_size=READER_BLOCK_SIZE)
+    convert = pacsv.ConvertOptions(
+        column_types=ENTITY_SCHEMAS[entity],
+        include_columns=columns or [],
+        strings_can_be_null=True,
+    )
+    return read, convert
+
+
+def ndjson_fields(path: Path) -> list:
+    """Field names of the first NDJSON record (empty for an empty file)."""
+    with open(path, 'rb') as fh:
+        first = fh.readline().strip()
+    return list(json.loads(first)) if first else []
+
+
+def read_columns(path: Path, entity: str) -> list:
+    """
+    Column names without parsing the body: the CSV header line, the Parquet
+    footer schema, or the keys of the first NDJSON record.
+    """
+    fmt = entity_format(entity)
+    if fmt == 'parquet':
+        return pq.read_schema(path, memory_map=True).names
+    if fmt == 'ndjson':
+        return ndjson_fields(path)
+    with open(path, newline='') as fh:
+        return next(csv.reader(fh), [])
+
+
+def _count_lines(path: Path) -> int:
+    """Newline-terminated lines (plus an unterminated last one), counted in raw blocks."""
+    lines, last = 0, b'\n'
+    with open(path, 'rb') as fh:
+        for block in iter(lambda: fh.read(READER_BLOCK_SIZE), b''):
+            lines += block.count(b'\n')
+            last = block[-1:]
+    return lines + (last != b'\n')
+
+
+def count_rows(path: Path, entity: str) -> int:
+    """
+    Row count without parsing the body: the Parquet footer, else a newline count (less the
+    CSV header line). A CSV field with an embedded newline counts as an extra row.
+    """
+    fmt = entity_format(entity)
+    if fmt == 'parquet':
+        return pq.read_metadata(path).num_rows
+    lines = _count_lines(path)
+    return max(lines - 1, 0) if fmt == 'csv' else lines
+
+
+def _json_options(path: Path, entity: str):
+    # Pin the types of the entity's fields that are present, so e.g. ISO date strings
+    # stay strings; absent fields are not added, so missing columns remain detectable.
+    present = set(ndjson_fields(path))
+    explicit = pa.schema([f for f in ENTITY_SCHEMAS[entity] if f.name in present])
+    read = pajson.ReadOptions(use_threads=True, block_size=READER_BLOCK_SIZE)
+    parse = pajson.ParseOptions(explicit_schema=explicit, unexpected_field_behavior='infer')
+    return read, parse
+
+
+def read_table(path: Path, entity: str, columns: list = None, fmt: str = None, filters=None) -> pa.Table:
+    """
+    Read a whole file written in the entity's format (or `fmt`) as an Arrow table. Parquet
+    `filters` (pyarrow DNF, e.g. [('col', '==', v)]) skip row groups by their statistics.
+    """
+    fmt = fmt or entity_format(entity)
+    if fmt == 'parquet':
+        table = pq.read_table(path, columns=columns, memory_map=True, filters=filters)
+    elif fmt == 'ndjson' and not ndjson_fields(path):
+        table = pa.table({})  # empty NDJSON (e.g. no valid rows): no records, no columns
+    else:
+        with pa.memory_map(str(path)) as source:
+            if fmt == 'csv':
+                read, convert = _csv_options(entity, columns)
+                table = pacsv.read_csv(source, read_options=read, convert_options=convert)
+            else:
+                read, parse = _json_options(path, entity)
+                table = pajson.read_json(source, read_options=read, parse_options=parse)
+                if columns:
+                    table = table.select(columns)
+    return _conform(table, ENTITY_SCHEMAS[entity])
+
+
+def read_frame(path: Path, entity: str, columns: list = None, fmt: str = None, filters=None) -> pd.DataFrame:
+    return read_table(path, entity, columns, fmt, filters).to_pandas(types_mapper=_PANDAS_TYPES.get)
+
+
+def iter_batches(path: Path, entity: str, batch_rows: int, fmt: str = None):
+    """
+    Yield a file as Arrow RecordBatches of at most `batch_rows` rows, with bounded memory.
+    `fmt` overrides the entity's configured format (e.g. for a file written under an older one).
+    """
+    fmt = fmt or entity_format(entity)
+    schema = ENTITY_SCHEMAS[entity]
+    if fmt == 'parquet':
+        pf = pq.ParquetFile(path, memory_map=True)
+        if pf.metadata.num_rows == 0:
+            yield _empty_batch(pf.schema_arrow, schema)
+        for batch in pf.iter_batches(batch_size=batch_rows):
+            yield _conform(batch, schema)
+        return
+    if fmt == 'ndjson' and not ndjson_fields(path):
+        # empty NDJSON: one empty batch, like a header-only CSV, instead of a parse error
+        yield _empty_batch(pa.schema([]), schema)
+        return
+
+    with pa.memory_map(str(path)) as source:
+        if fmt == 'csv':
+            read, convert = _csv_options(entity)
+            reader = pacsv.open_csv(source, read_options=read, convert_options=convert)
+        elif hasattr(pajson, 'open_json'):
+            read, parse = _json_options(path, entity)
+            reader = pajson.open_json(source, read_options=read, parse_options=parse)
+        else:
+            # pyarrow without a streaming JSON reader: pandas line chunks
+            with pd.read_json(path, lines=True, chunksize=batch_rows) as chunks:
+                for chunk in chunks:
+                    yield _conform(pa.RecordBatch.from_pandas(chunk, preserve_index=False), schema)
+            return
+        empty = True
+        for block in reader:
+            block = _conform(block, schema)
+            for start in range(0, block.num_rows, batch_rows):
+                empty = False
+                yield block.slice(start, batch_rows)
+        if empty:
+            # header-only file: still report its columns
+            yield _empty_batch(reader.schema, schema)
+
+
+def iter_frames(path: Path, entity: str, chunk_rows: int, fmt: str = None):
+    """iter_batches, converted to pandas one chunk at a time."""
+    for batch in iter_batches(path, entity, chunk_rows, fmt):
+        yield batch.to_pandas(types_mapper=_PANDAS_TYPES.get)
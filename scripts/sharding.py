@@ -0,0 +1,60 @@
+"""
+Helpers for sharded generation: part-file naming, count splitting and
+deterministic per-shard seeds.
+
+A logical file such as ``website_activity_2025-05-25.json`` is written either
+as-is or as a shard set ``website_activity_2025-05-25.part-0000.json``,
+``...part-0001.json``, ... Stage metadata is always tracked on the logical name.
+"""
+import os
+import zlib
+from datetime import date
+from pathlib import Path
+import numpy as np
+
+GENERATION_SHARDS = int(os.getenv('GENERATION_SHARDS', '1'))
+GENERATION_SEED = int(os.getenv('GENERATION_SEED', '0'))
+
+
+def part_file_name(file_name: str, shard: int) -> str:
+    """contacts_2025-05-25.csv -> contacts_2025-05-25.part-0003.csv"""
+    p = Path(file_name)
+    return f"{p.stem}.part-{shard:04d}{p.suffix}"
+
+
+def logical_file_parts(directory: Path, file_name: str) -> list:
+    """
+    Return the on-disk files that make up `file_name` in `directory`:
+    the file itself if present, otherwise its part files in shard order.
+    """
+    whole = directory / file_name
+    if whole.exists():
+        return [whole]
+    p = Path(file_name)
+    return sorted(directory.glob(f"{p.stem}.part-*{p.suffix}"))
+
+
+def all_file_parts(directory: Path, file_name: str) -> list:
+    """
+    Every on-disk file of `file_name` in `directory`: the file itself and any part files,
+    e.g. both left by earlier attempts with different shard counts.
+    """
+    whole = directory / file_name
+    p = Path(file_name)
+    return ([whole] if whole.exists() else []) + sorted(directory.glob(f"{p.stem}.part-*{p.suffix}"))
+
+
+def split_counts(n: int, shards: int) -> list:
+    """Split n rows into `shards` near-equal counts (earlier shards take the remainder)."""
+    base, extra = divmod(n, shards)
+    return [base + (1 if i < extra else 0) for i in range(shards)]
+
+
+def shard_seeds(ds: str, entity: str, shards: int, seed: int = GENERATION_SEED) -> list:
+    """
+    Independent, reproducible SeedSequences for each shard of (ds, entity).
+    The same (ds, seed, shard count) always yields the same streams.
+    """
+    ds_key = date.fromisoformat(ds).toordinal()
+    entity_key = zlib.crc32(entity.encode('utf-8'))
+    return np.random.SeedSequence(entropy=seed, spawn_key=(ds_key, entity_key)).spawn(shards)
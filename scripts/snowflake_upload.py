@@ -2,10 +2,13 @@ import os
 import glob
 import tempfile
 import snowflake.connector
-from typing import Dict
+from typing import Dict, List
 from pathlib import Path
-from upload_to_minio import get_minio_client
+from metadata import file_sha256
+from upload_to_minio import BUCKET_NAME, get_minio_client, manifest_object_name, read_manifest
 from logging_config import get_logger
+from formats import SNOWFLAKE_FILE_FORMATS, entity_extension, entity_format, write_frame
+from readers import read_frame
 
 logger = get_logger(__name__)
 
@@ -13,52 +16,72 @@ logger = get_logger(__name__)
 # --- CONFIGURATION
 # ------------------------------------------------------------------------------
 
-# Map each entity to its Snowflake table, file format, and extension
-ENTITIES: Dict[str,Dict[str,str]] = {
+# Map each entity to its Snowflake table and stage; file format and extension
+# follow the entity's configured output format (see formats.py) and are resolved
+# by entity_config() when a load runs, so a bad OUTPUT_FORMATS fails that task
+# instead of the DAG import.
+#   layout "columns" -> typed raw table, "variant" -> single VARIANT column `data`
+ENTITY_TABLES: Dict[str,Dict[str,str]] = {
     "contacts": {
         "stage_table": "contacts",
         "raw_table":   "RAW.contacts",
-        "file_format": "RAW.csv_fmt",
-        "ext":         ".csv",
         "stage" : "RAW_CONTACTS_STAGE",
+        "layout": "columns",
     },
     "form_fills": {
         "stage_table": "form_fills",
         "raw_table":   "RAW.form_fills",
-        "file_format": "RAW.parquet_fmt",
-        "ext":         ".parquet",
         "stage" : "RAW_FORM_FILLS_STAGE",
+        "layout": "variant",
     },
     "website_activity": {
         "stage_table": "website_activity",
         "raw_table":   "RAW.website_activity",
-        "file_format": "RAW.json_fmt",
-        "ext":         ".json",
         "stage" : "RAW_WEBSITE_ACTIVITY_STAGE",
+        "layout": "variant",
     },
     "campaigns": {
         "stage_table": "campaigns",
         "raw_table":   "RAW.campaigns",
-        "file_format": "RAW.json_fmt",
-        "ext":         ".json",
         "stage" : "RAW_CAMPAIGNS_STAGE",
+        "layout": "variant",
     },
     "forms": {
         "stage_table": "forms",
         "raw_table":   "RAW.forms",
-        "file_format": "RAW.json_fmt",
-        "ext":         ".json",
         "stage" : "RAW_FORMS_STAGE",
+        "layout": "variant",
     },
     "pages": {
         "stage_table": "pages",
         "raw_table":   "RAW.pages",
-        "file_format": "RAW.json_fmt",
-        "ext":         ".json",
         "stage" : "RAW_PAGES_STAGE",
+        "layout": "variant",
     },
 }
 
+
+def entity_config(entity: str) -> Dict[str,str]:
+    """The entity's tables plus its configured format, Snowflake file format and extension."""
+    tables = ENTITY_TABLES[entity]
+    fmt = entity_format(entity)
+    if fmt == "csv" and tables["layout"] == "variant":
+        raise ValueError(f"{entity}: CSV cannot be loaded into VARIANT table {tables['raw_table']}")
+    return {
+        **tables,
+        "format":      fmt,
+        "file_format": SNOWFLAKE_FILE_FORMATS[fmt],
+        "ext":         entity_extension(entity),
+    }
+
+
+# Named file formats referenced by the entity configs; Parquet COMPRESSION = AUTO reads both snappy and zstd
+FILE_FORMAT_DDL = {
+    "RAW.csv_fmt":     "TYPE = CSV SKIP_HEADER = 1 FIELD_OPTIONALLY_ENCLOSED_BY = '\"'",
+    "RAW.json_fmt":    "TYPE = JSON",  # NDJSON: one document per line
+    "RAW.parquet_fmt": "TYPE = PARQUET COMPRESSION = AUTO",
+}
+
 # ------------------------------------------------------------------------------
 # SNOWFLAKE CONNECTION
 # ------------------------------------------------------------------------------
@@ -74,33 +97,79 @@ def get_snowflake_connection(sch='RAW'):
         schema=sch
     )
 
+def ensure_file_formats(cursor):
+    """Create any named file format used by the entities that does not exist yet."""
+    for name in sorted({entity_config(entity)["file_format"] for entity in ENTITY_TABLES}):
+        cursor.execute(f"CREATE FILE FORMAT IF NOT EXISTS {name} {FILE_FORMAT_DDL[name]}")
+
 # ------------------------------------------------------------------------------
 # --- LOADING FUNCTIONS
 # ------------------------------------------------------------------------------
 
-def load_entity_for_date(entity: str, date_str: str):
+def _manifest_files(manifest: dict, entity: str, fmt: str) -> List[dict]:
+    """The entity's manifest entries: files in its configured format, and its rows in compacted objects."""
+    return [
+        f for f in manifest["files"]
+        if f["entity"] == entity and (f["format"] == fmt or f.get("row_filter"))
+    ]
+
+
+def _listed_files(client, entity: str, date_str: str, ext: str) -> List[dict]:
+    """Fallback for dates uploaded before manifests: list the prefix (no checksums to verify)."""
+    prefix = f"valid-data/{entity}/{date_str}/"
+    objs = client.list_objects(BUCKET_NAME, prefix=prefix, recursive=True)
+    return [{"object_name": o.object_name, "sha256": None} for o in objs if o.object_name.lower().endswith(ext)]
+
+
+def _download(client, obj_name: str, sha256: str, local_path: str, date_str: str):
+    client.fget_object(BUCKET_NAME, obj_name, local_path)
+    # the manifest is the batch's snapshot: an object rewritten since is not silently loaded
+    if sha256 and file_sha256(local_path) != sha256:
+        raise ValueError(f"{obj_name} changed since the {date_str} manifest was written")
+    logger.info(f"[⏬] downloaded {obj_name} → {local_path}")
+
+
+def _extract_compacted(client, entry: dict, entity: str, td: str, cache: str, date_str: str):
+    """Write one file's rows out of a compacted object, in the entity's format under the file's own name."""
+    merged = os.path.join(cache, os.path.basename(entry["object_name"]))
+    if not os.path.exists(merged):
+        _download(client, entry["object_name"], entry["sha256"], merged, date_str)
+    row_filter = entry["row_filter"]
+    frame = read_frame(merged, entity, fmt="parquet", filters=[(col, "==", v) for col, v in row_filter.items()])
+    local_path = Path(td) / (Path(entry["file_name"]).stem + entity_extension(entity))
+    write_frame(frame.drop(columns=list(row_filter)), local_path, entity)
+    logger.info(f"[⏬] extracted {len(frame)} rows of {entry['file_name']} from {entry['object_name']}")
+
+
+def load_entity_for_date(entity: str, date_str: str, manifest: dict = None):
     """
-    1) Lists objects under MINIO_BUCKET/MINIO_PREFIX/<entity>/<date_str>/
-    2) Downloads them to a temp folder
+    1) Takes the entity's objects from the date's manifest (manifests/valid-data/<date_str>.json),
+       listing valid-data/<entity>/<date_str>/ only for dates without one
+    2) Downloads them to a temp folder, checking each against the manifest's SHA-256; a file
+       merged into a compacted object is cut back out of it by the manifest's row filter
     3) PUTs that folder/*.ext into @Snowflake_Managed_Stage
     4) COPY INTO <raw_table>
     """
-    MINIO_BUCKET = 'marketing-bucket'
-    meta = ENTITIES[entity]
-    prefix = f"valid-data/{entity}/{date_str}/"
+    meta = entity_config(entity)
     client = get_minio_client()
-    objs = list(client.list_objects(MINIO_BUCKET, prefix=prefix, recursive=True))
-    files = [o.object_name for o in objs if o.object_name.lower().endswith(meta["ext"])]
+    manifest = manifest or read_manifest(client, date_str)
+    if manifest is not None:
+        files = _manifest_files(manifest, entity, meta["format"])
+    else:
+        logger.warning(f"⚠️ No manifest {manifest_object_name(date_str)}; listing the bucket for {entity}")
+        files = _listed_files(client, entity, date_str, meta["ext"])
     if not files:
-        print(f"[WARN] no {meta['ext']} under {prefix}, skipping {entity}")
+        print(f"[WARN] no {meta['ext']} for {entity} on {date_str}, skipping {entity}")
         return
 
-    # download into a temp dir
-    with tempfile.TemporaryDirectory() as td:
-        for obj_name in files:
-            local_path = os.path.join(td, os.path.basename(obj_name))
-            client.fget_object(MINIO_BUCKET, obj_name, local_path)
-            logger.info(f"[⏬] downloaded {obj_name} → {local_path}")
+    # download into a temp dir (compacted objects into a cache next to it, each fetched once)
+    with tempfile.TemporaryDirectory() as td, tempfile.TemporaryDirectory() as cache:
+        for entry in files:
+            if entry.get("row_filter"):
+                _extract_compacted(client, entry, entity, td, cache, date_str)
+            else:
+                local_path = os.path.join(td, os.path.basename(entry["object_name"]))
+                _download(client, entry["object_name"], entry["sha256"], local_path, date_str)
 
         # open SF cursor once per entity
         conn = get_snowflake_connection()
@@ -123,11 +192,18 @@ def load_entity_for_date(entity: str, date_str: str):
                     cursor.execute(put_sql)
                     logger.info(f"[INFO] running: {put_sql}")
 
-            # COPY into raw table
+            # COPY into raw table; typed tables need column matching for self-describing formats
+            ensure_file_formats(cursor)
+            match_by_name = (
+                "MATCH_BY_COLUMN_NAME = CASE_INSENSITIVE"
+                if meta['layout'] == 'columns' and meta['format'] != 'csv' else ""
+            )
             copy_sql = f"""
                 COPY INTO {meta['raw_table']}
                 FROM {stage_ref}
                 FILE_FORMAT = (FORMAT_NAME = '{meta['file_format']}')
+                PATTERN = '.*[.]{meta['ext'].lstrip('.')}'
+                {match_by_name}
                 ON_ERROR = 'CONTINUE'
                 FORCE = FALSE
                 ;
@@ -142,5 +218,10 @@ def load_entity_for_date(entity: str, date_str: str):
             conn.close()
 
 def load_to_snowflake(ds: str, **kwargs):
-    for entity in ENTITIES:
-        load_entity_for_date(entity, ds)
\ No newline at end of file
+    # every entity's format is checked before anything is loaded
+    for entity in ENTITY_TABLES:
+        entity_config(entity)
+    # one manifest read for every entity of the batch
+    manifest = read_manifest(get_minio_client(), ds)
+    for entity in ENTITY_TABLES:
+        load_entity_for_date(entity, ds, manifest)
\ No newline at end of file
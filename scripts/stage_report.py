@@ -0,0 +1,215 @@
+"""
+Stage latency / throughput report over file_metadata and dq_checks.
+
+For each entity and day in a trailing window ending at `ds`:
+  validation --> generated_at -> validated_at
+  upload     --> validated_at -> uploaded_at
+  end_to_end --> generated_at -> uploaded_at
+with rows/sec (row_count over the stage lag), p50/p95 per entity and stage over
+the window, the slowest files, and DQ check counts per day. Stage columns are
+named <stage>_<metric>, e.g. validation_p95_s.
+
+Everything is aggregated in SQL (GROUP BY plus window functions), so the cost is
+one indexed range scan of the window however long the history gets. Results are
+written as REPORT_DIR/stage_report_<ds>.json and a static .html page.
+"""
+import os
+import json
+import html
+import sqlite3
+from datetime import datetime, timedelta
+from pathlib import Path
+from metadata import get_backend
+from logging_config import get_logger
+
+logger = get_logger(__name__)
+
+REPORT_DIR = Path(os.getenv("REPORT_DIR", "/opt/airflow/data/reports"))
+REPORT_WINDOW_DAYS = int(os.getenv("REPORT_WINDOW_DAYS", "30"))
+REPORT_SLOWEST_FILES = int(os.getenv("REPORT_SLOWEST_FILES", "10"))
+
+# Placeholder, "seconds between two timestamps" and CTE materialization per backend dialect.
+# Materializing computes each lag once instead of once per aggregate that references it.
+DIALECTS = {
+    "sqlite": {
+        "p": "?",
+        "seconds": "(julianday({end}) - julianday({start})) * 86400.0",
+        "materialized": "MATERIALIZED" if sqlite3.sqlite_version_info >= (3, 35, 0) else "",
+    },
+    "postgres": {
+        "p": "%s",
+        "seconds": "CAST(EXTRACT(EPOCH FROM ({end} - {start})) AS DOUBLE PRECISION)",
+        "materialized": "MATERIALIZED",
+    },
+}
+
+# ------------------------------------------------------------------------------------------------------------------
+# SQL: one row per file in the window with a lag per stage, aggregated without unpivoting
+# ------------------------------------------------------------------------------------------------------------------
+
+# stage --> (from, to) timestamp columns of file_metadata
+LAG_STAGES = {
+    "validation": ("generated_at", "validated_at"),
+    "upload":     ("validated_at", "uploaded_at"),
+    "end_to_end": ("generated_at", "uploaded_at"),
+}
+
+_LAGS = """
+    WITH lags AS {materialized} (
+        SELECT file_name, dataset_type, file_date, row_count, {lag_columns}
+        FROM file_metadata
+        WHERE file_date BETWEEN {p} AND {p}
+    )
+"""
+
+
+def _per_stage(template: str) -> str:
+    """Repeat a column template for each stage, e.g. 'AVG({s}_s) AS {s}_avg_s'."""
+    return ", ".join(template.format(s=stage) for stage in LAG_STAGES)
+
+
+# rows/sec only over files whose row count is known
+_ROWS_PER_S = (
+    "CAST(SUM(CASE WHEN {s}_s IS NOT NULL THEN row_count END) AS DOUBLE PRECISION)"
+    " / NULLIF(SUM(CASE WHEN row_count IS NOT NULL THEN {s}_s END), 0) AS {s}_rows_per_s"
+)
+
+_DAILY = _LAGS + f"""
+    SELECT dataset_type, file_date,
+           COUNT(*)                       AS files,
+           CAST(SUM(row_count) AS BIGINT) AS row_count,
+           {_per_stage("AVG({s}_s) AS {s}_avg_s")},
+           {_per_stage("MAX({s}_s) AS {s}_max_s")},
+           {_per_stage(_ROWS_PER_S)}
+    FROM lags
+    GROUP BY dataset_type, file_date
+    ORDER BY file_date DESC, dataset_type
+"""
+
+# Nearest-rank percentiles: the smallest lag whose rank (NULLs last) reaches p * n
+_PERCENTILE = "MIN(CASE WHEN {s}_rn >= {q} * {s}_n THEN {s}_s END) AS {s}_p{pct}_s"
+
+_PERCENTILES = _LAGS + f"""
+    , ranked AS (
+        SELECT dataset_type, row_count,
+               {_per_stage("{s}_s")},
+               {_per_stage("ROW_NUMBER() OVER (PARTITION BY dataset_type ORDER BY {s}_s NULLS LAST) AS {s}_rn")},
+               {_per_stage("COUNT({s}_s) OVER (PARTITION BY dataset_type) AS {s}_n")}
+        FROM lags
+    )
+    SELECT dataset_type,
+           {_per_stage("COUNT({s}_s) AS {s}_files")},
+           {_per_stage(_PERCENTILE.replace("{q}", "0.50").replace("{pct}", "50"))},
+           {_per_stage(_PERCENTILE.replace("{q}", "0.95").replace("{pct}", "95"))},
+           {_per_stage("MAX({s}_s) AS {s}_max_s")},
+           {_per_stage(_ROWS_PER_S)}
+    FROM ranked
+    GROUP BY dataset_type
+    ORDER BY dataset_type
+"""
+
+_SLOWEST = _LAGS + f"""
+    SELECT file_name, dataset_type, file_date, row_count,
+           {_per_stage("{s}_s")}
+    FROM lags
+    WHERE end_to_end_s IS NOT NULL
+    ORDER BY end_to_end_s DESC
+    LIMIT {{p}}
+"""
+
+# Raw checks inside retention, the daily roll-up past it
+_DQ_DAILY = """
+    SELECT file_date, status, CAST(SUM(checks) AS BIGINT) AS checks
+    FROM (
+        SELECT file_date, status, COUNT(*) AS checks
+        FROM dq_checks WHERE file_date BETWEEN {p} AND {p}
+        GROUP BY file_date, status
+        UNION ALL
+        SELECT file_date, status, SUM(checks)
+        FROM dq_check_summary WHERE file_date BETWEEN {p} AND {p}
+        GROUP BY file_date, status
+    ) AS c
+    GROUP BY file_date, status
+    ORDER BY file_date DESC, status
+"""
+
+
+def _render(template: str, dialect: str) -> str:
+    d = DIALECTS[dialect]
+    lag_columns = ", ".join(
+        d["seconds"].format(start=start, end=end) + f" AS {stage}_s" for stage, (start, end) in LAG_STAGES.items()
+    )
+    return template.format(p=d["p"], lag_columns=lag_columns, materialized=d["materialized"])
+
+# ------------------------------------------------------------------------------------------------------------------
+# Report
+# ------------------------------------------------------------------------------------------------------------------
+
+def build_stage_report(ds: str, window_days: int = REPORT_WINDOW_DAYS, slowest: int = REPORT_SLOWEST_FILES) -> dict:
+    """Compute the report for the `window_days` days ending at `ds` (inclusive)."""
+    backend = get_backend()
+    start = (datetime.strptime(ds, "%Y-%m-%d").date() - timedelta(days=window_days - 1)).isoformat()
+    window = (start, ds)
+
+    def query(template, params):
+        return backend.fetch_all(_render(template, backend.dialect), params)
+
+    return {
+        "ds": ds,
+        "window": {"start": start, "end": ds, "days": window_days},
+        "generated_at": datetime.utcnow().isoformat(),
+        "percentiles": query(_PERCENTILES, window),
+        "daily": query(_DAILY, window),
+        "slowest_files": query(_SLOWEST, window + (slowest,)),
+        "dq_daily": query(_DQ_DAILY, window + window),
+    }
+
+
+def _html_table(title: str, rows: list) -> str:
+    if not rows:
+        return f"<h2>{html.escape(title)}</h2><p>(no data)</p>"
+
+    def cell(v):
+        if isinstance(v, float):
+            v = f"{v:,.2f}"
+        return f"<td>{html.escape('' if v is None else str(v))}</td>"
+
+    head = "".join(f"<th>{html.escape(k)}</th>" for k in rows[0])
+    body = "".join(f"<tr>{''.join(cell(v) for v in row.values())}</tr>" for row in rows)
+    return f"<h2>{html.escape(title)}</h2><table><tr>{head}</tr>{body}</table>"
+
+
+def render_html(report: dict) -> str:
+    w = report["window"]
+    sections = [
+        _html_table("Stage lag percentiles (seconds)", report["percentiles"]),
+        _html_table("Slowest files (end to end)", report["slowest_files"]),
+        _html_table("Per entity, per day", report["daily"]),
+        _html_table("DQ checks per day", report["dq_daily"]),
+    ]
+    return (
+        "<!DOCTYPE html><html><head><meta charset='utf-8'>"
+        f"<title>Stage report {html.escape(report['ds'])}</title>"
+        "<style>body{font-family:sans-serif;margin:2em}table{border-collapse:collapse;margin-bottom:2em}"
+        "th,td{border:1px solid #ccc;padding:4px 8px;text-align:right}th{background:#f0f0f0}"
+        "td:first-child,th:first-child{text-align:left}</style></head><body>"
+        f"<h1>Stage report {html.escape(report['ds'])}</h1>"
+        f"<p>Window {html.escape(w['start'])} .. {html.escape(w['end'])} ({w['days']} days),"
+        f" generated {html.escape(report['generated_at'])} UTC</p>"
+        + "".join(sections)
+        + "</body></html>"
+    )
+
+
+def write_stage_report(ds: str, out_dir: Path = None, **kwargs) -> Path:
+    """Build the report for `ds` and write stage_report_<ds>.json / .html; returns the JSON path."""
+    out_dir = Path(out_dir or REPORT_DIR)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    report = build_stage_report(ds)
+
+    json_path = out_dir / f"stage_report_{ds}.json"
+    json_path.write_text(json.dumps(report, indent=2, default=str))
+    (out_dir / f"stage_report_{ds}.html").write_text(render_html(report))
+
+    logger.info(f"📊 Stage report for {ds} written to {json_path} ({len(report['daily'])} entity-day rows)")
+    return json_path
@@ -1,12 +1,39 @@
 from minio import Minio
 from minio.error import S3Error
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime
 from pathlib import Path
+import urllib3
+from urllib3.connection import HTTPConnection
+import certifi
 import shutil
+import hashlib
+import io
+import json
 import os
+import random
 import re
+import socket
+import threading
+import time
+import weakref
+import math
 import mimetypes
-from metadata import log_stage, check_stage_complete
+from metadata import (
+    file_sha256,
+    flushes_metadata,
+    forget_multipart_upload,
+    get_checksums,
+    get_compactions,
+    get_multipart_upload,
+    log_checksum,
+    log_stage,
+    record_multipart_part,
+    record_multipart_upload,
+)
 from logging_config import get_logger
+from formats import ENTITIES, EXTENSIONS
+import minio_multipart
 
 logger = get_logger(__name__)
 
@@ -15,38 +42,298 @@ UPLOAD_DIR = Path("/opt/airflow/data/uploaded_data")
 QUARANTINE_DIR = Path("/opt/airflow/data/quarantine_data")
 BUCKET_NAME = "marketing-bucket"
 
-def get_minio_client():
-    return Minio(
-        endpoint="minio:9000",
-        access_key="minioadmin",
-        secret_key="minioadmin",
-        secure=False
+# Upload engine: files in flight at once, and retries per file with exponential backoff
+UPLOAD_CONCURRENCY = int(os.getenv("UPLOAD_CONCURRENCY", "8"))
+UPLOAD_RETRIES = int(os.getenv("UPLOAD_RETRIES", "3"))
+UPLOAD_RETRY_BACKOFF_S = float(os.getenv("UPLOAD_RETRY_BACKOFF_S", "1.0"))
+# S3 error codes worth retrying; anything else (AccessDenied, NoSuchBucket, ...) fails at once
+RETRYABLE_S3_CODES = {"InternalError", "RequestTimeout", "ServiceUnavailable", "SlowDown", "RequestTimeTooSkewed"}
+
+# Large files: files from MULTIPART_THRESHOLD_MB up go out as MULTIPART_PART_SIZE_MB parts (S3 minimum 5 MB),
+# MULTIPART_CONCURRENCY per file in parallel, with each acknowledged part recorded so a retry resumes.
+# Memory in flight is up to UPLOAD_CONCURRENCY x MULTIPART_CONCURRENCY part buffers.
+MULTIPART_THRESHOLD_MB = float(os.getenv("MULTIPART_THRESHOLD_MB", "64"))
+MULTIPART_PART_SIZE_MB = float(os.getenv("MULTIPART_PART_SIZE_MB", "16"))
+MULTIPART_CONCURRENCY = int(os.getenv("MULTIPART_CONCURRENCY", "4"))
+MAX_PARTS = 10000  # S3 limit per upload; the part size grows to stay under it
+# Streamed objects (ObjectSink) cannot size parts up front: MULTIPART_PART_SIZE_MB x MAX_PARTS at most, and up to
+# MULTIPART_CONCURRENCY + 1 part buffers in memory per open stream
+
+# Shared client: endpoint / credentials, and its urllib3 pool (one keep-alive connection per upload / part
+# thread plus headroom for the caller's own list / stat calls), timeouts and HTTP-level retries on 5xx
+MINIO_ENDPOINT = os.getenv("MINIO_ENDPOINT", "minio:9000")
+MINIO_ACCESS_KEY = os.getenv("MINIO_ACCESS_KEY", "minioadmin")
+MINIO_SECRET_KEY = os.getenv("MINIO_SECRET_KEY", "minioadmin")
+MINIO_SECURE = os.getenv("MINIO_SECURE", "false").lower() in ("1", "true", "yes")
+MINIO_REGION = os.getenv("MINIO_REGION") or None  # set to skip the per-bucket location lookup
+MINIO_POOL_SIZE = int(os.getenv("MINIO_POOL_SIZE", str(UPLOAD_CONCURRENCY * MULTIPART_CONCURRENCY + 2)))
+MINIO_CONNECT_TIMEOUT_S = float(os.getenv("MINIO_CONNECT_TIMEOUT_S", "10"))
+MINIO_READ_TIMEOUT_S = float(os.getenv("MINIO_READ_TIMEOUT_S", "300"))
+MINIO_HTTP_RETRIES = int(os.getenv("MINIO_HTTP_RETRIES", "5"))
+MINIO_HTTP_BACKOFF_S = float(os.getenv("MINIO_HTTP_BACKOFF_S", "0.2"))
+
+# <entity>_<ds>[.part-NNNN].<ext> for every entity and configured output extension
+OBJECT_NAME_RE = re.compile(
+    r"(" + "|".join(ENTITIES) + r")_(\d{4}-\d{2}-\d{2})(?:\.part-\d{4})?"
+    r"(?:" + "|".join(re.escape(ext) for ext in sorted(set(EXTENSIONS.values()))) + r")$"
+)
+# Object metadata key (x-amz-meta-sha256) holding the content hash, and the checksum location per prefix
+CHECKSUM_METADATA = "sha256"
+PREFIX_LOCATIONS = {"valid-data": "valid", "quarantine-data": "quarantine"}
+CONTENT_TYPES = {'.csv': 'text/csv', '.json': 'application/x-ndjson', '.parquet': 'application/vnd.apache.parquet'}
+# Per-ds manifest of everything uploaded to valid-data, read by the Snowflake loader instead of a listing
+MANIFEST_PREFIX = "manifests/valid-data"
+MANIFEST_VERSION = 1
+# Column of a compacted object (compact_lake.py) naming the valid file each row came from
+SOURCE_COLUMN = "_source_file"
+
+# ------------------------------------------------------------------------------------------------------------------
+# Shared client
+# ------------------------------------------------------------------------------------------------------------------
+
+_client = None
+_client_pid = None
+_client_lock = threading.Lock()
+_known_buckets = weakref.WeakKeyDictionary()  # client -> buckets known to exist
+
+
+def _http_pool() -> urllib3.PoolManager:
+    return urllib3.PoolManager(
+        maxsize=MINIO_POOL_SIZE,
+        timeout=urllib3.Timeout(connect=MINIO_CONNECT_TIMEOUT_S, read=MINIO_READ_TIMEOUT_S),
+        retries=urllib3.Retry(
+            total=MINIO_HTTP_RETRIES,
+            backoff_factor=MINIO_HTTP_BACKOFF_S,
+            status_forcelist=[500, 502, 503, 504],
+        ),
+        # TCP keep-alive so idle pooled connections are not silently dropped between files / tasks
+        socket_options=HTTPConnection.default_socket_options + [(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)],
+        cert_reqs="CERT_REQUIRED",
+        ca_certs=os.environ.get("SSL_CERT_FILE") or certifi.where(),
     )
 
+
+def get_minio_client() -> Minio:
+    """The process-wide MinIO client (created on first use, and again after a fork)."""
+    global _client, _client_pid
+    with _client_lock:
+        if _client is None or _client_pid != os.getpid():
+            _client = Minio(
+                endpoint=MINIO_ENDPOINT,
+                access_key=MINIO_ACCESS_KEY,
+                secret_key=MINIO_SECRET_KEY,
+                secure=MINIO_SECURE,
+                region=MINIO_REGION,
+                http_client=_http_pool(),
+            )
+            _client_pid = os.getpid()
+            logger.info(f"🔌 MinIO client for {MINIO_ENDPOINT} (pool {MINIO_POOL_SIZE})")
+        return _client
+
+
+def set_minio_client(client: Minio) -> Minio:
+    """Use `client` for this process (e.g. another endpoint); returns the previous one."""
+    global _client, _client_pid
+    with _client_lock:
+        previous, _client, _client_pid = _client, client, os.getpid()
+    return previous
+
+
 def _ensure_bucket(client, bucket_name: str):
+    """Create the bucket if needed; checked once per client."""
+    with _client_lock:
+        if bucket_name in _known_buckets.get(client, ()):
+            return
     if not client.bucket_exists(bucket_name):
         client.make_bucket(bucket_name)
         logger.info(f"✅ Created bucket: {bucket_name}")
     else:
         logger.info(f"ℹ️ Bucket '{bucket_name}' already exists")
+    with _client_lock:
+        _known_buckets.setdefault(client, set()).add(bucket_name)
+
+# ------------------------------------------------------------------------------------------------------------------
+# Uploads
+# ------------------------------------------------------------------------------------------------------------------
 
 def infer_object_path(filename: str):
     logger.debug(f"🔍 Inspecting file name for object path: '{filename}'")
-    match = re.match(r"(contacts|form_fills|website_activity|campaigns|forms|pages)_(\d{4}-\d{2}-\d{2})\..+", filename)
+    match = OBJECT_NAME_RE.match(filename)
     if not match:
         raise ValueError(f"Invalid file name format: {filename}")
     file_type, ds = match.groups()
     return file_type, ds
 
-def upload_file_to_minio(client, file_path: Path, bucket: str, object_name: str):
-    content_type = mimetypes.guess_type(file_path.name)[0] or 'application/octet-stream'
-    client.fput_object(
+def bucket_object_name(prefix: str, filename: str) -> str:
+    """<prefix>/<entity>/<ds>/<filename>, the key a validated or quarantined file is stored under."""
+    file_type, ds = infer_object_path(filename)
+    return f"{prefix}/{file_type}/{ds}/{filename}"
+
+
+def _content_type(filename: str) -> str:
+    return (
+        CONTENT_TYPES.get(Path(filename).suffix)
+        or mimetypes.guess_type(filename)[0]
+        or 'application/octet-stream'
+    )
+
+def _is_retryable(err: Exception) -> bool:
+    if isinstance(err, S3Error):
+        return err.code in RETRYABLE_S3_CODES
+    # dropped / refused connections and timeouts; a missing local file will not reappear
+    return isinstance(err, (urllib3.exceptions.HTTPError, ConnectionError, TimeoutError))
+
+
+def with_retry(what: str, fn, *args, retries: int = None, backoff_s: float = None, **kwargs):
+    """fn(*args, **kwargs), retried on transient errors with exponential backoff and jitter."""
+    retries = UPLOAD_RETRIES if retries is None else retries
+    backoff_s = UPLOAD_RETRY_BACKOFF_S if backoff_s is None else backoff_s
+    for attempt in range(retries + 1):
+        try:
+            return fn(*args, **kwargs)
+        except Exception as e:
+            if attempt == retries or not _is_retryable(e):
+                raise
+            delay = backoff_s * 2 ** attempt * random.uniform(0.5, 1.0)
+            logger.warning(f"🔁 {what} failed (attempt {attempt + 1}/{retries + 1}): {e}; retrying in {delay:.1f}s")
+            time.sleep(delay)
+
+
+def _put_with_retry(client, file_path: Path, bucket: str, object_name: str, content_type: str, sha256: str):
+    """fput_object with the content hash as object metadata, retried on transient errors."""
+    return with_retry(
+        f"Upload of {file_path.name}", client.fput_object,
         bucket_name=bucket,
         object_name=object_name,
         file_path=str(file_path),
         content_type=content_type,
+        metadata={CHECKSUM_METADATA: sha256},
     )
 
+
+def mb_to_bytes(value: float) -> int:
+    """Size settings are given in MB."""
+    return int(value * 1024 * 1024)
+
+
+def _part_size(size: int) -> int:
+    return max(mb_to_bytes(MULTIPART_PART_SIZE_MB), math.ceil(size / MAX_PARTS))
+
+
+def _read_part(file_path: Path, part_size: int, part_number: int) -> bytes:
+    with open(file_path, 'rb') as f:
+        f.seek((part_number - 1) * part_size)
+        return f.read(part_size)
+
+
+def _start_multipart(client, bucket: str, object_name: str, content_type: str, sha256: str, part_size: int) -> str:
+    headers = {"Content-Type": content_type, f"x-amz-meta-{CHECKSUM_METADATA}": sha256}
+    upload_id = with_retry(f"Start of multipart upload {object_name}", minio_multipart.create_multipart_upload,
+                           client, bucket, object_name, headers)
+    record_multipart_upload(bucket, object_name, upload_id, sha256, part_size)
+    return upload_id
+
+
+def _abandon_multipart(client, bucket: str, object_name: str, upload_id: str):
+    """Abort an upload on the server (best effort: it may already be gone) and forget it."""
+    try:
+        minio_multipart.abort_multipart_upload(client, bucket, object_name, upload_id)
+    except Exception as e:
+        logger.warning(f"⚠️ Could not abort multipart upload {upload_id} of {object_name}: {e}")
+    forget_multipart_upload(bucket, object_name)
+
+
+def _multipart_put(client, file_path: Path, bucket: str, object_name: str, content_type: str, sha256: str,
+                   resume: bool = True):
+    """
+    Upload a large file in parallel parts. The upload id and each acknowledged part's ETag are
+    recorded as they happen, so a retried attempt for the same content sends only the missing
+    parts; an upload recorded for other content or another part size is aborted first.
+    """
+    size = file_path.stat().st_size
+    part_size = _part_size(size)
+    n_parts = max(1, math.ceil(size / part_size))
+
+    state = get_multipart_upload(bucket, object_name) if resume else None
+    if state and (state["sha256"] != sha256 or state["part_size"] != part_size):
+        logger.info(f"🧹 Discarding multipart upload {state['upload_id']} of {object_name}: content changed")
+        _abandon_multipart(client, bucket, object_name, state["upload_id"])
+        state = None
+    if state:
+        upload_id, etags = state["upload_id"], dict(state["parts"])
+        logger.info(f"⏯️ Resuming {object_name}: {len(etags)}/{n_parts} parts already uploaded")
+    else:
+        upload_id, etags = _start_multipart(client, bucket, object_name, content_type, sha256, part_size), {}
+
+    def send(part_number: int):
+        data = _read_part(file_path, part_size, part_number)
+        etag = with_retry(f"Part {part_number}/{n_parts} of {file_path.name}", minio_multipart.upload_part,
+                          client, bucket, object_name, data, upload_id, part_number)
+        record_multipart_part(upload_id, part_number, etag, len(data))
+        return part_number, etag
+
+    missing = [n for n in range(1, n_parts + 1) if n not in etags]
+    try:
+        with ThreadPoolExecutor(max_workers=max(1, MULTIPART_CONCURRENCY), thread_name_prefix="minio-part") as pool:
+            futures = [pool.submit(send, n) for n in missing]
+            try:
+                for future in as_completed(futures):
+                    part_number, etag = future.result()
+                    etags[part_number] = etag
+            except Exception:
+                # parts already acknowledged stay recorded for the next attempt
+                pool.shutdown(cancel_futures=True)
+                raise
+        result = with_retry(f"Completion of {object_name}", minio_multipart.complete_multipart_upload,
+                            client, bucket, object_name, upload_id, sorted(etags.items()))
+    except S3Error as e:
+        if not (state and e.code in ("NoSuchUpload", "InvalidPart")):
+            raise
+        # the server no longer has the recorded upload (expired / aborted): start over once
+        logger.warning(f"⚠️ Recorded multipart upload of {object_name} is gone ({e.code}); restarting")
+        forget_multipart_upload(bucket, object_name)
+        return _multipart_put(client, file_path, bucket, object_name, content_type, sha256, resume=False)
+    forget_multipart_upload(bucket, object_name)
+    logger.info(f"🧩 {object_name}: {n_parts} parts, {len(missing)} sent this attempt")
+    return result
+
+
+def _stored_sha256(client, bucket: str, object_name: str):
+    """
+    Content hash of the object (one HEAD request), or None if there is no such object. Objects
+    streamed as multipart uploads carry no hash (it is only known once the last part is sent):
+    for those, the hash recorded as uploaded for the object's file in file_checksums is used.
+    """
+    try:
+        stat = with_retry(f"Stat of {object_name}", client.stat_object, bucket, object_name)
+    except S3Error as e:
+        if e.code in ("NoSuchKey", "NoSuchObject", "ResourceNotFound"):
+            return None
+        raise
+    sha256 = (stat.metadata or {}).get(f"x-amz-meta-{CHECKSUM_METADATA}")
+    if sha256 is None and object_name.split('/')[0] in PREFIX_LOCATIONS:
+        file_name = object_name.rsplit('/', 1)[-1]
+        rec = get_checksums([file_name], PREFIX_LOCATIONS[object_name.split('/')[0]]).get(file_name)
+        sha256 = rec["uploaded_sha256"] if rec else None
+    return sha256
+
+
+def upload_file_to_minio(client, file_path: Path, bucket: str, object_name: str, sha256: str = None) -> bool:
+    """
+    Upload `file_path` unless the object already holds identical content (checked by a HEAD on
+    its stored hash), then move valid files to UPLOAD_DIR and record the upload. `sha256` is the
+    hash recorded at validation, computed here when not given. Returns whether bytes were sent.
+    """
+    sha256 = sha256 or file_sha256(file_path)
+    size = file_path.stat().st_size
+    transferred = _stored_sha256(client, bucket, object_name) != sha256
+    if transferred:
+        content_type = _content_type(file_path.name)
+        if size >= mb_to_bytes(MULTIPART_THRESHOLD_MB):
+            _multipart_put(client, file_path, bucket, object_name, content_type, sha256)
+        else:
+            _put_with_retry(client, file_path, bucket, object_name, content_type, sha256)
+
     file_validity = object_name.split('/')[0]
     file_type = object_name.split('/')[1]
     file_date = object_name.split('/')[2]
@@ -57,56 +344,280 @@ def upload_file_to_minio(client, file_path: Path, bucket: str, object_name: str)
         UPLOAD_DIR.mkdir(parents=True, exist_ok=True)
         shutil.move(str(file_path), dest)
     
+    # Only after the object is confirmed written (or found identical)
     log_stage(file_path.name, file_type, file_date, 'uploaded')
-    logger.info(f"📤 Uploaded {file_path.name} to {object_name}")
+    log_checksum(file_path.name, PREFIX_LOCATIONS[file_validity], file_type, file_date, sha256, size, uploaded=True)
+    if transferred:
+        logger.info(f"📤 Uploaded {file_path.name} to {object_name}")
+    else:
+        logger.info(f"♻️ {object_name} already holds identical content; skipped transfer of {file_path.name}")
+    return transferred
 
-def upload_all_validated_files(**kwargs):
-    client = get_minio_client()
-    _ensure_bucket(client, BUCKET_NAME)
 
-    for file in VALID_DIR.glob("*"):
-        if not file.is_file():
-            continue
-        if check_stage_complete(file.name, "uploaded"):
-            logger.info(f"⏩ Already uploaded: {file.name}")
+def _upload_one(client, file: Path, prefix: str, sha256: str = None) -> bool:
+    return upload_file_to_minio(client, file, bucket=BUCKET_NAME, object_name=bucket_object_name(prefix, file.name),
+                                sha256=sha256)
+
+
+def upload_directory(client, directory: Path, prefix: str, concurrency: int = UPLOAD_CONCURRENCY) -> int:
+    """
+    Upload every file in `directory` under `prefix`/<entity>/<ds>/ with a bounded thread pool.
+    Files whose recorded content hash was already uploaded are skipped without a request;
+    the rest are hashed (unless validation recorded it) and sent only if the object's stored
+    hash differs. A failing file does not stop the others; if any failed, raise once all
+    are done, listing them (the Airflow retry then uploads just those).
+    Returns the number of files uploaded or found identical in the bucket.
+    """
+    files = [f for f in directory.glob("*") if f.is_file()]
+    recorded = get_checksums([f.name for f in files], PREFIX_LOCATIONS[prefix])
+
+    pending = {}  # file -> hash recorded for its current content, or None to compute
+    for f in files:
+        rec = recorded.get(f.name)
+        # the size guards against a file rewritten behind the pipeline's back
+        sha256 = rec['sha256'] if rec and rec['size_bytes'] == f.stat().st_size else None
+        if sha256 and rec['uploaded_sha256'] == sha256:
+            logger.info(f"⏩ Already uploaded, unchanged ({prefix}): {f.name}")
+        else:
+            pending[f] = sha256
+
+    failures, transferred = {}, 0
+    with ThreadPoolExecutor(max_workers=max(1, concurrency), thread_name_prefix="minio-upload") as pool:
+        futures = {pool.submit(_upload_one, client, f, prefix, sha256): f for f, sha256 in pending.items()}
+        for future in as_completed(futures):
+            file = futures[future]
+            try:
+                transferred += future.result()
+            except Exception as e:
+                failures[file.name] = e
+                logger.error(f"❌ Upload failed for {file.name}: {e}", exc_info=True)
+
+    done = len(pending) - len(failures)
+    logger.info(f"📦 {prefix}: {done}/{len(pending)} files uploaded ({transferred} transferred,"
+                f" {done - transferred} identical in bucket; {len(files) - len(pending)} unchanged,"
+                f" concurrency {concurrency})")
+    if failures:
+        raise RuntimeError(f"{len(failures)} of {len(pending)} uploads to {prefix} failed: {sorted(failures)}")
+    return len(pending)
+
+
+# ------------------------------------------------------------------------------------------------------------------
+# Manifests: one object per ds listing the valid-data objects of that day's batch
+# ------------------------------------------------------------------------------------------------------------------
+
+def manifest_object_name(ds: str) -> str:
+    return f"{MANIFEST_PREFIX}/{ds}.json"
+
+
+def build_manifest(ds: str) -> dict:
+    """
+    The valid files of `ds` whose validated content is in the bucket, from the metadata DB (by-date
+    queries, no listing): file and object name, entity, format, size, SHA-256 and row count of each.
+    A file merged into a compacted object points at that object (its size and hash), with a
+    `row_filter` selecting the file's rows.
+    """
+    formats_by_ext = {ext: fmt for fmt, ext in EXTENSIONS.items()}
+    recorded = get_checksums(None, "valid", file_date=ds)
+    compacted = get_compactions(recorded)
+    files = []
+    for name, rec in sorted(recorded.items()):
+        if rec["uploaded_sha256"] != rec["sha256"]:
+            logger.warning(f"⚠️ {name} is not in the bucket with its validated content; left out of the manifest")
             continue
+        entity, _ = infer_object_path(name)
+        entry = {
+            "file_name": name,
+            "object_name": bucket_object_name("valid-data", name),
+            "entity": entity,
+            "format": formats_by_ext[Path(name).suffix],
+            "size_bytes": rec["size_bytes"],
+            "sha256": rec["sha256"],
+            "row_count": rec["row_count"],
+        }
+        comp = compacted.get(name)
+        if comp and comp["sha256"] == rec["sha256"]:
+            # merged, and not re-uploaded with other content since
+            entry.update(object_name=comp["object_name"], format="parquet", size_bytes=comp["object_size_bytes"],
+                         sha256=comp["object_sha256"], row_count=comp["row_count"], row_filter={SOURCE_COLUMN: name})
+        files.append(entry)
+    return {"version": MANIFEST_VERSION, "ds": ds, "bucket": BUCKET_NAME,
+            "generated_at": datetime.utcnow().isoformat(), "files": files}
+
+
+def write_manifest(client, ds: str) -> dict:
+    """Build the manifest of `ds` and replace its object in one PUT, so readers see the old or the new one."""
+    manifest = build_manifest(ds)
+    data = json.dumps(manifest, indent=1).encode()
+    with_retry(f"Upload of the {ds} manifest", client.put_object,
+                BUCKET_NAME, manifest_object_name(ds), io.BytesIO(data), len(data), content_type="application/json")
+    logger.info(f"🧾 Manifest {manifest_object_name(ds)}: {len(manifest['files'])} files")
+    return manifest
+
+
+def read_manifest(client, ds: str):
+    """The manifest of `ds`, or None if none was written (e.g. a date uploaded before manifests)."""
+    try:
+        response = with_retry(f"Download of the {ds} manifest", client.get_object,
+                               BUCKET_NAME, manifest_object_name(ds))
+    except S3Error as e:
+        if e.code in ("NoSuchKey", "NoSuchObject", "ResourceNotFound"):
+            return None
+        raise
+    try:
+        return json.loads(response.read())
+    finally:
+        response.close()
+        response.release_conn()
+
+# ------------------------------------------------------------------------------------------------------------------
+# Streaming uploads: output written straight into the bucket, with no local copy
+# ------------------------------------------------------------------------------------------------------------------
+
+class ObjectSink(io.RawIOBase):
+    """
+    Write-only binary stream into `bucket`/`object_name`. Bytes are hashed as they arrive and sent
+    as multipart parts once a part's worth is buffered, up to MULTIPART_CONCURRENCY parts in flight
+    (`write` blocks beyond that). `close` sends the rest and completes the object; a stream that
+    never filled a part goes out as a single PUT instead. `abort` discards everything sent.
+    Afterwards `sha256` and `size` describe the stored content.
+
+    The hash is only known at the end, so it is stored as object metadata for single-PUT objects
+    only; multipart objects carry it in the metadata DB alone.
+    """
+
+    def __init__(self, client, bucket: str, object_name: str, content_type: str = 'application/octet-stream',
+                 part_size: int = None):
+        super().__init__()
+        self.client, self.bucket, self.object_name, self.content_type = client, bucket, object_name, content_type
+        self.part_size = part_size or mb_to_bytes(MULTIPART_PART_SIZE_MB)
+        self.sha256, self.size = None, 0
+        self._hash = hashlib.sha256()
+        self._buffer = bytearray()
+        self._upload_id, self._pool, self._parts, self._error = None, None, [], None
+        self._slots = threading.BoundedSemaphore(max(1, MULTIPART_CONCURRENCY))
+
+    def __str__(self):
+        return f"{self.bucket}/{self.object_name}"
+
+    def __exit__(self, exc_type, *exc):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+    def __del__(self):
+        # never complete an object nobody finished
+        if not self.closed:
+            self.abort()
+
+    def writable(self) -> bool:
+        return True
+
+    def tell(self) -> int:
+        return self.size
+
+    def write(self, b) -> int:
+        if self.closed:
+            raise ValueError(f"write to closed stream {self}")
+        data = memoryview(b).cast('B')
+        self._hash.update(data)
+        self.size += len(data)
+        self._buffer += data
+        while len(self._buffer) >= self.part_size:
+            self._send(bytes(self._buffer[:self.part_size]))
+            del self._buffer[:self.part_size]
+        return len(data)
+
+    def _send(self, data: bytes):
+        if self._error is not None:
+            raise self._error
+        if self._upload_id is None:
+            self._upload_id = with_retry(f"Start of multipart upload {self.object_name}",
+                                         minio_multipart.create_multipart_upload,
+                                         self.client, self.bucket, self.object_name,
+                                         {"Content-Type": self.content_type})
+            self._pool = ThreadPoolExecutor(max_workers=max(1, MULTIPART_CONCURRENCY),
+                                            thread_name_prefix="minio-stream")
+        self._slots.acquire()
+        part_number = len(self._parts) + 1
+        future = self._pool.submit(self._upload_part, part_number, data)
+        future.add_done_callback(self._part_done)
+        self._parts.append(future)
+
+    def _upload_part(self, part_number: int, data: bytes) -> tuple:
+        etag = with_retry(f"Part {part_number} of {self.object_name}", minio_multipart.upload_part,
+                          self.client, self.bucket, self.object_name, data, self._upload_id, part_number)
+        return part_number, etag
+
+    def _part_done(self, future):
+        self._slots.release()
+        if not future.cancelled() and future.exception() is not None and self._error is None:
+            self._error = future.exception()
+
+    def close(self):
+        """Send what is buffered and complete the object (no-op once closed or aborted)."""
+        if self.closed:
+            return
         try:
-            file_type, ds = infer_object_path(file.name)
-            object_name = f"valid-data/{file_type}/{ds}/{file.name}"
-            upload_file_to_minio(
-                client,
-                file,
-                bucket=BUCKET_NAME,
-                object_name=object_name
-            )
-        except Exception as e:
-            msg = f"❌ Upload failed for {file.name}: {e}"
-            logger.error(msg, exc_info=True)
+            if self._upload_id is None:
+                self.sha256 = self._hash.hexdigest()
+                data = bytes(self._buffer)
+                with_retry(f"Upload of {self.object_name}", self.client.put_object,
+                            self.bucket, self.object_name, io.BytesIO(data), len(data),
+                            content_type=self.content_type, metadata={CHECKSUM_METADATA: self.sha256})
+            else:
+                if self._buffer:
+                    self._send(bytes(self._buffer))
+                parts = [future.result() for future in self._parts]
+                self._pool.shutdown()
+                self.sha256 = self._hash.hexdigest()
+                with_retry(f"Completion of {self.object_name}", minio_multipart.complete_multipart_upload,
+                           self.client, self.bucket, self.object_name, self._upload_id, parts)
+        except BaseException:
+            self.abort()
             raise
+        self._buffer = bytearray()
+        super().close()
+        logger.info(f"📤 Streamed {self.size} bytes to {self.object_name}"
+                    f" ({f'{len(self._parts)} parts' if self._parts else 'single PUT'})")
 
-def upload_all_quarantined_files(**kwargs):
+    def abort(self):
+        """Discard the object: stop sending and abort the multipart upload, if one was started."""
+        if self.closed:
+            return
+        if self._pool is not None:
+            self._pool.shutdown(cancel_futures=True)
+        if self._upload_id is not None:
+            try:
+                minio_multipart.abort_multipart_upload(self.client, self.bucket, self.object_name, self._upload_id)
+            except Exception as e:
+                logger.warning(f"⚠️ Could not abort multipart upload {self._upload_id} of {self.object_name}: {e}")
+        self._buffer = bytearray()
+        super().close()
+        logger.warning(f"🗑️ Aborted streamed upload of {self.object_name}")
+
+
+def open_object_sink(prefix: str, filename: str, client=None) -> ObjectSink:
+    """Stream for the object `filename` would be uploaded to under `prefix` (valid-data / quarantine-data)."""
+    client = client or get_minio_client()
+    _ensure_bucket(client, BUCKET_NAME)
+    return ObjectSink(client, BUCKET_NAME, bucket_object_name(prefix, filename), _content_type(filename))
+
+
+@flushes_metadata
+def upload_all_validated_files(ds: str = None, **kwargs):
     client = get_minio_client()
     _ensure_bucket(client, BUCKET_NAME)
+    uploaded = upload_directory(client, VALID_DIR, "valid-data")
+    if ds:
+        write_manifest(client, ds)
+    return uploaded
 
-    for file in QUARANTINE_DIR.glob("*"):
-        if not file.is_file():
-            continue
-        if check_stage_complete(file.name, "uploaded"):
-            logger.info(f"⏩ Already uploaded (quarantine): {file.name}")
-            continue
-        try:
-            file_type, ds = infer_object_path(file.name)
-            object_name = f"quarantine-data/{file_type}/{ds}/{file.name}"
-            upload_file_to_minio(
-                client,
-                file,
-                bucket=BUCKET_NAME,
-                object_name=object_name
-            )
-        except Exception as e:
-            msg = f"❌ Failed to upload quarantined {file.name}: {e}"
-            logger.error(msg, exc_info=True)
-            raise
+@flushes_metadata
+def upload_all_quarantined_files(**kwargs):
+    client = get_minio_client()
+    _ensure_bucket(client, BUCKET_NAME)
+    return upload_directory(client, QUARANTINE_DIR, "quarantine-data")
 
 if __name__ == "__main__":
     upload_all_validated_files()
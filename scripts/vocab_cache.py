@@ -0,0 +1,117 @@
+"""
+Persistent Faker vocabulary cache.
+
+Faker is slow per call, so the columnar generator samples realistic values from
+pre-drawn pools instead. The pools are drawn once, written as an Arrow IPC file
+under VOCAB_DIR and memory-mapped by every task process, so sampling a column is
+an index draw plus a `take`.
+
+The file is rebuilt when its Faker version, locale, pool size or seed no longer
+match the current settings, or when it is older than VOCAB_MAX_AGE_DAYS.
+"""
+import os
+import zlib
+from datetime import datetime, timedelta
+from pathlib import Path
+import numpy as np
+import pyarrow as pa
+import faker
+from faker import Faker
+from logging_config import get_logger
+
+logger = get_logger(__name__)
+
+VOCAB_DIR = Path(os.getenv("VOCAB_DIR", "/opt/airflow/data/vocab"))
+VOCAB_SIZE = int(os.getenv('VOCAB_SIZE', '50000'))
+VOCAB_LOCALE = os.getenv('VOCAB_LOCALE', 'en_US')
+VOCAB_SEED = int(os.getenv('GENERATION_SEED', '0'))
+VOCAB_MAX_AGE_DAYS = int(os.getenv('VOCAB_MAX_AGE_DAYS', '30'))
+
+# Faker providers cached as pools, in column order of the cache file
+FAKER_KINDS = (
+    'first_name', 'last_name', 'email', 'company', 'job', 'country', 'url', 'user_agent', 'domain_name',
+)
+
+_vocab = None  # per-process memory-mapped table
+
+
+def vocab_path(locale: str = None) -> Path:
+    return VOCAB_DIR / f"faker_vocab_{locale or VOCAB_LOCALE}.arrow"
+
+
+def _expected_meta(locale: str = None) -> dict:
+    return {
+        'faker_version': faker.VERSION,
+        'locale': locale or VOCAB_LOCALE,
+        'size': str(VOCAB_SIZE),
+        'seed': str(VOCAB_SEED),
+    }
+
+
+def _is_current(path: Path) -> bool:
+    """True if the cache file exists, matches the current settings and is within its max age."""
+    if not path.exists():
+        return False
+    try:
+        with pa.memory_map(str(path)) as source:
+            schema = pa.ipc.open_file(source).schema
+    except (pa.ArrowInvalid, OSError) as e:
+        logger.warning(f"⚠️ Unreadable vocabulary cache {path}: {e}")
+        return False
+
+    meta = {k.decode(): v.decode() for k, v in (schema.metadata or {}).items()}
+    if any(meta.get(k) != v for k, v in _expected_meta().items()):
+        logger.info(f"♻️ Vocabulary cache {path.name} is stale: {meta}")
+        return False
+    if set(FAKER_KINDS) - set(schema.names):
+        logger.info(f"♻️ Vocabulary cache {path.name} is missing kinds")
+        return False
+    built_at = datetime.fromisoformat(meta.get('built_at', '1970-01-01T00:00:00'))
+    if datetime.utcnow() - built_at > timedelta(days=VOCAB_MAX_AGE_DAYS):
+        logger.info(f"♻️ Vocabulary cache {path.name} is older than {VOCAB_MAX_AGE_DAYS} days")
+        return False
+    return True
+
+
+def build_vocabulary(locale: str = None) -> Path:
+    """
+    Draw VOCAB_SIZE values for every kind and atomically (re)write the cache file.
+    Each kind has its own seeded Faker so pools do not depend on build order.
+    """
+    locale = locale or VOCAB_LOCALE
+    columns = {}
+    for kind in FAKER_KINDS:
+        fk = Faker(locale)
+        fk.seed_instance(VOCAB_SEED + zlib.crc32(kind.encode('utf-8')))
+        columns[kind] = pa.array([getattr(fk, kind)() for _ in range(VOCAB_SIZE)], type=pa.string())
+
+    meta = {**_expected_meta(locale), 'built_at': datetime.utcnow().isoformat()}
+    table = pa.table(columns).replace_schema_metadata(meta)
+
+    path = vocab_path(locale)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_suffix(f".{os.getpid()}.tmp")
+    with pa.OSFile(str(tmp), 'wb') as sink, pa.ipc.new_file(sink, table.schema) as writer:
+        writer.write_table(table)
+    os.replace(tmp, path)  # concurrent builders: last complete file wins
+    logger.info(f"📚 Built vocabulary cache {path} ({VOCAB_SIZE} values x {len(FAKER_KINDS)} kinds)")
+    return path
+
+
+def load_vocabulary() -> pa.Table:
+    """Memory-map the vocabulary cache for this process, rebuilding it first if needed."""
+    global _vocab
+    if _vocab is None:
+        path = vocab_path()
+        if not _is_current(path):
+            build_vocabulary()
+        source = pa.memory_map(str(path))
+        _vocab = pa.ipc.open_file(source).read_all()
+    return _vocab
+
+
+def sample(rng: np.random.Generator, kind: str, n: int) -> np.ndarray:
+    """Draw n values of a Faker kind as an object array."""
+    pool = load_vocabulary().column(kind)
+    idx = rng.integers(0, len(pool), n)
+    return pool.take(pa.array(idx)).to_numpy(zero_copy_only=False)
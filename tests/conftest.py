@@ -0,0 +1,56 @@
+"""
+Shared test setup: scripts/ on sys.path, the batch date used throughout, and the
+`backend` fixture that runs a test against every metadata backend.
+"""
+import os
+import sys
+import uuid
+from pathlib import Path
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "scripts"))
+
+import metadata  # noqa: E402
+
+DS = "2025-05-25"
+PG_DSN = os.getenv("METADATA_TEST_PG_DSN")
+
+
+def sqlite_backend(tmp_path):
+    from metadata_sqlite import SQLiteBackend
+    return SQLiteBackend(tmp_path / "metadata.db"), lambda: None
+
+
+def _postgres_backend(tmp_path):
+    if not PG_DSN:
+        pytest.skip("METADATA_TEST_PG_DSN not set")
+    psycopg2 = pytest.importorskip("psycopg2")
+    from psycopg2.extensions import make_dsn
+    from metadata_postgres import PostgresBackend
+
+    schema = f"test_{uuid.uuid4().hex[:12]}"
+    with psycopg2.connect(PG_DSN) as conn, conn.cursor() as c:
+        c.execute(f"CREATE SCHEMA {schema}")
+
+    def drop():
+        with psycopg2.connect(PG_DSN) as conn, conn.cursor() as c:
+            c.execute(f"DROP SCHEMA {schema} CASCADE")
+
+    return PostgresBackend(make_dsn(PG_DSN, options=f"-csearch_path={schema}")), drop
+
+
+def _write_behind_backend(tmp_path):
+    inner, drop = sqlite_backend(tmp_path)
+    return metadata.WriteBehindBackend(inner), drop
+
+
+@pytest.fixture(params=["sqlite", "postgres", "write-behind"])
+def backend(request, tmp_path):
+    make = {"sqlite": sqlite_backend, "postgres": _postgres_backend, "write-behind": _write_behind_backend}
+    backend, drop = make[request.param](tmp_path)
+    previous = metadata.set_backend(backend)
+    metadata.init_metadata_db()
+    yield backend
+    metadata.set_backend(previous)
+    backend.close()
+    drop()
@@ -0,0 +1,300 @@
+"""
+In-process S3 stand-in for benchmarks and tests of the MinIO upload path.
+
+A threaded HTTP server speaking just enough of the S3 API for the `minio` client:
+bucket HEAD/PUT/location, object PUT/HEAD/GET/DELETE with user metadata,
+multipart uploads (initiate / part / list parts / complete / abort) and
+ListObjectsV2. Signatures are not checked. `latency_s` delays every request to
+mimic a network round trip, `connect_latency_s` every new connection (TCP / TLS
+handshake), and `bandwidth_mb_s` caps how fast request bodies arrive;
+`fail_next()` injects error responses for retry tests.
+
+    with S3StandIn(latency_s=0.02) as s3:
+        client = s3.client()
+"""
+import hashlib
+import re
+import threading
+import uuid
+import time
+from datetime import datetime, timezone
+from email.utils import formatdate
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, unquote, urlsplit
+from xml.sax.saxutils import escape
+
+
+class _Object:
+    __slots__ = ("data", "etag", "content_type", "meta", "mtime")
+
+    def __init__(self, data: bytes, etag: str, content_type: str, meta: dict):
+        self.data, self.etag, self.content_type, self.meta = data, etag, content_type, meta
+        self.mtime = time.time()
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive, like a real endpoint
+    disable_nagle_algorithm = True  # headers and body go out in separate writes
+
+    def log_message(self, *args):
+        pass
+
+    def setup(self):
+        s3 = self.server.standin
+        with s3.lock:
+            s3.connections += 1
+        if s3.connect_latency_s:
+            time.sleep(s3.connect_latency_s)
+        super().setup()
+
+    # --- plumbing ----------------------------------------------------------------------------------------------
+
+    def _route(self):
+        url = urlsplit(self.path)
+        bucket, _, key = url.path.lstrip("/").partition("/")
+        return unquote(bucket), unquote(key), {k: v[0] for k, v in parse_qs(url.query, keep_blank_values=True).items()}
+
+    def _body(self) -> bytes:
+        return self.rfile.read(int(self.headers.get("Content-Length") or 0))
+
+    def _send(self, status: int, body: bytes = b"", headers: dict = None):
+        self.send_response(status)
+        for k, v in (headers or {}).items():
+            self.send_header(k, v)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        if self.command != "HEAD":
+            self.wfile.write(body)
+
+    def _error(self, status: int, code: str):
+        body = f"<Error><Code>{code}</Code><Message>{code}</Message><RequestId>0</RequestId></Error>"
+        self._send(status, body.encode(), {"Content-Type": "application/xml"})
+
+    def _handle(self, method):
+        s3 = self.server.standin
+        if s3.latency_s:
+            time.sleep(s3.latency_s)
+        body = self._body() if method in ("PUT", "POST") else b""
+        if s3.bandwidth_mb_s:
+            time.sleep(len(body) / (s3.bandwidth_mb_s * 1e6))
+        failure = s3._take_failure(method)
+        if failure:
+            return self._error(*failure)
+        bucket, key, query = self._route()
+        with s3.lock:
+            s3.requests[method] = s3.requests.get(method, 0) + 1
+            s3.bytes_in += len(body)
+        getattr(self, f"_{method.lower()}_{'object' if key else 'bucket'}")(s3, bucket, key, query, body)
+
+    def do_GET(self):
+        self._handle("GET")
+
+    def do_HEAD(self):
+        self._handle("HEAD")
+
+    def do_PUT(self):
+        self._handle("PUT")
+
+    def do_DELETE(self):
+        self._handle("DELETE")
+
+    def do_POST(self):
+        self._handle("POST")
+
+    # --- buckets -----------------------------------------------------------------------------------------------
+
+    def _head_bucket(self, s3, bucket, key, query, body):
+        self._send(200 if bucket in s3.buckets else 404)
+
+    def _put_bucket(self, s3, bucket, key, query, body):
+        with s3.lock:
+            s3.buckets.setdefault(bucket, {})
+        self._send(200)
+
+    def _get_bucket(self, s3, bucket, key, query, body):
+        if "location" in query:
+            xml = '<LocationConstraint xmlns="http://s3.amazonaws.com/doc/2006-03-01/">us-east-1</LocationConstraint>'
+            return self._send(200, xml.encode(), {"Content-Type": "application/xml"})
+        if bucket not in s3.buckets:
+            return self._error(404, "NoSuchBucket")
+        prefix = query.get("prefix", "")
+        with s3.lock:
+            items = sorted((k, o) for k, o in s3.buckets[bucket].items() if k.startswith(prefix))
+        contents = "".join(
+            f"<Contents><Key>{escape(k)}</Key><LastModified>{_iso(o.mtime)}</LastModified>"
+            f"<ETag>&quot;{o.etag}&quot;</ETag><Size>{len(o.data)}</Size><StorageClass>STANDARD</StorageClass></Contents>"
+            for k, o in items
+        )
+        xml = (
+            '<ListBucketResult xmlns="http://s3.amazonaws.com/doc/2006-03-01/">'
+            f"<Name>{escape(bucket)}</Name><Prefix>{escape(prefix)}</Prefix><KeyCount>{len(items)}</KeyCount>"
+            f"<MaxKeys>1000</MaxKeys><IsTruncated>false</IsTruncated>{contents}</ListBucketResult>"
+        )
+        self._send(200, xml.encode(), {"Content-Type": "application/xml"})
+
+    # --- objects -----------------------------------------------------------------------------------------------
+
+    def _meta(self) -> dict:
+        return {k: v for k, v in self.headers.items() if k.lower().startswith("x-amz-meta-")}
+
+    def _put_object(self, s3, bucket, key, query, body):
+        if bucket not in s3.buckets:
+            return self._error(404, "NoSuchBucket")
+        if "uploadId" in query:
+            return self._put_part(s3, bucket, key, query, body)
+        obj = _Object(body, hashlib.md5(body).hexdigest(), self.headers.get("Content-Type", ""), self._meta())
+        with s3.lock:
+            s3.buckets[bucket][key] = obj
+        self._send(200, headers={"ETag": f'"{obj.etag}"'})
+
+    def _object(self, s3, bucket, key):
+        with s3.lock:
+            return s3.buckets.get(bucket, {}).get(key)
+
+    def _object_headers(self, obj) -> dict:
+        return {
+            "ETag": f'"{obj.etag}"',
+            "Content-Type": obj.content_type or "application/octet-stream",
+            "Last-Modified": formatdate(obj.mtime, usegmt=True),
+            **obj.meta,
+        }
+
+    def _head_object(self, s3, bucket, key, query, body):
+        obj = self._object(s3, bucket, key)
+        if obj is None:
+            return self._send(404)
+        self.send_response(200)
+        for k, v in self._object_headers(obj).items():
+            self.send_header(k, v)
+        self.send_header("Content-Length", str(len(obj.data)))
+        self.end_headers()
+
+    def _get_object(self, s3, bucket, key, query, body):
+        if "uploadId" in query:
+            return self._list_parts(s3, bucket, key, query)
+        obj = self._object(s3, bucket, key)
+        if obj is None:
+            return self._error(404, "NoSuchKey")
+        self._send(200, obj.data, self._object_headers(obj))
+
+    def _delete_object(self, s3, bucket, key, query, body):
+        with s3.lock:
+            if "uploadId" in query:
+                s3.uploads.pop(query["uploadId"], None)
+            else:
+                s3.buckets.get(bucket, {}).pop(key, None)
+        self._send(204)
+
+
+    # --- multipart ---------------------------------------------------------------------------------------------
+
+    def _post_object(self, s3, bucket, key, query, body):
+        if "uploads" in query:
+            upload_id = uuid.uuid4().hex
+            with s3.lock:
+                s3.uploads[upload_id] = {"bucket": bucket, "key": key, "parts": {}, "meta": self._meta(),
+                                         "content_type": self.headers.get("Content-Type", "")}
+            xml = (f"<InitiateMultipartUploadResult><Bucket>{escape(bucket)}</Bucket><Key>{escape(key)}</Key>"
+                   f"<UploadId>{upload_id}</UploadId></InitiateMultipartUploadResult>")
+            return self._send(200, xml.encode(), {"Content-Type": "application/xml"})
+        with s3.lock:
+            upload = s3.uploads.pop(query.get("uploadId"), None)
+        if upload is None:
+            return self._error(404, "NoSuchUpload")
+        wanted = [(int(n), etag.strip('"')) for n, etag in re.findall(
+            r"<PartNumber>(\d+)</PartNumber>\s*<ETag>([^<]+)</ETag>", body.decode().replace("&#34;", '"').replace("&quot;", '"'))]
+        if any(upload["parts"].get(n, (None, None))[1] != etag for n, etag in wanted):
+            return self._error(400, "InvalidPart")
+        data = b"".join(upload["parts"][n][0] for n, _ in wanted)
+        digest = hashlib.md5(b"".join(bytes.fromhex(etag) for _, etag in wanted)).hexdigest()
+        obj = _Object(data, f"{digest}-{len(wanted)}", upload["content_type"], upload["meta"])
+        with s3.lock:
+            s3.buckets[bucket][key] = obj
+        xml = (f"<CompleteMultipartUploadResult><Bucket>{escape(bucket)}</Bucket><Key>{escape(key)}</Key>"
+               f"<ETag>&quot;{obj.etag}&quot;</ETag></CompleteMultipartUploadResult>")
+        self._send(200, xml.encode(), {"Content-Type": "application/xml"})
+
+    def _put_part(self, s3, bucket, key, query, body):
+        with s3.lock:
+            upload = s3.uploads.get(query["uploadId"])
+            if upload is not None:
+                etag = hashlib.md5(body).hexdigest()
+                upload["parts"][int(query["partNumber"])] = (body, etag)
+        if upload is None:
+            return self._error(404, "NoSuchUpload")
+        self._send(200, headers={"ETag": f'"{etag}"'})
+
+    def _list_parts(self, s3, bucket, key, query):
+        with s3.lock:
+            upload = s3.uploads.get(query["uploadId"])
+            parts = sorted(upload["parts"].items()) if upload else None
+        if parts is None:
+            return self._error(404, "NoSuchUpload")
+        contents = "".join(
+            f"<Part><PartNumber>{n}</PartNumber><LastModified>{_iso(time.time())}</LastModified>"
+            f"<ETag>&quot;{etag}&quot;</ETag><Size>{len(data)}</Size></Part>"
+            for n, (data, etag) in parts
+        )
+        xml = (f"<ListPartsResult><Bucket>{escape(bucket)}</Bucket><Key>{escape(key)}</Key>"
+               f"<UploadId>{query['uploadId']}</UploadId><IsTruncated>false</IsTruncated>{contents}</ListPartsResult>")
+        self._send(200, xml.encode(), {"Content-Type": "application/xml"})
+
+def _iso(ts: float) -> str:
+    return datetime.fromtimestamp(ts, timezone.utc).strftime("%Y-%m-%dT%H:%M:%S.000Z")
+
+
+class S3StandIn:
+    """Run the stand-in on a free localhost port; use as a context manager."""
+
+    def __init__(self, latency_s: float = 0.0, connect_latency_s: float = 0.0, bandwidth_mb_s: float = None):
+        self.latency_s = latency_s
+        self.connect_latency_s = connect_latency_s
+        self.bandwidth_mb_s = bandwidth_mb_s
+        self.connections = 0  # TCP connections accepted
+        self.lock = threading.Lock()
+        self.buckets = {}     # bucket -> {key: _Object}
+        self.uploads = {}     # upload id -> {"bucket", "key", "parts": {n: (data, etag)}, "meta", "content_type"}
+        self.requests = {}    # HTTP method -> count
+        self.bytes_in = 0     # request body bytes received
+        self._failures = []   # queued (status, code, method or None) responses
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), _Handler)
+        self._server.daemon_threads = True
+        self._server.standin = self
+        self._thread = None
+
+    @property
+    def endpoint(self) -> str:
+        return f"127.0.0.1:{self._server.server_address[1]}"
+
+    def client(self, **kwargs):
+        from minio import Minio
+        return Minio(self.endpoint, access_key="standin", secret_key="standin", secure=False,
+                     region="us-east-1", **kwargs)
+
+    def fail_next(self, n: int = 1, status: int = 503, code: str = "SlowDown", method: str = None):
+        """Answer the next `n` requests (of `method` only, if given) with an S3 error."""
+        with self.lock:
+            self._failures += [(status, code, method)] * n
+
+    def _take_failure(self, method: str):
+        with self.lock:
+            for i, (status, code, only) in enumerate(self._failures):
+                if only in (None, method):
+                    del self._failures[i]
+                    return status, code
+        return None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, name="s3-standin", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
@@ -0,0 +1,86 @@
+"""Output format configuration and the incremental batch writers."""
+import pandas as pd
+import pyarrow.parquet as pq
+import pytest
+from conftest import DS
+
+import formats
+import readers
+
+WRITERS = {"csv": formats.CsvBatchWriter, "ndjson": formats.NdjsonBatchWriter, "parquet": formats.ParquetBatchWriter}
+
+
+def test_output_formats_override_the_defaults(monkeypatch):
+    monkeypatch.setattr(formats, "PARQUET_COMPRESSION", "snappy")
+    parsed = formats._parse_formats(" website_activity=parquet:zstd, contacts=parquet ,")
+    assert parsed["website_activity"] == {"format": "parquet", "compression": "zstd"}
+    assert parsed["contacts"] == {"format": "parquet", "compression": "snappy"}
+    assert {e: parsed[e]["format"] for e in ("form_fills", "campaigns")} == {"form_fills": "parquet", "campaigns": "ndjson"}
+    assert {e: c["format"] for e, c in formats._parse_formats("").items()} == formats.DEFAULT_FORMATS
+
+
+@pytest.mark.parametrize("spec, error", [
+    ("leads=csv", "unknown entity 'leads'"),
+    ("contacts=xlsx", "unknown format 'xlsx' for contacts"),
+    ("contacts=parquet:gzip", "Unsupported parquet compression 'gzip' for contacts"),
+])
+def test_output_formats_reject_bad_entries(spec, error):
+    with pytest.raises(ValueError, match=error):
+        formats._parse_formats(spec)
+
+
+def test_snowflake_config_follows_the_format_at_load_time(monkeypatch):
+    pytest.importorskip("snowflake.connector")
+    pytest.importorskip("minio")
+    import snowflake_upload
+
+    monkeypatch.setattr(formats, "OUTPUT_FORMATS", formats._parse_formats("contacts=parquet"))
+    config = snowflake_upload.entity_config("contacts")
+    assert (config["format"], config["file_format"], config["ext"]) == ("parquet", "RAW.parquet_fmt", ".parquet")
+
+    # a VARIANT table cannot take CSV; only the load using it fails
+    monkeypatch.setattr(formats, "OUTPUT_FORMATS", formats._parse_formats("form_fills=csv"))
+    with pytest.raises(ValueError, match="CSV cannot be loaded"):
+        snowflake_upload.entity_config("form_fills")
+
+
+def _campaigns(start, n):
+    return pd.DataFrame({
+        "campaign_id": [f"c{i}" for i in range(start, start + n)],
+        "campaign_name": [f"Campaign {i}" for i in range(start, start + n)],
+        "dim_date": DS,
+    })
+
+
+@pytest.mark.parametrize("fmt", WRITERS)
+def test_batches_read_back_as_one_frame(fmt, tmp_path):
+    path = tmp_path / f"campaigns{formats.EXTENSIONS[fmt]}"
+    batches = [_campaigns(0, 3), _campaigns(3, 0), _campaigns(3, 4)]
+    with WRITERS[fmt](path) as writer:
+        for batch in batches:
+            writer.write(batch)
+
+    expected = pd.concat(batches, ignore_index=True)
+    pd.testing.assert_frame_equal(readers.read_frame(path, "campaigns", fmt=fmt), expected, check_dtype=False)
+
+
+def test_csv_header_is_written_once(tmp_path):
+    path = tmp_path / "campaigns.csv"
+    with formats.CsvBatchWriter(path) as writer:
+        writer.write(_campaigns(0, 2))
+        writer.write(_campaigns(2, 2))
+
+    lines = path.read_text().splitlines()
+    assert lines[0] == "campaign_id,campaign_name,dim_date"
+    assert len(lines) == 5 and lines.count(lines[0]) == 1
+
+
+def test_parquet_row_groups_are_capped(tmp_path, monkeypatch):
+    monkeypatch.setattr(formats, "PARQUET_ROW_GROUP_SIZE", 4)
+    path = tmp_path / "campaigns.parquet"
+    with formats.ParquetBatchWriter(path) as writer:
+        writer.write(_campaigns(0, 7))
+        writer.write(_campaigns(7, 3))
+
+    meta = pq.read_metadata(path)
+    assert [meta.row_group(i).num_rows for i in range(meta.num_row_groups)] == [4, 3, 3]
@@ -0,0 +1,133 @@
+"""Generation engine tests."""
+import hashlib
+import numpy as np
+import pytest
+from conftest import DS
+
+import data_generation as gen
+import vocab_cache
+
+
+@pytest.fixture
+def small_vocab(tmp_path, monkeypatch):
+    """A pool far smaller than a day's contacts, so sampled values repeat."""
+    monkeypatch.setattr(vocab_cache, "VOCAB_DIR", tmp_path)
+    monkeypatch.setattr(vocab_cache, "VOCAB_SIZE", 20)
+    monkeypatch.setattr(vocab_cache, "_vocab", None)
+    yield
+    vocab_cache._vocab = None
+
+
+def _load_vocab():
+    """Load the cache as a fresh task process would; returns the cache file's inode and its metadata."""
+    vocab_cache._vocab = None
+    table = vocab_cache.load_vocabulary()
+    return vocab_cache.vocab_path().stat().st_ino, {k.decode(): v.decode() for k, v in table.schema.metadata.items()}
+
+
+@pytest.mark.parametrize("change", [
+    (vocab_cache.faker, "VERSION", "0.0.1"),
+    (vocab_cache, "VOCAB_SIZE", 21),
+    (vocab_cache, "VOCAB_SEED", 1),
+    (vocab_cache, "VOCAB_MAX_AGE_DAYS", -1),
+])
+def test_vocab_cache_is_rebuilt_when_its_inputs_change(change, small_vocab, monkeypatch):
+    inode, meta = _load_vocab()
+    assert _load_vocab() == (inode, meta)  # unchanged inputs map the existing file
+
+    monkeypatch.setattr(*change)
+    new_inode, new_meta = _load_vocab()
+    assert new_inode != inode  # a new file moved into place
+    assert new_meta["built_at"] != meta["built_at"]
+    assert {k: new_meta[k] for k in ("faker_version", "size", "seed")} == {
+        "faker_version": vocab_cache.faker.VERSION, "size": str(vocab_cache.VOCAB_SIZE), "seed": str(vocab_cache.VOCAB_SEED)}
+    assert [p.name for p in vocab_cache.VOCAB_DIR.iterdir()] == [vocab_cache.vocab_path().name]
+
+
+def test_vocab_cache_is_rebuilt_for_another_locale(small_vocab, monkeypatch):
+    _load_vocab()
+    # a cache file at the new locale's path that was built for the old one
+    monkeypatch.setattr(vocab_cache, "VOCAB_LOCALE", "de_DE")
+    vocab_cache.vocab_path("en_US").rename(vocab_cache.vocab_path())
+    _, meta = _load_vocab()
+    assert meta["locale"] == "de_DE"
+
+
+def test_columnar_contact_emails_are_unique(small_vocab):
+    contacts = gen.build_contacts_columnar(DS, 2000, np.random.default_rng(0))
+    assert contacts["email"].is_unique
+    assert contacts["email"].str.fullmatch(r"[^@\s]+@[^@\s]+").all()
+    assert contacts["first_name"].nunique() <= 20  # the other columns still come from the pool
+
+
+def test_row_contact_emails_are_unique():
+    assert gen.build_contacts_rows(DS, 500)["email"].is_unique
+
+
+def test_regeneration_clears_whole_and_part_files(small_vocab, tmp_path, monkeypatch):
+    monkeypatch.setattr(gen, "RAW_DIR", tmp_path / "raw")
+    monkeypatch.setattr(gen, "KEY_DIR", tmp_path / "keys")
+    gen.RAW_DIR.mkdir()
+    gen.KEY_DIR.mkdir()
+    file_name = f"contacts_{DS}.csv"
+    # an unsharded attempt and a sharded one both left output behind
+    for directory, name in ((gen.RAW_DIR, file_name), (gen.KEY_DIR, gen.contact_keys_name(DS))):
+        (directory / name).write_text("stale")
+        (directory / gen.part_file_name(name, 0)).write_text("stale")
+
+    assert gen.generate_contacts(file_name, DS, n=10, shards=1) == 10
+    assert sorted(p.name for p in gen.RAW_DIR.iterdir()) == [file_name]
+    assert sorted(p.name for p in gen.KEY_DIR.iterdir()) == [gen.contact_keys_name(DS)]
+
+
+@pytest.fixture
+def gen_dirs(tmp_path, monkeypatch):
+    monkeypatch.setattr(gen, "RAW_DIR", tmp_path / "raw")
+    monkeypatch.setattr(gen, "KEY_DIR", tmp_path / "keys")
+    gen.RAW_DIR.mkdir()
+    gen.KEY_DIR.mkdir()
+
+
+def test_contact_keys_round_trip(small_vocab, gen_dirs):
+    file_name = f"contacts_{DS}.csv"
+    rng = np.random.default_rng(0)
+    batches = [gen.build_contacts_columnar(DS, n, rng) for n in (5, 3)]
+    # two shards, the second written in two batches
+    with gen.ContactsBatchWriter(gen.RAW_DIR / gen.part_file_name(file_name, 0)) as writer:
+        writer.write(batches[0].iloc[:2])
+    with gen.ContactsBatchWriter(gen.RAW_DIR / gen.part_file_name(file_name, 1)) as writer:
+        writer.write(batches[0].iloc[2:])
+        writer.write(batches[1])
+    expected = gen.uuid_strings_to_bytes(np.concatenate([b["contact_id"] for b in batches]))
+
+    keys = gen.load_contact_keys(DS)
+    assert keys.shape == (8, 16)
+    np.testing.assert_array_equal(keys, expected)
+    np.testing.assert_array_equal(gen.format_uuids(keys), np.concatenate([b["contact_id"] for b in batches]))
+
+    # without the index the contacts CSV is parsed instead
+    for path in gen.KEY_DIR.iterdir():
+        path.unlink()
+    np.testing.assert_array_equal(gen.load_contact_keys(DS), expected)
+
+
+def test_contact_keys_are_pruned_after_the_fact_generators(backend, small_vocab, gen_dirs):
+    gen.generate_contacts(f"contacts_{DS}.csv", DS, n=10, shards=1)
+    keys = gen.KEY_DIR / gen.contact_keys_name(DS)
+
+    gen.generate_form_fills_if_needed(DS)
+    assert keys.exists()  # website_activity still samples from it
+    gen.generate_website_activity_if_needed(DS)
+    assert not any(gen.KEY_DIR.iterdir())
+
+
+def test_sharded_generation_is_reproducible(small_vocab, gen_dirs):
+    def generate():
+        for entity, generator in (("contacts", gen.generate_contacts), ("form_fills", gen.generate_form_fills),
+                                  ("website_activity", gen.generate_website_activity)):
+            assert generator(gen.entity_file_name(entity, DS), DS, n=300, shards=3) == 300
+        return {p.name: hashlib.sha256(p.read_bytes()).hexdigest() for p in (*gen.RAW_DIR.iterdir(), *gen.KEY_DIR.iterdir())}
+
+    first = generate()
+    assert len(first) == 3 * 4  # three parts per entity plus the contact key index parts
+    assert generate() == first
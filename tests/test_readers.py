@@ -0,0 +1,116 @@
+"""Arrow readers: entity schemas, header-only reads and chunked iteration."""
+import pandas as pd
+import pytest
+
+import formats
+import readers
+
+WRITERS = {"csv": formats.CsvBatchWriter, "ndjson": formats.NdjsonBatchWriter, "parquet": formats.ParquetBatchWriter}
+ENTITY = "website_activity"
+
+
+def _activity(start, n, null_pages=False):
+    rows = range(start, start + n)
+    return pd.DataFrame({
+        "session_id": [f"s{i}" for i in rows],
+        "contact_id": [f"c{i % 7}" for i in rows],
+        "campaign_id": "camp_1",
+        "page_id": pd.array([None if null_pages else i % 4 + 1 for i in rows], dtype="Int64"),
+        "page_url": "/home",
+        "page_title": "Home Page",
+        "event_date": "2025-05-25",
+        "event_type": "page_view",
+        "session_duration": [i / 4 for i in rows],
+        "pages_viewed": pd.array([i % 9 for i in rows], dtype="Int64"),
+        "bounce": [i % 2 == 0 for i in rows],
+        "referrer_domain": "example.com",
+        "note": [f"n{i}" for i in rows],  # not in the entity schema
+    })
+
+
+def _write(tmp_path, fmt, batches):
+    path = tmp_path / f"{ENTITY}{formats.EXTENSIONS[fmt]}"
+    with WRITERS[fmt](path) as writer:
+        for batch in batches:
+            writer.write(batch)
+    return path
+
+
+def _configure(monkeypatch, fmt):
+    """Readers that follow the entity's configured format (read_columns, count_rows) see `fmt`."""
+    monkeypatch.setattr(formats, "OUTPUT_FORMATS", formats._parse_formats(f"{ENTITY}={fmt}"))
+
+
+@pytest.fixture
+def small_blocks(monkeypatch):
+    """Blocks of a few rows, so CSV / NDJSON files are parsed in several blocks."""
+    monkeypatch.setattr(readers, "READER_BLOCK_SIZE", 2048)
+
+
+@pytest.mark.parametrize("fmt", WRITERS)
+def test_entity_schema_types_are_applied(fmt, tmp_path):
+    path = _write(tmp_path, fmt, [_activity(0, 10)])
+    table = readers.read_table(path, ENTITY, fmt=fmt)
+    declared = readers.ENTITY_SCHEMAS[ENTITY]
+    assert [table.schema.field(name).type for name in declared.names] == declared.types
+    assert str(table.schema.field("note").type) in ("string", "large_string")  # inferred
+
+    frame = readers.read_frame(path, ENTITY, columns=["session_id", "page_id"], fmt=fmt)
+    assert list(frame.columns) == ["session_id", "page_id"]
+    assert frame["page_id"].dtype == pd.Int64Dtype()
+
+
+@pytest.mark.parametrize("fmt", WRITERS)
+def test_read_columns_reads_only_the_header(fmt, tmp_path, monkeypatch):
+    _configure(monkeypatch, fmt)
+    path = _write(tmp_path, fmt, [_activity(0, 3)])
+    assert readers.read_columns(path, ENTITY) == list(_activity(0, 0).columns)
+
+
+@pytest.mark.parametrize("fmt", WRITERS)
+def test_chunks_keep_their_dtypes(fmt, tmp_path, small_blocks):
+    # page_id only turns null in the last batch, i.e. in a later chunk than the first
+    path = _write(tmp_path, fmt, [_activity(0, 40), _activity(40, 40), _activity(80, 20, null_pages=True)])
+    frames = list(readers.iter_frames(path, ENTITY, 15, fmt=fmt))
+
+    assert len(frames) > 2 and all(len(f) <= 15 for f in frames)
+    assert all(f.dtypes.equals(frames[0].dtypes) for f in frames)
+    assert frames[0]["page_id"].dtype == pd.Int64Dtype() and frames[0]["bounce"].dtype == bool
+    whole = pd.concat(frames, ignore_index=True)
+    assert len(whole) == 100 and whole["page_id"].isna().sum() == 20
+
+
+def test_ndjson_falls_back_to_pandas_chunks(tmp_path, monkeypatch, small_blocks):
+    path = _write(tmp_path, "ndjson", [_activity(0, 30), _activity(30, 10, null_pages=True)])
+    native = pd.concat(readers.iter_frames(path, ENTITY, 15, fmt="ndjson"), ignore_index=True)
+
+    monkeypatch.delattr(readers.pajson, "open_json", raising=False)  # an older pyarrow without streaming JSON reads
+    frames = list(readers.iter_frames(path, ENTITY, 15, fmt="ndjson"))
+    assert [len(f) for f in frames] == [15, 15, 10]
+    assert all(f.dtypes.equals(native.dtypes) for f in frames)
+    pd.testing.assert_frame_equal(pd.concat(frames, ignore_index=True), native)
+
+
+def test_empty_ndjson_file(tmp_path):
+    path = tmp_path / f"{ENTITY}.json"
+    with formats.NdjsonBatchWriter(path) as writer:
+        writer.write(_activity(0, 0))  # e.g. a validated file without a single valid row
+    assert path.stat().st_size == 0
+
+    assert readers.read_columns(path, ENTITY) == []
+    assert readers.count_rows(path, ENTITY) == 0
+    assert [len(f) for f in readers.iter_frames(path, ENTITY, 10, fmt="ndjson")] == [0]
+    assert readers.read_frame(path, ENTITY, fmt="ndjson").empty
+
+
+@pytest.mark.parametrize("fmt, rows", [("csv", 2), ("ndjson", 3), ("parquet", 10)])
+def test_count_rows_without_parsing(fmt, rows, tmp_path, monkeypatch):
+    _configure(monkeypatch, fmt)
+    path = tmp_path / f"{ENTITY}{formats.EXTENSIONS[fmt]}"
+    if fmt == "csv":
+        path.write_text("session_id,page_id\ns1,1\ns2,2")  # no newline after the last row
+    elif fmt == "ndjson":
+        path.write_text('{"session_id": "s1"}\n{"session_id": "s2"}\n{"session_id": "s3"}\n')
+    else:
+        _write(tmp_path, fmt, [_activity(0, 6), _activity(6, 4)])
+    assert readers.count_rows(path, ENTITY) == rows
@@ -0,0 +1,62 @@
+"""Stage report tests, against every metadata backend (the `backend` fixture in conftest.py)."""
+import json
+from conftest import DS
+import metadata
+import stage_report
+
+
+def _write_file(name, entity, day, generated, validated=None, uploaded=None, rows=None):
+    stages = [("generated", generated), ("validated", validated), ("uploaded", uploaded)]
+    metadata.get_backend().write_batch(stages=[
+        (name, entity, day, stage, f"{day}T{ts}", rows if stage == "validated" else None)
+        for stage, ts in stages if ts
+    ])
+
+
+def test_stage_lags_and_throughput(backend):
+    # validation takes 10s, 20s, 30s, 40s; upload 5s each
+    for i, secs in enumerate((10, 20, 30, 40)):
+        _write_file(f"contacts_{DS}.part-{i:04d}.csv", "contacts", DS,
+                    "10:00:00", f"10:00:{secs}", f"10:00:{secs + 5}", rows=1000)
+    _write_file(f"forms_{DS}.json", "forms", DS, "09:00:00")          # never validated: no lags
+    _write_file("contacts_2025-01-01.csv", "contacts", "2025-01-01",  # outside the window
+                "10:00:00", "11:00:00", "12:00:00", rows=1)
+
+    report = stage_report.build_stage_report(DS, window_days=7, slowest=2)
+
+    pct = {r["dataset_type"]: r for r in report["percentiles"]}
+    assert pct["forms"]["validation_files"] == 0 and pct["forms"]["validation_p50_s"] is None
+    contacts = pct["contacts"]
+    assert contacts["validation_files"] == contacts["upload_files"] == 4
+    assert round(contacts["validation_p50_s"]) == 20 and round(contacts["validation_p95_s"]) == 40
+    assert round(contacts["validation_rows_per_s"]) == round(4000 / 100)
+    assert round(contacts["upload_p95_s"]) == 5
+
+    (daily,) = [r for r in report["daily"] if r["dataset_type"] == "contacts"]
+    assert daily["file_date"] == DS and daily["files"] == 4 and daily["row_count"] == 4000
+    assert round(daily["upload_avg_s"]) == 5 and round(daily["end_to_end_max_s"]) == 45
+
+    slowest = [r["file_name"] for r in report["slowest_files"]]
+    assert slowest == [f"contacts_{DS}.part-0003.csv", f"contacts_{DS}.part-0002.csv"]
+
+
+def test_dq_counts_include_compacted_days(backend):
+    old = "2025-05-01"
+    for status in ("PASS", "PASS", "FAIL"):
+        metadata.log_dq_result(f"contacts_{old}.csv", "contacts", status, "")
+    metadata.log_dq_result(f"contacts_{DS}.csv", "contacts", "PASS", "")
+    metadata.compact_dq_checks(DS, retention_days=10)
+
+    report = stage_report.build_stage_report(DS, window_days=30)
+    counts = {(r["file_date"], r["status"]): r["checks"] for r in report["dq_daily"]}
+    assert counts == {(DS, "PASS"): 1, (old, "PASS"): 2, (old, "FAIL"): 1}
+
+
+def test_write_stage_report(backend, tmp_path):
+    _write_file(f"pages_{DS}.csv", "pages", DS, "10:00:00", "10:00:01", "10:00:02", rows=3)
+    json_path = stage_report.write_stage_report(DS, out_dir=tmp_path)
+
+    report = json.loads(json_path.read_text())
+    assert report["window"]["end"] == DS
+    page = (tmp_path / f"stage_report_{DS}.html").read_text()
+    assert f"pages_{DS}.csv" in page and "<table>" in page
@@ -0,0 +1,413 @@
+"""MinIO upload engine tests, against the in-process S3 stand-in."""
+import hashlib
+import os
+import pandas as pd
+import pytest
+from conftest import DS
+
+pytest.importorskip("minio")
+
+import formats  # noqa: E402
+import metadata  # noqa: E402
+import minio_multipart  # noqa: E402
+import upload_to_minio as up  # noqa: E402
+from metadata_sqlite import SQLiteBackend  # noqa: E402
+from s3_standin import S3StandIn  # noqa: E402
+
+
+@pytest.fixture
+def s3(tmp_path, monkeypatch):
+    monkeypatch.setattr(up, "VALID_DIR", tmp_path / "valid")
+    monkeypatch.setattr(up, "UPLOAD_DIR", tmp_path / "uploaded")
+    monkeypatch.setattr(up, "UPLOAD_RETRY_BACKOFF_S", 0.01)
+    up.VALID_DIR.mkdir()
+    backend = SQLiteBackend(tmp_path / "metadata.db")
+    previous = metadata.set_backend(backend)
+    backend.migrate()
+    with S3StandIn() as standin:
+        up._ensure_bucket(standin.client(), up.BUCKET_NAME)
+        yield standin
+    backend.close()
+    metadata.set_backend(previous)
+
+
+def _valid_files(n, entity="contacts"):
+    paths = [up.VALID_DIR / f"{entity}_{DS}.part-{i:04d}.csv" for i in range(n)]
+    for i, path in enumerate(paths):
+        path.write_text(f"id\n{i}\n")
+    return paths
+
+
+def _objects(s3):
+    return set(s3.buckets[up.BUCKET_NAME])
+
+
+def test_upload_directory_uploads_everything_once(s3):
+    files = _valid_files(12)
+    assert up.upload_directory(s3.client(), up.VALID_DIR, "valid-data", concurrency=4) == 12
+
+    assert _objects(s3) == {f"valid-data/contacts/{DS}/{f.name}" for f in files}
+    assert sorted(p.name for p in up.UPLOAD_DIR.iterdir()) == [f.name for f in files]
+    assert metadata.completed_files([f.name for f in files], "uploaded") == {f.name for f in files}
+
+    # a rerun with the same names sends only the files whose content changed
+    _valid_files(12)
+    for f in files[:3]:
+        f.write_text("id\nchanged\n")
+    puts = s3.requests.get("PUT", 0)
+    assert up.upload_directory(s3.client(), up.VALID_DIR, "valid-data") == 3
+    assert s3.requests.get("PUT", 0) == puts + 3
+    assert s3.buckets[up.BUCKET_NAME][f"valid-data/contacts/{DS}/{files[0].name}"].data == b"id\nchanged\n"
+
+
+def test_unchanged_files_skip_without_requests(s3):
+    quarantine = up.VALID_DIR.parent / "quarantine"
+    quarantine.mkdir()
+    for name in (f"contacts_{DS}.csv", f"pages_{DS}.json"):
+        (quarantine / name).write_text("x\n")
+    assert up.upload_directory(s3.client(), quarantine, "quarantine-data") == 2
+
+    # quarantined files stay in place; the rerun does not even HEAD them
+    requests = sum(s3.requests.values())
+    assert up.upload_directory(s3.client(), quarantine, "quarantine-data") == 0
+    assert sum(s3.requests.values()) == requests
+
+
+def test_identical_content_skips_transfer_after_metadata_reset(s3, tmp_path):
+    files = _valid_files(4)
+    contents = {f.name: f.read_bytes() for f in files}
+    up.upload_directory(s3.client(), up.VALID_DIR, "valid-data")
+
+    # lost metadata DB, same files produced again (one with new content)
+    backend = SQLiteBackend(tmp_path / "fresh.db")
+    previous = metadata.set_backend(backend)
+    backend.migrate()
+    try:
+        for name, data in contents.items():
+            (up.VALID_DIR / name).write_bytes(data)
+        files[0].write_text("id\nnew\n")
+        puts = s3.requests.get("PUT", 0)
+        assert up.upload_directory(s3.client(), up.VALID_DIR, "valid-data") == 4
+        assert s3.requests.get("PUT", 0) == puts + 1
+        assert metadata.completed_files(list(contents), "uploaded") == set(contents)
+    finally:
+        metadata.set_backend(previous)
+        backend.close()
+
+
+def test_validation_checksum_is_stored_on_the_object(s3):
+    (file,) = _valid_files(1)
+    with metadata.DQRecorder(file.name, "contacts", DS) as dq:
+        dq.log_checksum(file, "valid")
+    up.upload_directory(s3.client(), up.VALID_DIR, "valid-data")
+    stat = s3.client().stat_object(up.BUCKET_NAME, f"valid-data/contacts/{DS}/{file.name}")
+    assert stat.metadata["x-amz-meta-sha256"] == metadata.file_sha256(up.UPLOAD_DIR / file.name)
+
+
+def test_failed_file_does_not_stop_the_others(s3):
+    files = _valid_files(5)
+    (up.VALID_DIR / "not_an_entity.csv").write_text("x\n")
+
+    with pytest.raises(RuntimeError, match="not_an_entity.csv"):
+        up.upload_directory(s3.client(), up.VALID_DIR, "valid-data", concurrency=3)
+    assert len(_objects(s3)) == len(files)
+
+
+def test_transient_errors_are_retried(s3):
+    (file,) = _valid_files(1)
+    s3.fail_next(2, status=400, code="RequestTimeout", method="PUT")
+    up.upload_directory(s3.client(), up.VALID_DIR, "valid-data")
+    assert _objects(s3) == {f"valid-data/contacts/{DS}/{file.name}"}
+
+
+def test_permanent_errors_are_not_retried(s3):
+    (file,) = _valid_files(1)
+    s3.fail_next(1, status=403, code="AccessDenied", method="PUT")
+    puts = s3.requests.get("PUT", 0)
+    with pytest.raises(RuntimeError, match=file.name):
+        up.upload_directory(s3.client(), up.VALID_DIR, "valid-data")
+    assert s3.requests.get("PUT", 0) == puts and file.exists()
+
+
+def test_shared_client_and_bucket_memo(s3, monkeypatch):
+    monkeypatch.setattr(up, "MINIO_ENDPOINT", s3.endpoint)
+    monkeypatch.setattr(up, "MINIO_REGION", "us-east-1")
+    previous = up.set_minio_client(None)
+    try:
+        client = up.get_minio_client()
+        assert up.get_minio_client() is client
+        assert client._http.connection_pool_kw["maxsize"] == up.MINIO_POOL_SIZE
+
+        heads = s3.requests.get("HEAD", 0)
+        for _ in range(3):
+            up._ensure_bucket(client, up.BUCKET_NAME)
+        assert s3.requests.get("HEAD", 0) == heads + 1
+
+        connections = s3.connections
+        _valid_files(4)
+        up.upload_all_validated_files()
+        assert len(_objects(s3)) == 4 and s3.connections - connections <= up.UPLOAD_CONCURRENCY
+    finally:
+        up.set_minio_client(previous)
+
+
+def _large_file(monkeypatch, parts=5, part_kb=1):
+    """A valid file just over `parts - 1` parts, uploaded in 1 KB parts one at a time."""
+    monkeypatch.setattr(up, "MULTIPART_THRESHOLD_MB", part_kb / 1024)
+    monkeypatch.setattr(up, "MULTIPART_PART_SIZE_MB", part_kb / 1024)
+    monkeypatch.setattr(up, "MULTIPART_CONCURRENCY", 1)
+    path = up.VALID_DIR / f"website_activity_{DS}.json"
+    path.write_bytes(os.urandom(part_kb * 1024 * (parts - 1) + 100))
+    _validated(path)
+    return path
+
+
+def _validated(path):
+    with metadata.DQRecorder(path.name, "website_activity", DS) as dq:
+        dq.log_checksum(path, "valid")
+
+
+def _fail_part(monkeypatch, client, part_number):
+    """Make `part_number` fail once with a non-retryable error."""
+    upload_part, failed = minio_multipart.upload_part, []
+
+    def flaky(c, bucket, name, data, upload_id, n):
+        if c is client and n == part_number and not failed:
+            failed.append(n)
+            raise ConnectionRefusedError("link down")  # retryable, but retries are exhausted below
+        return upload_part(c, bucket, name, data, upload_id, n)
+    monkeypatch.setattr(minio_multipart, "upload_part", flaky)
+    monkeypatch.setattr(up, "UPLOAD_RETRIES", 0)
+
+
+def test_multipart_upload(s3, monkeypatch):
+    path = _large_file(monkeypatch, parts=5)
+    data = path.read_bytes()
+    monkeypatch.setattr(up, "MULTIPART_CONCURRENCY", 3)
+    up.upload_directory(s3.client(), up.VALID_DIR, "valid-data")
+
+    obj = s3.buckets[up.BUCKET_NAME][f"valid-data/website_activity/{DS}/{path.name}"]
+    assert obj.data == data and obj.etag.endswith("-5")
+    assert obj.meta["x-amz-meta-sha256"] == hashlib.sha256(data).hexdigest()
+    assert metadata.get_multipart_upload(up.BUCKET_NAME, f"valid-data/website_activity/{DS}/{path.name}") is None
+
+
+def test_multipart_upload_resumes_after_failure(s3, monkeypatch):
+    path = _large_file(monkeypatch, parts=5)
+    data, object_name = path.read_bytes(), f"valid-data/website_activity/{DS}/{path.name}"
+    client = s3.client()
+    _fail_part(monkeypatch, client, 4)
+    with pytest.raises(RuntimeError):
+        up.upload_directory(client, up.VALID_DIR, "valid-data")
+    done = set(metadata.get_multipart_upload(up.BUCKET_NAME, object_name)["parts"])
+    assert {1, 2, 3} <= done and 4 not in done
+
+    # the retried attempt sends only the missing parts
+    puts = s3.requests.get("PUT", 0)
+    up.upload_directory(client, up.VALID_DIR, "valid-data")
+    assert s3.requests.get("PUT", 0) == puts + 5 - len(done)
+    assert s3.buckets[up.BUCKET_NAME][object_name].data == data
+    assert metadata.get_multipart_upload(up.BUCKET_NAME, object_name) is None
+
+
+def test_multipart_restarts_when_content_changed_or_upload_gone(s3, monkeypatch):
+    path = _large_file(monkeypatch, parts=3)
+    object_name = f"valid-data/website_activity/{DS}/{path.name}"
+    client = s3.client()
+    _fail_part(monkeypatch, client, 3)
+    with pytest.raises(RuntimeError):
+        up.upload_directory(client, up.VALID_DIR, "valid-data")
+    first = metadata.get_multipart_upload(up.BUCKET_NAME, object_name)["upload_id"]
+
+    # new content: the recorded upload is aborted and a new one started
+    path.write_bytes(os.urandom(path.stat().st_size))
+    _validated(path)
+    up.upload_directory(client, up.VALID_DIR, "valid-data")
+    assert first not in s3.uploads
+    assert s3.buckets[up.BUCKET_NAME][object_name].data == (up.UPLOAD_DIR / path.name).read_bytes()
+
+    # the server dropped the recorded upload (e.g. expired): completion fails, upload restarts
+    path = _large_file(monkeypatch, parts=3)
+    _fail_part(monkeypatch, client, 2)
+    with pytest.raises(RuntimeError):
+        up.upload_directory(client, up.VALID_DIR, "valid-data")
+    s3.uploads.clear()
+    up.upload_directory(client, up.VALID_DIR, "valid-data")
+    assert s3.buckets[up.BUCKET_NAME][object_name].data == (up.UPLOAD_DIR / path.name).read_bytes()
+
+
+def _frame(n):
+    return pd.DataFrame({"contact_id": range(n), "email": [f"u{i}@example.com" for i in range(n)]})
+
+
+@pytest.mark.parametrize("entity", ["contacts", "form_fills"])  # csv, parquet
+def test_streamed_output_matches_the_local_file(s3, monkeypatch, entity):
+    monkeypatch.setattr(up, "MULTIPART_CONCURRENCY", 2)
+    name = f"{entity}_{DS}{formats.entity_extension(entity)}"
+    local = up.VALID_DIR / name
+    with formats.open_writer(local, entity) as writer:
+        for start in range(0, 3000, 1000):
+            writer.write(_frame(3000).iloc[start:start + 1000])
+
+    sink = up.open_object_sink("valid-data", name, client=s3.client())
+    sink.part_size = 4096
+    with formats.open_writer(sink, entity) as writer:
+        for start in range(0, 3000, 1000):
+            writer.write(_frame(3000).iloc[start:start + 1000])
+    sink.close()
+
+    obj = s3.buckets[up.BUCKET_NAME][f"valid-data/{entity}/{DS}/{name}"]
+    assert obj.data == local.read_bytes() and obj.etag.count("-") == 1  # went out in parts
+    assert (sink.sha256, sink.size) == (metadata.file_sha256(local), local.stat().st_size)
+    assert not s3.uploads
+
+
+def test_small_stream_is_one_put_with_its_hash(s3):
+    name = f"contacts_{DS}.csv"
+    with up.open_object_sink("quarantine-data", name, client=s3.client()) as sink:
+        sink.write(b"id\n1\n")
+    stat = s3.client().stat_object(up.BUCKET_NAME, f"quarantine-data/contacts/{DS}/{name}")
+    assert stat.size == 5 and stat.metadata["x-amz-meta-sha256"] == hashlib.sha256(b"id\n1\n").hexdigest()
+    assert s3.requests.get("POST", 0) == 0
+
+
+def test_rerun_skips_a_streamed_multipart_object(s3):
+    name = f"website_activity_{DS}.json"
+    object_name = f"valid-data/website_activity/{DS}/{name}"
+    data = os.urandom(3 * 1024)
+    sink = up.open_object_sink("valid-data", name, client=s3.client())
+    sink.part_size = 1024
+    with sink:
+        sink.write(data)
+    assert "x-amz-meta-sha256" not in s3.buckets[up.BUCKET_NAME][object_name].meta  # went out in parts
+    with metadata.DQRecorder(name, "website_activity", DS) as dq:
+        dq.log_checksum(name, "valid", sink.sha256, sink.size, uploaded=True)
+
+    # the same output validated again locally: the object's recorded hash matches, nothing is sent
+    path = up.VALID_DIR / name
+    path.write_bytes(data)
+    requests = dict(s3.requests)
+    assert up.upload_file_to_minio(s3.client(), path, up.BUCKET_NAME, object_name) is False
+    assert s3.requests.get("PUT", 0) == requests.get("PUT", 0) and s3.requests.get("POST", 0) == requests.get("POST", 0)
+
+    path.write_bytes(data + b"changed")  # moved to UPLOAD_DIR by the call above
+    assert up.upload_file_to_minio(s3.client(), path, up.BUCKET_NAME, object_name) is True
+
+
+def test_failed_stream_leaves_nothing_behind(s3, monkeypatch):
+    client = s3.client()
+    _fail_part(monkeypatch, client, 3)
+    sink = up.open_object_sink("valid-data", f"pages_{DS}.json", client=client)
+    sink.part_size = 1024
+    with pytest.raises(ConnectionRefusedError):
+        with sink:
+            for _ in range(8):
+                sink.write(os.urandom(1024))
+    assert sink.closed and not s3.uploads and not _objects(s3)
+
+
+def test_manifest_lists_the_uploaded_batch(s3):
+    files = _valid_files(3)
+    for f in files:
+        _validated(f)
+    up.upload_directory(s3.client(), up.VALID_DIR, "valid-data")
+    late = _valid_files(4)[3]  # validated after the upload: not in the bucket yet
+    _validated(late)
+
+    up.write_manifest(s3.client(), DS)
+    manifest = up.read_manifest(s3.client(), DS)
+    assert [f["object_name"] for f in manifest["files"]] == [f"valid-data/contacts/{DS}/{f.name}" for f in files]
+    assert manifest["files"][0] == {
+        "file_name": files[0].name, "object_name": f"valid-data/contacts/{DS}/{files[0].name}", "entity": "contacts", "format": "csv",
+        "size_bytes": 5, "sha256": hashlib.sha256(b"id\n0\n").hexdigest(), "row_count": None,
+    }
+    assert up.read_manifest(s3.client(), "2025-01-01") is None
+
+
+def _uploaded_day(s3, day, n):
+    """n one-row contacts files of `day`, validated and uploaded."""
+    paths = [up.VALID_DIR / f"contacts_{day}.part-{i:04d}.csv" for i in range(n)]
+    for i, path in enumerate(paths):
+        path.write_text(f"contact_id\n{day[-2:]}{i}\n")
+        with metadata.DQRecorder(path.name, "contacts", day) as dq:
+            dq.log_checksum(path, "valid", rows=1)
+    up.upload_directory(s3.client(), up.VALID_DIR, "valid-data")
+    return paths
+
+
+def test_compaction_swaps_the_month_onto_one_object(s3):
+    import compact_lake
+    from readers import read_frame
+
+    days = ["2025-05-01", "2025-05-02"]
+    files = [f for day in days for f in _uploaded_day(s3, day, 2)]
+    target = compact_lake.compacted_object_name("contacts", "2025-05")
+
+    [summary] = compact_lake.compact_month("2025-05", s3.client())
+    assert summary["merged"] == 4 and summary["days"] == 2
+    assert {o for o in _objects(s3) if o.startswith("valid-data/")} == {target}
+
+    manifest = up.read_manifest(s3.client(), days[1])
+    assert [f["file_name"] for f in manifest["files"]] == [f.name for f in files[2:]]
+    entry = manifest["files"][0]
+    assert entry["object_name"] == target and entry["format"] == "parquet"
+    assert entry["row_filter"] == {up.SOURCE_COLUMN: files[2].name} and entry["row_count"] == 1
+
+    local = up.UPLOAD_DIR.parent / "month.parquet"
+    s3.client().fget_object(up.BUCKET_NAME, target, str(local))
+    assert entry["sha256"] == up.file_sha256(local)
+    filters = [(col, "==", v) for col, v in entry["row_filter"].items()]
+    assert read_frame(local, "contacts", fmt="parquet", filters=filters)["contact_id"].tolist() == ["020"]
+
+    # nothing new: a rerun leaves the bucket alone
+    puts = s3.requests.get("PUT", 0)
+    assert compact_lake.compact_month("2025-05", s3.client())[0]["merged"] == 0
+    assert s3.requests.get("PUT", 0) == puts
+
+    # a late day is merged in next to what the object already holds
+    _uploaded_day(s3, "2025-05-03", 1)
+    [summary] = compact_lake.compact_month("2025-05", s3.client())
+    assert summary["merged"] == 1 and summary["files"] == 5
+    assert {o for o in _objects(s3) if o.startswith("valid-data/")} == {target}
+    s3.client().fget_object(up.BUCKET_NAME, target, str(local))
+    assert sorted(read_frame(local, "contacts", fmt="parquet")["contact_id"]) == ["010", "011", "020", "021", "030"]
+
+
+def test_interrupted_compaction_is_finished_by_the_next_run(s3, monkeypatch):
+    import compact_lake
+
+    _uploaded_day(s3, "2025-05-01", 2)
+    compact_lake.compact_month("2025-05", s3.client())
+    _uploaded_day(s3, "2025-05-02", 2)  # a late day: the monthly object is rewritten with a new hash
+
+    def fail(client, ds):
+        raise ConnectionError("network down")
+    monkeypatch.setattr(compact_lake, "write_manifest", fail)
+    with pytest.raises(ConnectionError):
+        compact_lake.compact_month("2025-05", s3.client())
+    target = compact_lake.compacted_object_name("contacts", "2025-05")
+    assert "valid-data/contacts/2025-05-02/contacts_2025-05-02.part-0000.csv" in _objects(s3)
+    monkeypatch.undo()
+
+    # nothing new to merge, but the manifests and small objects are brought in line
+    [summary] = compact_lake.compact_month("2025-05", s3.client())
+    assert summary["merged"] == 0
+    assert {o for o in _objects(s3) if o.startswith("valid-data/")} == {target}
+    sha = hashlib.sha256(s3.buckets[up.BUCKET_NAME][target].data).hexdigest()
+    for day in ("2025-05-01", "2025-05-02"):
+        entries = up.read_manifest(s3.client(), day)["files"]
+        assert [(f["object_name"], f["sha256"]) for f in entries] == [(target, sha)] * 2
+
+
+def test_closed_months_respect_the_lag():
+    import compact_lake
+
+    assert compact_lake.closed_months("2025-06-06", lag_days=7, lookback=2) == ["2025-03", "2025-04"]
+    assert compact_lake.closed_months("2025-06-07", lag_days=7, lookback=2) == ["2025-04", "2025-05"]
+
+
+def test_multipart_adapter_rejects_unsupported_minio(monkeypatch):
+    import minio
+    monkeypatch.setattr(minio, "__version__", "8.0.0")
+    with pytest.raises(ImportError, match="not supported"):
+        minio_multipart._check_minio()